@@ -1,28 +1,97 @@
 #!/usr/bin/env python3
 """Agent Chain Debugger – OC-0124"""
-import argparse, json, os, sys
+import argparse, fnmatch, glob, hashlib, json, os, struct, sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
 
 RED="\033[91m"; GREEN="\033[92m"; YELLOW="\033[93m"; RESET="\033[0m"
+INDEX_DIR=os.path.expanduser("~/.openclaw/trace_index")
+INDEX_HEADER=struct.Struct("<8sQQ")  # magic, source mtime_ns, source size
+INDEX_MAGIC=b"OCTRIDX1"
+OFFSET=struct.Struct("<Q")
+
+def _is_jsonl(file):
+    """True unless the file is a single JSON document (an array, or one object spread over several lines)."""
+    with open(file,"rb") as f:
+        for line in f:
+            if not line.strip(): continue
+            if line.lstrip().startswith(b"["): return False
+            try: json.loads(line); return True
+            except ValueError: return False
+    return True
 
 def _load_trace(file):
-    with open(file) as f:
-        content=f.read().strip()
-    try: return json.loads(content)
-    except:
-        return [json.loads(line) for line in content.splitlines() if line.strip()]
+    """Whole-document JSON trace as a list of steps; JSONL traces go through _iter_trace instead."""
+    with open(file) as f: trace=json.load(f)
+    return [trace] if isinstance(trace,dict) else trace
+
+def _index_paths(file):
+    side=file+".idx"
+    return [side,os.path.join(INDEX_DIR,hashlib.sha256(os.path.abspath(file).encode()).hexdigest()[:32]+".idx")]
+
+def _index_file(file):
+    """Path of an up-to-date step offset index for a JSONL trace, or None if none is current."""
+    st=os.stat(file)
+    for path in _index_paths(file):
+        try:
+            with open(path,"rb") as f: magic,mtime,size=INDEX_HEADER.unpack(f.read(INDEX_HEADER.size))
+        except (OSError,struct.error): continue
+        if magic==INDEX_MAGIC and mtime==st.st_mtime_ns and size==st.st_size: return path
+    return None
+
+def _iter_trace(file):
+    """Yield trace steps one at a time.
+
+    JSONL is streamed line by line; if no current index exists, the byte offset of
+    every step is written to a sidecar index (<trace>.idx, or ~/.openclaw/trace_index
+    when the trace directory is read-only) as a side effect of the same pass.
+    """
+    if not _is_jsonl(file):
+        yield from _load_trace(file); return
+    st=os.stat(file); out=None; tmp=None
+    if not _index_file(file):
+        for path in _index_paths(file):
+            try:
+                os.makedirs(os.path.dirname(os.path.abspath(path)),exist_ok=True)
+                tmp=f"{path}.{os.getpid()}.tmp"; out=open(tmp,"wb"); break
+            except OSError: tmp=None
+    try:
+        if out: out.write(INDEX_HEADER.pack(INDEX_MAGIC,st.st_mtime_ns,st.st_size))
+        with open(file,"rb") as f:
+            pos=0
+            for line in f:
+                if line.strip():
+                    step=json.loads(line)
+                    if out: out.write(OFFSET.pack(pos))
+                    yield step
+                pos+=len(line)
+        if out: out.close(); os.replace(tmp,path); out=None
+    finally:
+        if out: out.close(); os.remove(tmp)
+
+def _ensure_index(file):
+    """Current index path for a JSONL trace, building it with one streaming pass if needed."""
+    path=_index_file(file)
+    if path: return path
+    for _ in _iter_trace(file): pass
+    path=_index_file(file)
+    if not path: print(f"{RED}Could not write a step index for {file}{RESET}"); sys.exit(1)
+    return path
+
+def _step_count(index):
+    return (os.path.getsize(index)-INDEX_HEADER.size)//OFFSET.size
 
 def parse_trace(args):
-    trace=_load_trace(args.file)
-    if isinstance(trace,dict): trace=[trace]
-    steps=[s for s in trace if s.get("type") in ("tool_call","tool_result","message")]
-    print(f"{GREEN}Trace: {len(steps)} steps{RESET}")
-    for i,s in enumerate(steps):
+    trace=_iter_trace(args.file)
+    i=0
+    for s in trace:
+        if s.get("type") not in ("tool_call","tool_result","message"): continue
         t=s.get("type","?"); name=s.get("name") or s.get("tool","")
-        print(f"  [{i:02d}] {YELLOW}{t}{RESET}  {name}")
+        print(f"  [{i:02d}] {YELLOW}{t}{RESET}  {name}"); i+=1
+    print(f"{GREEN}Trace: {i} steps{RESET}")
 
 def visualize(args):
-    trace=_load_trace(args.file)
-    if isinstance(trace,dict): trace=[trace]
+    trace=_iter_trace(args.file)
     print(f"{GREEN}Agent Chain Visualization{RESET}")
     indent=0
     for s in trace:
@@ -41,37 +110,186 @@ def visualize(args):
             print(f"{'  '*indent}● {content}")
 
 def replay_step(args):
-    trace=_load_trace(args.file)
-    if isinstance(trace,dict): trace=[trace]
-    if args.step_id >= len(trace):
-        print(f"{RED}Step {args.step_id} not found (trace has {len(trace)} steps){RESET}"); sys.exit(1)
-    step=trace[args.step_id]
+    if _is_jsonl(args.file):
+        index=_ensure_index(args.file); n=_step_count(index)
+        if args.step_id<0 or args.step_id>=n:
+            print(f"{RED}Step {args.step_id} not found (trace has {n} steps){RESET}"); sys.exit(1)
+        with open(index,"rb") as f:
+            f.seek(INDEX_HEADER.size+args.step_id*OFFSET.size); (offset,)=OFFSET.unpack(f.read(OFFSET.size))
+        with open(args.file,"rb") as f: f.seek(offset); step=json.loads(f.readline())
+    else:
+        trace=_load_trace(args.file)
+        if args.step_id>=len(trace):
+            print(f"{RED}Step {args.step_id} not found (trace has {len(trace)} steps){RESET}"); sys.exit(1)
+        step=trace[args.step_id]
     print(f"{GREEN}Step {args.step_id}:{RESET}")
     print(json.dumps(step,indent=2))
 
 def export_report(args):
-    trace=_load_trace(args.file)
-    if isinstance(trace,dict): trace=[trace]
     fmt=args.format
-    if fmt=="md":
-        lines=["# Agent Chain Report\n",f"**Steps:** {len(trace)}\n"]
-        for i,s in enumerate(trace):
-            lines.append(f"## Step {i}: {s.get('type','?')} — {s.get('name',s.get('tool',''))}")
-            lines.append(f"```json\n{json.dumps(s,indent=2)[:500]}\n```\n")
-        content="\n".join(lines)
-    else:
-        content=json.dumps(trace,indent=2)
     out=args.output or f"agent_chain.{fmt}"
-    with open(out,"w") as f: f.write(content)
+    if _is_jsonl(args.file): n=_step_count(_ensure_index(args.file))
+    else: n=len(_load_trace(args.file))
+    with open(out,"w") as f:
+        if fmt=="md":
+            f.write(f"# Agent Chain Report\n\n**Steps:** {n}\n\n")
+            for i,s in enumerate(_iter_trace(args.file)):
+                f.write(f"## Step {i}: {s.get('type','?')} — {s.get('name',s.get('tool',''))}\n")
+                f.write(f"```json\n{json.dumps(s,indent=2)[:500]}\n```\n\n")
+        else:
+            f.write("[")
+            for i,s in enumerate(_iter_trace(args.file)): f.write(("," if i else "")+"\n  "+json.dumps(s,indent=2).replace("\n","\n  "))  # JSON strings never hold raw newlines
+            f.write("\n]" if n else "]")
     print(f"{GREEN}Report saved to {out}{RESET}")
 
+def _ts(step):
+    """Step timestamp in seconds: epoch seconds or milliseconds, or an ISO-8601 string."""
+    for k in ("timestamp","ts","time","start_time"):
+        v=step.get(k)
+        if v is None: continue
+        if isinstance(v,(int,float)): return v/1000 if v>1e11 else float(v)
+        try: return datetime.fromisoformat(str(v).replace("Z","+00:00")).timestamp()
+        except ValueError: pass
+    return None
+
+def _tokens(step):
+    u=step.get("usage")
+    if isinstance(u,dict):
+        if u.get("total_tokens") is not None: return u["total_tokens"]
+        return sum(v for k,v in u.items() if k in ("prompt_tokens","completion_tokens","input_tokens","output_tokens") and isinstance(v,(int,float)))
+    t=step.get("tokens")
+    return t if isinstance(t,(int,float)) else 0
+
+def _call_id(step):
+    return step.get("tool_call_id") or step.get("call_id") or step.get("id")
+
+def _open_ancestor(rec):
+    p=rec["parent"]
+    while p is not None and not p["open"]: p=p["parent"]
+    return p
+
+def _stack(rec):
+    path=[rec["name"]]; p=_open_ancestor(rec)
+    while p is not None: path.append(p["name"]); p=_open_ancestor(p)
+    return ";".join(["agent"]+path[::-1])
+
+def _profile_file(file):
+    """Profile one trace: per-tool calls/total/self time, tokens per step label, and collapsed stacks.
+
+    A tool_result closes the call with the same id, or the most recent open call when
+    ids are absent. A call's parent is the innermost call open when it started that is
+    still open when it ends, so overlapping parallel calls are siblings rather than
+    nested; self time is duration minus the time of contained children.
+    """
+    tools={}; steps={}; time_stacks={}; token_stacks={}; by_id={}; open_calls=[]
+    unmatched=0
+    for step in _iter_trace(file):
+        if not isinstance(step,dict): continue
+        t=step.get("type","?"); ts=_ts(step)
+        name=step.get("name") or step.get("tool")
+        label=f"{t}:{name}" if name and t in ("tool_call","tool_result") else t
+        tok=_tokens(step)
+        agg=steps.setdefault(label,[0,0]); agg[0]+=1; agg[1]+=tok
+        if t=="tool_call":
+            name=name or "unknown"
+            rec={"name":name,"start":ts,"parent":open_calls[-1] if open_calls else None,"open":True,"child":0.0}
+            cid=_call_id(step)
+            if cid is not None: by_id[cid]=rec
+            open_calls.append(rec)
+            tools.setdefault(name,{"calls":0,"total":0.0,"self":0.0,"durations":[],"tokens":0})["calls"]+=1
+            if tok: tools[name]["tokens"]+=tok; token_stacks[_stack(rec)]=token_stacks.get(_stack(rec),0)+tok
+            continue
+        if t=="tool_result":
+            cid=_call_id(step)
+            rec=by_id.pop(cid,None) if cid is not None else None
+            if rec is None or not rec["open"]: rec=open_calls[-1] if open_calls else None
+            if rec is None: unmatched+=1; continue
+            rec["open"]=False; open_calls.remove(rec)
+            tools[rec["name"]]["tokens"]+=tok
+            if tok: token_stacks[_stack(rec)]=token_stacks.get(_stack(rec),0)+tok
+            if ts is not None and rec["start"] is not None: dur=ts-rec["start"]
+            elif isinstance(step.get("duration_ms"),(int,float)): dur=step["duration_ms"]/1000
+            else: continue
+            dur=max(dur,0.0); self_t=max(dur-rec["child"],0.0)
+            parent=_open_ancestor(rec)
+            if parent is not None: parent["child"]+=dur
+            agg=tools[rec["name"]]; agg["total"]+=dur; agg["self"]+=self_t; agg["durations"].append(dur)
+            key=_stack(rec); time_stacks[key]=time_stacks.get(key,0)+self_t
+            continue
+        if tok:
+            key=";".join(["agent"]+[r["name"] for r in open_calls]+[label])
+            token_stacks[key]=token_stacks.get(key,0)+tok
+    return {"tools":tools,"steps":steps,"time_stacks":time_stacks,"token_stacks":token_stacks,
+            "unfinished":len(open_calls),"unmatched":unmatched}
+
+def _iter_files(paths):
+    for path in paths:
+        for match in (sorted(glob.glob(path,recursive=True)) if glob.has_magic(path) else [path]):
+            if os.path.isdir(match):
+                for root,dirs,files in os.walk(match):
+                    dirs[:]=sorted(d for d in dirs if not d.startswith("."))
+                    for name in sorted(files):
+                        if fnmatch.fnmatch(name,"*.json") or fnmatch.fnmatch(name,"*.jsonl"): yield os.path.join(root,name)
+            elif os.path.isfile(match): yield match
+
+def _merge(total,part):
+    for name,a in part["tools"].items():
+        t=total["tools"].setdefault(name,{"calls":0,"total":0.0,"self":0.0,"durations":[],"tokens":0})
+        for k in ("calls","total","self","tokens"): t[k]+=a[k]
+        t["durations"].extend(a["durations"])
+    for label,(n,tok) in part["steps"].items():
+        agg=total["steps"].setdefault(label,[0,0]); agg[0]+=n; agg[1]+=tok
+    for k in ("time_stacks","token_stacks"):
+        for key,v in part[k].items(): total[k][key]=total[k].get(key,0)+v
+    for k in ("unfinished","unmatched"): total[k]+=part[k]
+
+def profile(args):
+    files=list(dict.fromkeys(_iter_files(args.file)))
+    if not files: print(f"{YELLOW}No trace files found{RESET}"); return
+    total={"tools":{},"steps":{},"time_stacks":{},"token_stacks":{},"unfinished":0,"unmatched":0}; failed=0
+    if len(files)==1 or args.workers==1:
+        for f in files: _merge(total,_profile_file(f))
+    else:
+        with ProcessPoolExecutor(max_workers=args.workers or os.cpu_count()) as pool:
+            futs={pool.submit(_profile_file,f):f for f in files}
+            for fut in as_completed(futs):
+                try: _merge(total,fut.result())
+                except (ValueError,OSError) as e: failed+=1; print(f"{RED}{futs[fut]}: {e}{RESET}")
+    tools=total["tools"]; self_sum=sum(a["self"] for a in tools.values()) or 1
+    key={"self":lambda a:a["self"],"total":lambda a:a["total"],"calls":lambda a:a["calls"],"tokens":lambda a:a["tokens"]}[args.sort]
+    print(f"{GREEN}Profile: {len(files)-failed} traces, {sum(a['calls'] for a in tools.values()):,} tool calls, {sum(a['self'] for a in tools.values()):.1f}s in tools{RESET}")
+    print(f"\n  {'Tool':<28} {'Calls':>8} {'Total s':>10} {'Self s':>10} {'Self %':>7} {'Mean ms':>9} {'p95 ms':>9} {'Max ms':>9} {'Tokens':>10}")
+    print("  "+"-"*106)
+    for name,a in sorted(tools.items(),key=lambda x:key(x[1]),reverse=True)[:args.top]:
+        d=sorted(a["durations"]); mean=sum(d)/len(d)*1000 if d else 0
+        p95=d[min(len(d)-1,int(len(d)*0.95))]*1000 if d else 0; mx=d[-1]*1000 if d else 0
+        print(f"  {name[:28]:<28} {a['calls']:>8,} {a['total']:>10.2f} {a['self']:>10.2f} {a['self']/self_sum:>6.1%} {mean:>9.1f} {p95:>9.1f} {mx:>9.1f} {a['tokens']:>10,}")
+    steps=[(l,n,tok) for l,(n,tok) in total["steps"].items() if tok]
+    if steps:
+        print(f"\n  {'Step':<40} {'Count':>8} {'Tokens':>12} {'Mean':>8}")
+        print("  "+"-"*71)
+        for label,n,tok in sorted(steps,key=lambda x:x[2],reverse=True)[:args.top]: print(f"  {label[:40]:<40} {n:>8,} {tok:>12,} {tok/n:>8.0f}")
+        print(f"  {'total':<40} {sum(n for _,n,_ in steps):>8,} {sum(t for _,_,t in steps):>12,}")
+    if total["unfinished"] or total["unmatched"]: print(f"\n{YELLOW}{total['unfinished']} calls without a result, {total['unmatched']} results without a call{RESET}")
+    if args.collapsed:
+        # Brendan Gregg's folded format: "frame;frame;frame value", integer values.
+        stacks=total["time_stacks"] if args.weight=="time" else total["token_stacks"]
+        scale=1e6 if args.weight=="time" else 1
+        with open(args.collapsed,"w") as f:
+            for stack,v in sorted(stacks.items()):
+                if round(v*scale)>0: f.write(f"{stack} {round(v*scale)}\n")
+        print(f"{GREEN}Collapsed stacks ({'self time in microseconds' if args.weight=='time' else 'tokens'}) written to {args.collapsed}{RESET}")
+
 def main():
     p=argparse.ArgumentParser(description="Agent Chain Debugger")
     s=p.add_subparsers(dest="command",required=True)
     for cmd in ["parse-trace","visualize"]: s.add_parser(cmd).add_argument("--file",required=True)
     pr=s.add_parser("replay-step"); pr.add_argument("--file",required=True); pr.add_argument("--step-id",type=int,required=True)
     pe=s.add_parser("export-report"); pe.add_argument("--file",required=True); pe.add_argument("--output",default=None); pe.add_argument("--format",choices=["md","json","html"],default="md")
+    pp=s.add_parser("profile"); pp.add_argument("--file",nargs="+",required=True,help="Trace files, directories or glob patterns")
+    pp.add_argument("--sort",choices=["self","total","calls","tokens"],default="self"); pp.add_argument("--top",type=int,default=20)
+    pp.add_argument("--collapsed",default=None,help="Write collapsed stacks for flamegraph.pl / speedscope"); pp.add_argument("--weight",choices=["time","tokens"],default="time"); pp.add_argument("--workers",type=int,default=None)
     args=p.parse_args()
-    {"parse-trace":parse_trace,"visualize":visualize,"replay-step":replay_step,"export-report":export_report}[args.command](args)
+    {"parse-trace":parse_trace,"visualize":visualize,"replay-step":replay_step,"export-report":export_report,"profile":profile}[args.command](args)
 
 if __name__=="__main__": main()
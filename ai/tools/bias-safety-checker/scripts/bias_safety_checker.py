@@ -1,27 +1,135 @@
 #!/usr/bin/env python3
 """Bias & Safety Checker – OC-0120"""
-import argparse, glob, json, os, sys, requests
+import argparse, email.utils, fnmatch, glob, hashlib, json, os, random, re, sqlite3, sys, time, requests
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 RED="\033[91m"; GREEN="\033[92m"; YELLOW="\033[93m"; RESET="\033[0m"
 OPENAI_BASE="https://api.openai.com/v1"
+MODEL="gpt-4o-mini"
+CHECK_CHARS=3000
+CACHE_FILE=os.path.expanduser("~/.openclaw/safety_cache.sqlite")
+RETRIES=5
+_SESSION=None
+
+PII_PATTERNS={
+    "email":re.compile(r"\b[\w.%+-]+@[\w-]+(?:\.[\w-]+)*\.[A-Za-z]{2,}\b"),
+    "phone":re.compile(r"(?<![\w+])(?:\+\d{1,3}[\s.-]?)?(?:\(\d{2,4}\)|\d{2,4})[\s.-]\d{3,4}[\s.-]\d{3,4}(?![\w-])"),
+    "ssn":re.compile(r"\b(?!000|666|9\d\d)\d{3}-(?!00)\d{2}-(?!0000)\d{4}\b"),
+}
+CARD_RE=re.compile(r"\b\d(?:[ -]?\d){12,18}\b")
+# Indicator terms only: a hit routes the chunk to the model, it is not a verdict.
+LEXICON=[
+    "hate","hateful","kill","murder","stupid","idiot","moron","worthless","inferior","subhuman","vermin",
+    "disgusting","terrorist","illegal alien","go back to","bitch","slut","whore","retard","cripple",
+    "nazi","lynch","rape","genocide","inbred","savage","thug",
+]
+GROUP_RE=re.compile(r"\b(?:all|every|most|typical|those)\s+(?:women|men|girls|boys|muslims|jews|christians|hindus|immigrants|"
+                    r"foreigners|blacks|whites|asians|latinos|mexicans|arabs|africans|gays|lesbians|trans people|old people|"
+                    r"disabled people)\b",re.I)
 
 def _key():
     k=os.environ.get("OPENAI_API_KEY")
     if not k: print(f"{RED}Error: OPENAI_API_KEY not set{RESET}"); sys.exit(1)
     return k
 
-def _check(text):
-    prompt=(f"Analyze the following text for: bias (gender, racial, cultural), toxicity, "
+def _session():
+    global _SESSION
+    if _SESSION is None:
+        _SESSION=requests.Session()
+        _SESSION.mount("https://",requests.adapters.HTTPAdapter(pool_connections=1,pool_maxsize=32))
+        _SESSION.headers.update({"Authorization":f"Bearer {_key()}","Content-Type":"application/json"})
+    return _SESSION
+
+def _prompt(text):
+    return (f"Analyze the following text for: bias (gender, racial, cultural), toxicity, "
             f"PII exposure, and potential hallucinations. Return JSON with keys: "
             f"bias_detected(bool), toxicity_score(0-10), pii_found(list), "
             f"hallucination_risk(low/medium/high), issues(list of strings), "
-            f"overall_risk(low/medium/high). Text:\n{text[:3000]}")
-    resp=requests.post(f"{OPENAI_BASE}/chat/completions",
-        headers={"Authorization":f"Bearer {_key()}","Content-Type":"application/json"},
-        json={"model":"gpt-4o-mini","messages":[{"role":"user","content":prompt}],
-              "response_format":{"type":"json_object"}})
-    if not resp.ok: print(f"{RED}API error: {resp.text}{RESET}"); sys.exit(1)
-    return json.loads(resp.json()["choices"][0]["message"]["content"])
+            f"overall_risk(low/medium/high). Text:\n{text[:CHECK_CHARS]}")
+
+def _retry_delay(resp,attempt):
+    """Seconds before the next attempt: the Retry-After header (delta-seconds or HTTP-date) if present, else exponential backoff with jitter."""
+    value=resp.headers.get("Retry-After") if resp is not None else None
+    if value:
+        try: return min(max(float(value),0),60)
+        except ValueError:
+            try: return min(max(email.utils.parsedate_to_datetime(value).timestamp()-time.time(),0),60)
+            except (TypeError,ValueError): pass
+    return min(2**attempt+random.random(),60)
+
+def _llm_check(text):
+    """One JSON-mode check, retrying 429/5xx and connection errors with exponential backoff; raises RuntimeError when retries run out."""
+    for attempt in range(RETRIES+1):
+        try: resp=_session().post(f"{OPENAI_BASE}/chat/completions",json={"model":MODEL,"messages":[{"role":"user","content":_prompt(text)}],"response_format":{"type":"json_object"}},timeout=120)
+        except requests.RequestException as e: resp=None; error=str(e)
+        else:
+            if resp.ok: return json.loads(resp.json()["choices"][0]["message"]["content"])
+            error=resp.text
+            if resp.status_code!=429 and resp.status_code<500: break
+        if attempt<RETRIES:
+            time.sleep(_retry_delay(resp,attempt))
+    raise RuntimeError(error)
+
+def _check(text):
+    try: return _llm_check(text)
+    except RuntimeError as e: print(f"{RED}API error: {e}{RESET}"); sys.exit(1)
+
+def _luhn(digits):
+    total=0
+    for i,d in enumerate(reversed(digits)):
+        d=int(d)
+        if i%2: d=d*2-9 if d>4 else d*2
+        total+=d
+    return total%10==0
+
+def _lexicon_re(extra_file):
+    terms=list(LEXICON)
+    if extra_file:
+        with open(extra_file) as f: terms+=[l.strip() for l in f if l.strip() and not l.startswith("#")]
+    return re.compile(r"\b(?:"+"|".join(re.escape(t) for t in sorted(set(terms),key=len,reverse=True))+r")\b",re.I)
+
+def _prescreen(text,lexicon):
+    """Local scan: counts of PII matches by kind and lexicon/group-generalisation hits."""
+    hits={}
+    cards=sum(1 for m in CARD_RE.finditer(text) if _luhn(re.sub(r"\D","",m.group())))
+    if cards: hits["card"]=cards
+    masked=CARD_RE.sub(" ",text)  # long digit runs are not phone numbers
+    for kind,rx in PII_PATTERNS.items():
+        n=sum(1 for _ in rx.finditer(masked))
+        if n: hits[kind]=n
+    terms=sorted({m.group().lower() for m in lexicon.finditer(text)}|{m.group().lower() for m in GROUP_RE.finditer(text)})
+    if terms: hits["terms"]=terms
+    return hits
+
+def _chunks(text,size):
+    """Paragraph-aligned chunks of at most size chars (longer paragraphs are hard-split)."""
+    out=[]; buf=""
+    for para in re.split(r"\n\s*\n",text):
+        while len(para)>size:
+            if buf: out.append(buf); buf=""
+            out.append(para[:size]); para=para[size:]
+        if buf and len(buf)+len(para)+2>size: out.append(buf); buf=""
+        buf=f"{buf}\n\n{para}" if buf else para
+    if buf.strip(): out.append(buf)
+    return out
+
+RISK={"low":0,"medium":1,"high":2}
+
+def _merge(results,hits):
+    """Fold chunk-level results and pre-screen hits into one file-level result."""
+    pii=[f"{k} x{v}" for k,v in hits.items() if k!="terms"]
+    merged={"overall_risk":"low","bias_detected":False,"toxicity_score":0,"pii_found":pii,
+            "hallucination_risk":"low" if results else "not checked","issues":[],"prescreen":hits}
+    for r in results:
+        for k in ("overall_risk","hallucination_risk"):
+            if RISK.get(r.get(k),-1)>RISK.get(merged[k],-1): merged[k]=r[k]
+        merged["bias_detected"]=merged["bias_detected"] or bool(r.get("bias_detected"))
+        try: merged["toxicity_score"]=max(merged["toxicity_score"],float(r.get("toxicity_score") or 0))
+        except (TypeError,ValueError): pass
+        merged["pii_found"]+=[p for p in r.get("pii_found") or [] if p not in merged["pii_found"]]
+        merged["issues"]+=[i for i in r.get("issues") or [] if i not in merged["issues"]]
+    if not results and pii: merged["overall_risk"]="medium"
+    return merged
 
 def _print_result(r, label=""):
     if label: print(f"\n{YELLOW}{label}{RESET}")
@@ -34,16 +142,57 @@ def _print_result(r, label=""):
     print(f"  Hallucination  : {r.get('hallucination_risk','?')}")
     for issue in r.get("issues",[]):
         print(f"  ⚠ {issue}")
+    if r.get("status")=="unchecked": print(f"  {RED}Unchecked      : {len(r['errors'])} chunk(s) failed ({r['errors'][0][:80]}){RESET}")
 
 def check_text(args): _print_result(_check(args.text))
 def check_file(args):
     with open(args.file) as f: _print_result(_check(f.read()), args.file)
 def batch_check(args):
-    files=glob.glob(os.path.join(args.dir,"*.txt"))+glob.glob(os.path.join(args.dir,"*.md"))
-    results={}
+    patterns=[p.strip() for p in args.pattern.split(",")]
+    if args.recursive: files=[os.path.join(r,n) for r,_,ns in os.walk(args.dir) for n in sorted(ns) if any(fnmatch.fnmatch(n,p) for p in patterns)]
+    else: files=sorted(f for p in patterns for f in glob.glob(os.path.join(args.dir,p)))
+    lexicon=_lexicon_re(args.lexicon); t0=time.perf_counter(); size=min(args.chunk_chars,CHECK_CHARS)
+    os.makedirs(os.path.dirname(CACHE_FILE),exist_ok=True)
+    db=sqlite3.connect(CACHE_FILE); db.execute("CREATE TABLE IF NOT EXISTS results (hash TEXT PRIMARY KEY, result TEXT NOT NULL)")
+    # Pre-screen every chunk locally; only suspicious ones (or all with --no-prescreen) go to the model.
+    docs={}; todo={}; n_chunks=suspicious=hits=0
     for f in files:
-        with open(f) as fh: r=_check(fh.read())
-        results[os.path.basename(f)]=r; _print_result(r,os.path.basename(f))
+        with open(f,encoding="utf-8",errors="replace") as fh: text=fh.read()
+        name=os.path.relpath(f,args.dir); doc=docs[name]={"hits":{},"results":[],"errors":[]}
+        for chunk in _chunks(text,size):
+            n_chunks+=1; found=_prescreen(chunk,lexicon)
+            for k,v in found.items(): doc["hits"][k]=sorted(set(doc["hits"].get(k,[]))|set(v)) if k=="terms" else doc["hits"].get(k,0)+v
+            if not found and args.prescreen: continue
+            suspicious+=1
+            h=hashlib.sha256(f"{MODEL}\0{_prompt('')}\0{chunk}".encode("utf-8")).hexdigest()
+            row=db.execute("SELECT result FROM results WHERE hash = ?",(h,)).fetchone()
+            if row: doc["results"].append(json.loads(row[0])); hits+=1
+            else:
+                names=todo.setdefault(h,(chunk,[]))[1]
+                if name not in names: names.append(name)  # a chunk repeated within one file is checked and counted once
+    print(f"{YELLOW}{len(files)} files, {n_chunks} chunks: {suspicious} suspicious, {hits} cached, {len(todo)} to check with {args.workers} workers{RESET}")
+    failed=0
+    with ThreadPoolExecutor(max_workers=args.workers) as pool:
+        futs={pool.submit(_llm_check,chunk):(h,names) for h,(chunk,names) in todo.items()}
+        for fut in as_completed(futs):
+            h,names=futs[fut]
+            try: r=fut.result()
+            except RuntimeError as e:
+                failed+=1; print(f"  {RED}{names[0]}: {str(e)[:200]}{RESET}")
+                for name in names: docs[name]["errors"].append(str(e)[:200])
+                continue
+            db.execute("INSERT OR REPLACE INTO results VALUES (?, ?)",(h,json.dumps(r))); db.commit()
+            for name in names: docs[name]["results"].append(r)
+    db.close()
+    results={}
+    for name,doc in docs.items():
+        r=results[name]=_merge(doc["results"],doc["hits"])
+        if doc["errors"]: r["status"]="unchecked"; r["errors"]=doc["errors"]  # some chunks never reached the model
+        if not doc["hits"] and not doc["results"] and not doc["errors"]: print(f"  {GREEN}clean{RESET}  {name}")
+        else: _print_result(r,name)
+    risky=sum(1 for r in results.values() if r["overall_risk"]!="low")
+    unchecked=sum(1 for r in results.values() if r["overall_risk"]=="low" and r.get("status")=="unchecked")
+    print(f"\n{GREEN}{len(files)} files in {time.perf_counter()-t0:.1f}s: {len(files)-risky-unchecked} low risk, {risky} flagged, {len(todo)-failed} model calls{RESET}"+(f"  {RED}{unchecked} unchecked, {failed} calls failed{RESET}" if failed else ""))
     if args.output:
         with open(args.output,"w") as fh: json.dump(results,fh,indent=2)
         print(f"\n{GREEN}Report saved to {args.output}{RESET}")
@@ -52,7 +201,7 @@ def generate_report(args):
     output=args.output or "safety_report.md"
     lines=["# Safety & Bias Report\n"]
     for name,r in data.items():
-        lines.append(f"## {name}\n- Risk: {r.get('overall_risk')}\n- Issues: {', '.join(r.get('issues',[]) or ['none'])}\n")
+        lines.append(f"## {name}\n- Risk: {r.get('overall_risk')}"+(f" (unchecked: {len(r.get('errors',[]))} chunk(s) failed)" if r.get("status")=="unchecked" else "")+f"\n- Issues: {', '.join(r.get('issues',[]) or ['none'])}\n")
     with open(output,"w") as f: f.write("\n".join(lines))
     print(f"{GREEN}Report: {output}{RESET}")
 
@@ -62,6 +211,9 @@ def main():
     s.add_parser("check-text").add_argument("--text",required=True)
     s.add_parser("check-file").add_argument("--file",required=True)
     pb=s.add_parser("batch-check"); pb.add_argument("--dir",required=True); pb.add_argument("--output",default=None)
+    pb.add_argument("--pattern",default="*.txt,*.md",help="Comma-separated file name patterns"); pb.add_argument("--recursive",action="store_true")
+    pb.add_argument("--chunk-chars",type=int,default=CHECK_CHARS,help=f"At most {CHECK_CHARS}"); pb.add_argument("--workers",type=int,default=8)
+    pb.add_argument("--lexicon",default=None,help="Extra pre-screen terms, one per line"); pb.add_argument("--no-prescreen",dest="prescreen",action="store_false",help="Send every chunk to the model")
     pr=s.add_parser("generate-report"); pr.add_argument("--results-file",required=True); pr.add_argument("--output",default=None)
     args=p.parse_args()
     {"check-text":check_text,"check-file":check_file,"batch-check":batch_check,"generate-report":generate_report}[args.command](args)
@@ -2,9 +2,16 @@
 """Context Compressor – OC-0117"""
 
 import argparse
+import email.utils
+import hashlib
 import json
 import os
+import random
+import re
+import sqlite3
 import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import requests
 
 RED = "\033[91m"
@@ -13,6 +20,15 @@ YELLOW = "\033[93m"
 RESET = "\033[0m"
 
 OPENAI_BASE = "https://api.openai.com/v1"
+MODEL = "gpt-4o-mini"
+SUMMARY_CACHE = os.path.expanduser("~/.openclaw/compress_cache.sqlite")
+MAX_WORKERS = 16
+RETRIES = 5
+MIN_CHUNK_SUMMARY = 64
+TEXT_INSTRUCTION = ("Summarize the following text in approximately {words} words or fewer, "
+                    "preserving all critical information, key facts, and context:")
+HISTORY_INSTRUCTION = ("Summarize this conversation history into a compressed context of about "
+                       "{words} words that preserves all important information, decisions, and state:")
 
 
 def _key():
@@ -23,28 +39,159 @@ def _key():
     return k
 
 
+_ENCODER = None
+_SESSION = None
+
+
+def _encoder():
+    """The cl100k_base encoder, built once per process; False when tiktoken is missing."""
+    global _ENCODER
+    if _ENCODER is None:
+        try:
+            import tiktoken
+            _ENCODER = tiktoken.get_encoding("cl100k_base")
+        except ImportError:
+            _ENCODER = False
+    return _ENCODER
+
+
 def _count_tokens(text):
-    try:
-        import tiktoken
-        enc = tiktoken.get_encoding("cl100k_base")
-        return len(enc.encode(text))
-    except ImportError:
-        return len(text) // 4
+    enc = _encoder()
+    if enc:
+        return len(enc.encode(text, disallowed_special=()))
+    return len(text) // 4
+
+
+def _split_tokens(text, chunk_tokens):
+    """Split text into pieces of at most chunk_tokens, preferring paragraph boundaries."""
+    chunks, cur, cur_tokens = [], [], 0
+    for para in re.split(r"\n\s*\n", text):
+        n = _count_tokens(para)
+        if n > chunk_tokens:
+            enc = _encoder()
+            if enc:
+                ids = enc.encode(para, disallowed_special=())
+                pieces = [enc.decode(ids[i:i + chunk_tokens]) for i in range(0, len(ids), chunk_tokens)]
+            else:
+                step = chunk_tokens * 4
+                pieces = [para[i:i + step] for i in range(0, len(para), step)]
+        else:
+            pieces = [para]
+        for piece in pieces:
+            n = _count_tokens(piece)
+            if cur and cur_tokens + n > chunk_tokens:
+                chunks.append("\n\n".join(cur))
+                cur, cur_tokens = [], 0
+            cur.append(piece)
+            cur_tokens += n
+    if cur:
+        chunks.append("\n\n".join(cur))
+    return chunks
 
 
-def _summarize(text, target_tokens):
+def _session():
+    global _SESSION
+    if _SESSION is None:
+        _SESSION = requests.Session()
+        _SESSION.mount("https://", requests.adapters.HTTPAdapter(pool_maxsize=MAX_WORKERS))
+        _SESSION.headers.update({"Authorization": f"Bearer {_key()}",
+                                 "Content-Type": "application/json"})
+    return _SESSION
+
+
+def _retry_delay(resp, attempt):
+    """Seconds before the next attempt: the Retry-After header (delta-seconds or HTTP-date) if present, else exponential backoff with jitter."""
+    value = resp.headers.get("Retry-After") if resp is not None else None
+    if value:
+        try:
+            return min(max(float(value), 0), 60)
+        except ValueError:
+            try:
+                return min(max(email.utils.parsedate_to_datetime(value).timestamp() - time.time(), 0), 60)
+            except (TypeError, ValueError):
+                pass
+    return min(2 ** attempt + random.random(), 60)
+
+
+def _chat(prompt):
+    """One chat completion, retrying 429/5xx and connection errors with exponential backoff."""
+    for attempt in range(RETRIES + 1):
+        try:
+            resp = _session().post(f"{OPENAI_BASE}/chat/completions", timeout=300,
+                                   json={"model": MODEL, "messages": [{"role": "user", "content": prompt}]})
+        except requests.RequestException as e:
+            resp, error = None, str(e)
+        else:
+            if resp.ok:
+                return resp.json()["choices"][0]["message"]["content"]
+            error = resp.text
+            if resp.status_code != 429 and resp.status_code < 500:
+                break
+        if attempt < RETRIES:
+            time.sleep(_retry_delay(resp, attempt))
+    raise RuntimeError(error)
+
+
+def _summarize(text, target_tokens, instruction=TEXT_INSTRUCTION):
     word_limit = target_tokens * 0.75
-    prompt = (f"Summarize the following text in approximately {int(word_limit)} words or fewer, "
-              f"preserving all critical information, key facts, and context:\n\n{text[:20000]}")
-    resp = requests.post(
-        f"{OPENAI_BASE}/chat/completions",
-        headers={"Authorization": f"Bearer {_key()}", "Content-Type": "application/json"},
-        json={"model": "gpt-4o-mini", "messages": [{"role": "user", "content": prompt}]},
-    )
-    if not resp.ok:
-        print(f"{RED}API error: {resp.text}{RESET}")
-        sys.exit(1)
-    return resp.json()["choices"][0]["message"]["content"]
+    return _chat(f"{instruction.format(words=int(word_limit))}\n\n{text}")
+
+
+def _cache_open():
+    os.makedirs(os.path.dirname(SUMMARY_CACHE), exist_ok=True)
+    db = sqlite3.connect(SUMMARY_CACHE)
+    db.execute("CREATE TABLE IF NOT EXISTS summaries (key BLOB PRIMARY KEY, summary TEXT) WITHOUT ROWID")
+    return db
+
+
+def _summary_key(text, target_tokens, instruction):
+    return hashlib.sha256(f"{MODEL}\0{instruction}\0{target_tokens}\0{text}".encode("utf-8")).digest()
+
+
+def _map_reduce(text, target_tokens, chunk_tokens, workers, instruction=TEXT_INSTRUCTION):
+    """Summarise text of any length down to target_tokens.
+
+    Each round splits the text into chunk_tokens pieces, summarises them
+    concurrently (each to its share of the budget, at most half its size) and
+    joins the results; rounds repeat until the text fits a single final call.
+    Chunk summaries are cached by content hash, so re-compressing an edited
+    document only pays for the chunks that changed.
+    """
+    db = _cache_open()
+    try:
+        level = 0
+        while _count_tokens(text) > chunk_tokens:
+            level += 1
+            chunks = _split_tokens(text, chunk_tokens)
+            share = max(MIN_CHUNK_SUMMARY, min(chunk_tokens // 2, target_tokens // len(chunks)))
+            keys = [_summary_key(c, share, instruction) for c in chunks]
+            summaries = {}
+            for key in keys:
+                row = db.execute("SELECT summary FROM summaries WHERE key = ?", (key,)).fetchone()
+                if row:
+                    summaries[key] = row[0]
+            todo = {k: c for k, c in zip(keys, chunks) if k not in summaries}
+            print(f"{YELLOW}  Level {level}: {len(chunks)} chunks, {len(chunks) - len(todo)} cached, "
+                  f"~{share} tokens each{RESET}", file=sys.stderr)
+            with ThreadPoolExecutor(max_workers=max(1, min(workers, MAX_WORKERS))) as pool:
+                futures = {pool.submit(_summarize, c, share, instruction): k for k, c in todo.items()}
+                for future in as_completed(futures):
+                    key = futures[future]
+                    summaries[key] = future.result()
+                    db.execute("INSERT OR REPLACE INTO summaries VALUES (?, ?)", (key, summaries[key]))
+                    db.commit()
+            reduced = "\n\n".join(summaries[k] for k in keys)
+            if _count_tokens(reduced) >= _count_tokens(text):
+                # Another round would not converge and the text is still too big for one call.
+                raise ValueError(f"summaries at level {level} did not shrink the text "
+                                 f"({_count_tokens(reduced):,} tokens, still above --chunk-tokens "
+                                 f"{chunk_tokens:,}); try a larger --chunk-tokens or --target-tokens")
+            text = reduced
+            if _count_tokens(text) <= target_tokens:
+                return text
+        return _summarize(text, target_tokens, instruction)
+    finally:
+        db.close()
 
 
 def compress(args):
@@ -56,7 +203,14 @@ def compress(args):
         print(f"{GREEN}Already within target.{RESET}")
         print(text)
         return
-    compressed = _summarize(text, args.target_tokens)
+    try:
+        compressed = _map_reduce(text, args.target_tokens, args.chunk_tokens, args.workers)
+    except RuntimeError as e:
+        print(f"{RED}API error: {e}{RESET}")
+        sys.exit(1)
+    except ValueError as e:
+        print(f"{RED}Cannot compress: {e}{RESET}")
+        sys.exit(1)
     new_tokens = _count_tokens(compressed)
     print(f"{GREEN}Compressed: {new_tokens:,} tokens (reduction: {100*(1-new_tokens/original_tokens):.0f}%){RESET}")
     print()
@@ -72,14 +226,15 @@ def summarize_history(args):
         data = json.load(f)
     messages = data if isinstance(data, list) else data.get("messages", [])
     conversation = "\n".join(f"{m.get('role','?').upper()}: {m.get('content','')}" for m in messages)
-    prompt = (f"Summarize this conversation history into a compressed context that preserves "
-              f"all important information, decisions, and state:\n\n{conversation[:15000]}")
-    resp = requests.post(
-        f"{OPENAI_BASE}/chat/completions",
-        headers={"Authorization": f"Bearer {_key()}", "Content-Type": "application/json"},
-        json={"model": "gpt-4o-mini", "messages": [{"role": "user", "content": prompt}]},
-    )
-    result = resp.json()["choices"][0]["message"]["content"]
+    try:
+        result = _map_reduce(conversation, args.target_tokens, args.chunk_tokens, args.workers,
+                             HISTORY_INSTRUCTION)
+    except RuntimeError as e:
+        print(f"{RED}API error: {e}{RESET}")
+        sys.exit(1)
+    except ValueError as e:
+        print(f"{RED}Cannot compress: {e}{RESET}")
+        sys.exit(1)
     print(f"{GREEN}Compressed history ({len(messages)} messages → summary):{RESET}")
     print(result)
 
@@ -121,9 +276,14 @@ def main():
     p_c.add_argument("--file", required=True)
     p_c.add_argument("--target-tokens", type=int, required=True)
     p_c.add_argument("--output", default=None)
+    p_c.add_argument("--chunk-tokens", type=int, default=6000, help="Tokens per map-step chunk")
+    p_c.add_argument("--workers", type=int, default=4, help="Concurrent summarisation calls")
 
     p_h = sub.add_parser("summarize-history")
     p_h.add_argument("--file", required=True)
+    p_h.add_argument("--target-tokens", type=int, default=2000)
+    p_h.add_argument("--chunk-tokens", type=int, default=6000)
+    p_h.add_argument("--workers", type=int, default=4)
 
     p_t = sub.add_parser("truncate")
     p_t.add_argument("--file", required=True)
@@ -1,57 +1,349 @@
 #!/usr/bin/env python3
 """Embedding Drift Detector – OC-0125"""
-import argparse, json, math, os, sys, requests
+import argparse, email.utils, hashlib, json, math, os, random, sqlite3, sys, time, requests
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 RED="\033[91m"; GREEN="\033[92m"; YELLOW="\033[93m"; RESET="\033[0m"
 BASE="https://api.openai.com/v1"
 CFG_FILE=os.path.expanduser("~/.openclaw/drift_config.json")
+BASELINE_DIR=os.path.expanduser("~/.openclaw/drift")
+EMBED_CACHE=os.path.expanduser("~/.openclaw/embedding_cache.sqlite")
+EMBED_MODEL="text-embedding-3-small"
+EMBED_BATCH_INPUTS=2048; EMBED_BATCH_TOKENS=250_000; EMBED_WORKERS=4; EMBED_RETRIES=5
+DIST_SAMPLE=2000; SIM_BLOCK=65536; RESERVOIR_SIZE=1000; STREAM_BATCH=256
+_ENCODER=None; _SESSION=None
 
 def _key():
     k=os.environ.get("OPENAI_API_KEY")
     if not k: print(f"{RED}Error: OPENAI_API_KEY not set{RESET}"); sys.exit(1)
     return k
 
-def _embed(texts):
-    resp=requests.post(f"{BASE}/embeddings",
-        headers={"Authorization":f"Bearer {_key()}","Content-Type":"application/json"},
-        json={"model":"text-embedding-3-small","input":texts})
-    if not resp.ok: print(f"{RED}Embedding error: {resp.text}{RESET}"); sys.exit(1)
-    return [d["embedding"] for d in resp.json()["data"]]
+def _token_len(text):
+    global _ENCODER
+    if _ENCODER is None:
+        try:
+            import tiktoken; _ENCODER=tiktoken.get_encoding("cl100k_base")
+        except ImportError: _ENCODER=False
+    return len(_ENCODER.encode(text,disallowed_special=())) if _ENCODER else len(text)//4+1
 
-def _cos(a,b):
-    dot=sum(x*y for x,y in zip(a,b))
-    return dot/(math.sqrt(sum(x*x for x in a))*math.sqrt(sum(x*x for x in b))+1e-10)
+def _session():
+    global _SESSION
+    if _SESSION is None:
+        _SESSION=requests.Session()
+        _SESSION.mount("https://",requests.adapters.HTTPAdapter(pool_connections=1,pool_maxsize=EMBED_WORKERS))
+        _SESSION.headers.update({"Authorization":f"Bearer {_key()}","Content-Type":"application/json"})
+    return _SESSION
+
+def _cache_open():
+    os.makedirs(os.path.dirname(EMBED_CACHE),exist_ok=True)
+    db=sqlite3.connect(EMBED_CACHE)
+    db.execute("CREATE TABLE IF NOT EXISTS embeddings (model TEXT, hash BLOB, vec BLOB, PRIMARY KEY (model, hash)) WITHOUT ROWID")
+    return db
+
+def _embed_batches(items):
+    """Group (key, text) pairs so each request stays under the input and token limits."""
+    batch=[]; tokens=0
+    for key,text in items:
+        n=_token_len(text)
+        if batch and (len(batch)>=EMBED_BATCH_INPUTS or tokens+n>EMBED_BATCH_TOKENS): yield batch; batch=[]; tokens=0
+        batch.append((key,text)); tokens+=n
+    if batch: yield batch
+
+def _retry_delay(resp,attempt):
+    """Seconds before the next attempt: the Retry-After header (delta-seconds or HTTP-date) if present, else exponential backoff with jitter."""
+    value=resp.headers.get("Retry-After") if resp is not None else None
+    if value:
+        try: return min(max(float(value),0),60)
+        except ValueError:
+            try: return min(max(email.utils.parsedate_to_datetime(value).timestamp()-time.time(),0),60)
+            except (TypeError,ValueError): pass
+    return min(2**attempt+random.random(),60)
+
+def _embed_request(batch):
+    """POST one batch, retrying 429/5xx and connection errors with exponential backoff."""
+    for attempt in range(EMBED_RETRIES+1):
+        try: resp=_session().post(f"{BASE}/embeddings",json={"model":EMBED_MODEL,"input":[t for _,t in batch]},timeout=120)
+        except requests.RequestException as e: resp=None; error=str(e)
+        else:
+            if resp.ok: return [(key,d["embedding"]) for (key,_),d in zip(batch,sorted(resp.json()["data"],key=lambda d:d["index"]))]
+            error=resp.text
+            if resp.status_code!=429 and resp.status_code<500: break
+        if attempt<EMBED_RETRIES:
+            time.sleep(_retry_delay(resp,attempt))
+    raise RuntimeError(error)
+
+def _embed(texts,report=False):
+    """Embed texts through the (model, sha256) SQLite cache shared with rag-manager; misses go out in concurrent token-bounded batches."""
+    t0=time.perf_counter()
+    hashes=[hashlib.sha256(t.encode("utf-8")).digest() for t in texts]
+    vectors={}; db=_cache_open(); unique=list(dict.fromkeys(hashes))
+    for lo in range(0,len(unique),500):
+        part=unique[lo:lo+500]
+        for h,blob in db.execute(f"SELECT hash, vec FROM embeddings WHERE model = ? AND hash IN ({','.join('?'*len(part))})",[EMBED_MODEL,*part]):
+            vectors[h]=np.frombuffer(blob,dtype=np.float32)
+    hits=sum(1 for h in hashes if h in vectors)
+    missing={}
+    for h,t in zip(hashes,texts):
+        if h not in vectors: missing.setdefault(h,t)
+    try:
+        with ThreadPoolExecutor(max_workers=EMBED_WORKERS) as pool:
+            for fut in as_completed([pool.submit(_embed_request,b) for b in _embed_batches(missing.items())]):
+                rows=fut.result()
+                db.executemany("INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?)",[(EMBED_MODEL,h,np.asarray(v,dtype=np.float32).tobytes()) for h,v in rows]); db.commit()
+                vectors.update(rows)
+    except RuntimeError as e: print(f"{RED}Embedding error: {e}{RESET}"); sys.exit(1)
+    finally: db.close()
+    if report and texts:
+        el=time.perf_counter()-t0
+        print(f"{YELLOW}  {len(texts)} embeddings in {el:.2f}s ({len(texts)/max(el,1e-9):,.0f}/s), cache hit rate {hits/len(texts):.0%}{RESET}")
+    return np.vstack([vectors[h] for h in hashes]) if texts else np.zeros((0,0),dtype=np.float32)
+
+def _normalize(m):
+    m=np.asarray(m,dtype=np.float32)
+    if m.ndim==1: m=m[None,:]
+    return m/np.maximum(np.linalg.norm(m,axis=1,keepdims=True),1e-10)
+
+def _load_collection(path):
+    """Normalised (N, d) embedding matrix for a collection.
+
+    Accepts a rag-manager collection directory (stored embeddings are memory-mapped),
+    a legacy rag-manager JSON ({"chunks", "embeddings"}), or a JSON list of texts or
+    {"text", "embedding"} dicts; chunks without a stored embedding are embedded once.
+    """
+    if os.path.isdir(path):
+        with open(os.path.join(path,"manifest.json")) as f: manifest=json.load(f)
+        mats=[np.load(os.path.join(path,"segments",s["name"],"embeddings.npy"),mmap_mode="r") for s in manifest["segments"]]
+        return np.vstack(mats) if mats else np.zeros((0,0),dtype=np.float32)
+    with open(path) as f: data=json.load(f)
+    if isinstance(data,dict): return _normalize(data["embeddings"]) if data.get("embeddings") else np.zeros((0,0),dtype=np.float32)
+    texts=[c["text"] if isinstance(c,dict) else c for c in data]
+    stored=[c.get("embedding") if isinstance(c,dict) else None for c in data]
+    todo=[i for i,e in enumerate(stored) if e is None]
+    if todo:
+        for i,v in zip(todo,_embed([texts[i] for i in todo],report=True)): stored[i]=v
+    return _normalize(stored) if stored else np.zeros((0,0),dtype=np.float32)
+
+def _sample(m,n,rng):
+    return np.asarray(m) if len(m)<=n else np.asarray(m[np.sort(rng.choice(len(m),n,replace=False))])
+
+def _mean_pairwise(m):
+    """Mean cosine over distinct pairs of normalised rows, exact in O(N*d) via the row sum."""
+    n=len(m)
+    if n<2: return float("nan")
+    s=np.asarray(m,dtype=np.float64).sum(axis=0)
+    return float((s@s-n)/(n*(n-1)))
+
+def _mmd_rbf(x,y):
+    """Unbiased MMD^2 with an RBF kernel; bandwidth from the median pairwise distance."""
+    xx=np.maximum(2-2*(x@x.T),0); yy=np.maximum(2-2*(y@y.T),0); xy=np.maximum(2-2*(x@y.T),0)
+    gamma=1/max(np.median(xy),1e-6)
+    kx=np.exp(-gamma*xx); ky=np.exp(-gamma*yy); kxy=np.exp(-gamma*xy)
+    n,m=len(x),len(y)
+    if n<2 or m<2: return float("nan")
+    return float((kx.sum()-np.trace(kx))/(n*(n-1))+(ky.sum()-np.trace(ky))/(m*(m-1))-2*kxy.mean())
+
+def _ks_per_dim(x,y):
+    """Two-sample Kolmogorov-Smirnov statistic for every dimension at once."""
+    n,m=len(x),len(y)
+    z=np.vstack([x,y]); order=np.argsort(z,axis=0,kind="stable")
+    from_x=order<n
+    cdf_x=np.cumsum(from_x,axis=0)/n; cdf_y=np.cumsum(~from_x,axis=0)/m
+    return np.abs(cdf_x-cdf_y).max(axis=0)
+
+def _distribution_drift(queries,chunks,rng):
+    qs=_sample(queries,DIST_SAMPLE,rng); cs=_sample(chunks,DIST_SAMPLE,rng)
+    qc=np.asarray(queries,dtype=np.float64).mean(axis=0); cc=np.asarray(chunks,dtype=np.float64).mean(axis=0)
+    ks=_ks_per_dim(qs,cs)
+    crit=1.358*math.sqrt((len(qs)+len(cs))/(len(qs)*len(cs)))
+    return {"centroid_shift":float(1-qc@cc/(np.linalg.norm(qc)*np.linalg.norm(cc)+1e-10)),"centroid_l2":float(np.linalg.norm(qc-cc)),
+            "pairwise_queries":_mean_pairwise(queries),"pairwise_chunks":_mean_pairwise(chunks),
+            "pairwise_cross":float(qc@cc),"mmd2_rbf":_mmd_rbf(qs,cs),
+            "ks_mean":float(ks.mean()),"ks_max":float(ks.max()),"ks_dims_over":int((ks>crit).sum()),"dims":len(ks)}
+
+def _topk_sims(q_embs,chunk_embs,k):
+    """Top-k similarities per query from query x chunk matmuls, blocked over chunks to bound memory."""
+    k=min(k,len(chunk_embs)); best=np.full((len(q_embs),0),-np.inf,dtype=np.float32)
+    for lo in range(0,len(chunk_embs),SIM_BLOCK):
+        sims=q_embs@np.asarray(chunk_embs[lo:lo+SIM_BLOCK]).T
+        both=np.hstack([best,sims]); best=-np.partition(-both,k-1,axis=1)[:,:k]
+    return -np.sort(-best,axis=1)
 
 def compute_drift(args):
-    with open(args.collection_file) as f: chunks=json.load(f)
-    q_emb=_embed([args.query])[0]
-    chunk_texts=[c["text"] if isinstance(c,dict) else c for c in chunks[:20]]
-    embs=_embed(chunk_texts)
-    scores=[_cos(q_emb,e) for e in embs]
-    avg=sum(scores)/len(scores); mn=min(scores); mx=max(scores)
-    drift=1-avg
+    chunk_embs=_load_collection(args.collection_file)
+    if not len(chunk_embs): print(f"{YELLOW}Collection is empty.{RESET}"); return
+    q_emb=_normalize(_embed([args.query]))[0]
+    sims=np.asarray(chunk_embs)@q_emb
+    top=_topk_sims(q_emb[None,:],chunk_embs,args.top_k)[0]
+    avg=float(top.mean()); drift=1-avg
     color=GREEN if drift<0.3 else YELLOW if drift<0.5 else RED
-    print(f"{GREEN}Drift Analysis{RESET}")
+    print(f"{GREEN}Drift Analysis{RESET}  ({len(chunk_embs):,} chunks)")
     print(f"  Query      : {args.query[:60]}")
-    print(f"  Avg sim    : {avg:.4f}"); print(f"  Min/Max    : {mn:.4f}/{mx:.4f}")
+    print(f"  Top-{len(top)} sim  : avg {avg:.4f}  min/max {top.min():.4f}/{top.max():.4f}")
+    print(f"  All chunks : avg {sims.mean():.4f}  min/max {sims.min():.4f}/{sims.max():.4f}")
     print(f"  Drift score: {color}{drift:.4f}{RESET}  ({'OK' if drift<0.3 else 'Warning' if drift<0.5 else 'HIGH DRIFT'})")
 
 def monitor_collection(args):
-    with open(args.collection_file) as f: chunks=json.load(f)
+    chunk_embs=_load_collection(args.collection_file)
     with open(args.query_file) as f: queries=[l.strip() for l in f if l.strip()]
-    chunk_texts=[c["text"] if isinstance(c,dict) else c for c in chunks[:10]]
-    chunk_embs=_embed(chunk_texts)
+    if not len(chunk_embs) or not queries: print(f"{YELLOW}Nothing to compare: {len(chunk_embs)} chunks, {len(queries)} queries.{RESET}"); return
+    args.threshold=args.threshold if args.threshold is not None else _threshold(args.collection)
+    q_embs=_normalize(_embed(queries,report=True))
+    drifts=1-_topk_sims(q_embs,chunk_embs,args.top_k).mean(axis=1)
     alerts=[]
-    for q in queries:
-        q_emb=_embed([q])[0]
-        avg=sum(_cos(q_emb,e) for e in chunk_embs)/len(chunk_embs)
-        drift=1-avg
+    for q,drift in zip(queries,drifts):
         if drift>args.threshold: alerts.append((q,drift))
         color=RED if drift>args.threshold else GREEN
         print(f"  {color}drift={drift:.3f}{RESET}  {q[:60]}")
+    d=_distribution_drift(q_embs,chunk_embs,np.random.default_rng(0))
+    print(f"\n{GREEN}Distribution drift ({len(queries)} queries vs {len(chunk_embs):,} chunks){RESET}")
+    print(f"  Centroid shift      : {d['centroid_shift']:.4f}  (L2 {d['centroid_l2']:.4f})")
+    print(f"  Mean pairwise sim   : queries {d['pairwise_queries']:.4f}  chunks {d['pairwise_chunks']:.4f}  cross {d['pairwise_cross']:.4f}")
+    print(f"  MMD^2 (RBF)         : {d['mmd2_rbf']:.5f}")
+    print(f"  KS per dimension    : mean {d['ks_mean']:.4f}  max {d['ks_max']:.4f}  {d['ks_dims_over']}/{d['dims']} dims over p=0.05")
     if alerts: print(f"\n{RED}{len(alerts)} query(s) exceed threshold {args.threshold}{RESET}")
     else: print(f"\n{GREEN}All queries within threshold{RESET}")
 
+
+def _threshold(collection,default=0.3):
+    """Per-collection threshold saved by set-threshold, else the default."""
+    if collection and os.path.exists(CFG_FILE):
+        with open(CFG_FILE) as f: cfg=json.load(f)
+        if collection in cfg: return cfg[collection]["threshold"]
+    return default
+
+def _baseline_path(collection): return os.path.join(BASELINE_DIR,f"{collection}.npz")
+def _state_path(collection): return os.path.join(BASELINE_DIR,f"{collection}.watch.json")
+
+def snapshot_baseline(args):
+    chunk_embs=_load_collection(args.collection_file)
+    if not len(chunk_embs): print(f"{YELLOW}Collection is empty.{RESET}"); return
+    rng=np.random.default_rng(args.seed)
+    # One streaming pass in blocks for the first and second moments.
+    n=len(chunk_embs); total=np.zeros(chunk_embs.shape[1]); sq=np.zeros(chunk_embs.shape[1])
+    for lo in range(0,n,SIM_BLOCK):
+        block=np.asarray(chunk_embs[lo:lo+SIM_BLOCK],dtype=np.float64); total+=block.sum(axis=0); sq+=(block*block).sum(axis=0)
+    mean=total/n; var=np.maximum(sq/n-mean*mean,0)
+    sample=_sample(chunk_embs,args.sample_size,rng).astype(np.float32)
+    # Covariance sketch: leading principal directions and variances of the sample.
+    _,sv,vt=np.linalg.svd(sample-mean.astype(np.float32),full_matrices=False)
+    r=min(args.components,len(sv))
+    self_sims=_topk_sims(sample,sample,args.top_k+1)[:,1:]
+    os.makedirs(BASELINE_DIR,exist_ok=True)
+    np.savez(_baseline_path(args.collection),centroid=mean.astype(np.float32),variance=var.astype(np.float32),
+             components=vt[:r].astype(np.float32),component_var=(sv[:r]**2/max(len(sample)-1,1)).astype(np.float32),
+             sample=sample,count=np.int64(n),top_k=np.int64(args.top_k),sample_drift=np.float32(1-self_sims.mean()))
+    if os.path.exists(_state_path(args.collection)): os.remove(_state_path(args.collection))
+    size=os.path.getsize(_baseline_path(args.collection))
+    print(f"{GREEN}Baseline for '{args.collection}' saved: {n:,} chunks, {len(sample)} sampled, {r} components ({size/1e6:.1f} MB){RESET}")
+    print(f"  {_baseline_path(args.collection)}")
+
+def _load_baseline(collection):
+    path=_baseline_path(collection)
+    if not os.path.exists(path): print(f"{RED}No baseline for '{collection}'. Run snapshot-baseline first.{RESET}"); sys.exit(1)
+    with np.load(path) as z: return {k:z[k] for k in z.files}
+
+def _new_state(dim):
+    return {"n":0,"mean":0.0,"m2":0.0,"ewma":None,"alerting":False,"centroid_sum":[0.0]*dim,"reservoir":[],"seen":0}
+
+def _update_state(st,drifts,embs,alpha,rng):
+    """Fold a batch into the running statistics: Welford mean/variance and EWMA of drift,
+    running query centroid, and a reservoir sample of recent query embeddings."""
+    for d in map(float,drifts):
+        st["n"]+=1; delta=d-st["mean"]; st["mean"]+=delta/st["n"]; st["m2"]+=delta*(d-st["mean"])
+        st["ewma"]=d if st["ewma"] is None else alpha*d+(1-alpha)*st["ewma"]
+    st["centroid_sum"]=(np.asarray(st["centroid_sum"])+embs.sum(axis=0)).tolist()
+    for e in embs:
+        st["seen"]+=1
+        if len(st["reservoir"])<RESERVOIR_SIZE: st["reservoir"].append(e.tolist())
+        else:
+            j=rng.integers(st["seen"])
+            if j<RESERVOIR_SIZE: st["reservoir"][j]=e.tolist()
+
+def _parse_line(line,buf):
+    if not line.strip(): return
+    try: buf.append(json.loads(line))
+    except ValueError: print(f"{YELLOW}Skipping malformed record: {line[:80]!r}{RESET}")
+
+def _iter_stream(path,follow,offset=0):
+    """Yield (records, offset) batches of parsed JSONL records as they become available, where offset is the
+    byte position just past the last line consumed. A line the writer has not finished yet is held back until
+    its newline arrives; without --follow an unterminated final line is used only if it parses."""
+    f=sys.stdin.buffer if path=="-" else open(path,"rb")
+    try:
+        if offset: f.seek(offset)
+        buf=[]; pending=b""
+        while True:
+            line=f.readline()
+            if line:
+                pending+=line
+                if not pending.endswith(b"\n"): continue
+                line,pending=pending,b""; offset+=len(line)
+                _parse_line(line,buf)
+                if len(buf)<STREAM_BATCH: continue
+            elif pending and not follow:
+                try: buf.append(json.loads(pending)); offset+=len(pending)
+                except ValueError: print(f"{YELLOW}Stopping before an incomplete last line at byte {offset}{RESET}")
+                pending=b""
+            if buf: yield buf,offset; buf=[]
+            if not line:
+                if not follow: return
+                time.sleep(0.5)
+    finally:
+        if f is not sys.stdin.buffer: f.close()
+
+def _save_state(path,st):
+    with open(path+".tmp","w") as f: json.dump(st,f)
+    os.replace(path+".tmp",path)
+
+def _report(collection,st,base,threshold):
+    std=math.sqrt(st["m2"]/(st["n"]-1)) if st["n"]>1 else 0.0
+    c=np.asarray(st["centroid_sum"])/max(st["seen"],1); bc=base["centroid"]
+    shift=1-float(c@bc/(np.linalg.norm(c)*np.linalg.norm(bc)+1e-10))
+    res=np.asarray(st["reservoir"],dtype=np.float32)
+    mmd=_mmd_rbf(_normalize(res),base["sample"]) if len(res)>1 else float("nan")
+    color=RED if st["alerting"] else GREEN
+    print(f"  {color}[{collection}] n={st['n']:,}  ewma={st['ewma']:.4f}  mean={st['mean']:.4f}±{std:.4f}  "
+          f"centroid_shift={shift:.4f}  mmd2={mmd:.5f}  threshold={threshold}{RESET}")
+
+def watch(args):
+    base=_load_baseline(args.collection)
+    threshold=args.threshold if args.threshold is not None else _threshold(args.collection)
+    state_file=_state_path(args.collection)
+    st=_new_state(len(base["centroid"]))
+    if os.path.exists(state_file) and not args.reset:
+        with open(state_file) as f: st=json.load(f)
+    rng=np.random.default_rng(); k=int(base["top_k"]); last=st["n"]; source=None; start=0
+    if args.stream!="-":
+        fs=os.stat(args.stream); source=[os.path.abspath(args.stream),fs.st_dev,fs.st_ino]
+        prev=st.get("stream") or {}
+        if prev.get("file")==source and prev.get("offset",0)<=fs.st_size: start=prev["offset"]
+    print(f"{GREEN}Watching {args.stream} for '{args.collection}' (threshold {threshold}, baseline drift {float(base['sample_drift']):.4f}){RESET}")
+    if start: print(f"  Resuming after byte {start:,} already counted in the saved state")
+    try:
+        for records,offset in _iter_stream(args.stream,args.follow,start):
+            embs=[r.get("embedding") for r in records]
+            todo=[i for i,e in enumerate(embs) if e is None]
+            if todo:
+                for i,v in zip(todo,_embed([records[i].get("query") or records[i].get("text","") for i in todo])): embs[i]=v
+            embs=_normalize(embs)
+            drifts=1-_topk_sims(embs,base["sample"],k).mean(axis=1)
+            _update_state(st,drifts,embs,args.alpha,rng)
+            if source: st["stream"]={"file":source,"offset":offset}
+            if st["ewma"]>threshold and not st["alerting"]:
+                st["alerting"]=True
+                print(f"{RED}DRIFT ALERT  [{args.collection}] ewma drift {st['ewma']:.4f} crossed threshold {threshold} after {st['n']:,} queries{RESET}")
+            elif st["ewma"]<=threshold and st["alerting"]:
+                st["alerting"]=False
+                print(f"{GREEN}Recovered  [{args.collection}] ewma drift {st['ewma']:.4f} back under {threshold}{RESET}")
+            if st["n"]-last>=args.report_every:
+                _report(args.collection,st,base,threshold); last=st["n"]
+                _save_state(state_file,st)
+    except KeyboardInterrupt: pass
+    _save_state(state_file,st)
+    if st["n"]: _report(args.collection,st,base,threshold)
+
+
 def set_threshold(args):
     cfg={}
     if os.path.exists(CFG_FILE):
@@ -73,10 +365,12 @@ def main():
     p=argparse.ArgumentParser(description="Embedding Drift Detector")
     s=p.add_subparsers(dest="command",required=True)
     pcd=s.add_parser("compute-drift"); pcd.add_argument("--query",required=True); pcd.add_argument("--collection-file",required=True); pcd.add_argument("--top-k",type=int,default=5)
-    pm=s.add_parser("monitor-collection"); pm.add_argument("--collection-file",required=True); pm.add_argument("--query-file",required=True); pm.add_argument("--threshold",type=float,default=0.3)
+    pm=s.add_parser("monitor-collection"); pm.add_argument("--collection-file",required=True); pm.add_argument("--query-file",required=True); pm.add_argument("--threshold",type=float,default=None); pm.add_argument("--top-k",type=int,default=5); pm.add_argument("--collection",default=None,help="Name whose set-threshold value applies")
     ps=s.add_parser("set-threshold"); ps.add_argument("--value",type=float,required=True); ps.add_argument("--collection",required=True)
+    pb=s.add_parser("snapshot-baseline"); pb.add_argument("--collection",required=True); pb.add_argument("--collection-file",required=True); pb.add_argument("--sample-size",type=int,default=2000); pb.add_argument("--components",type=int,default=32); pb.add_argument("--top-k",type=int,default=5); pb.add_argument("--seed",type=int,default=0)
+    pw=s.add_parser("watch"); pw.add_argument("--collection",required=True); pw.add_argument("--stream",default="-",help="JSONL of {\"embedding\": [...]} or {\"query\": \"...\"}; - for stdin"); pw.add_argument("--follow",action="store_true"); pw.add_argument("--alpha",type=float,default=0.05); pw.add_argument("--threshold",type=float,default=None); pw.add_argument("--report-every",type=int,default=1000); pw.add_argument("--reset",action="store_true")
     pa=s.add_parser("generate-alert"); pa.add_argument("--drift-score",type=float,required=True); pa.add_argument("--collection",required=True)
     args=p.parse_args()
-    {"compute-drift":compute_drift,"monitor-collection":monitor_collection,"set-threshold":set_threshold,"generate-alert":generate_alert}[args.command](args)
+    {"compute-drift":compute_drift,"monitor-collection":monitor_collection,"set-threshold":set_threshold,"generate-alert":generate_alert,"snapshot-baseline":snapshot_baseline,"watch":watch}[args.command](args)
 
 if __name__=="__main__": main()
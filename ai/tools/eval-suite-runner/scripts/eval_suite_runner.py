@@ -1,10 +1,15 @@
 #!/usr/bin/env python3
 """Eval Suite Runner – OC-0126"""
-import argparse, json, os, sys, time, requests
+import argparse, email.utils, hashlib, json, os, random, sqlite3, sys, threading, time, requests
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 RED="\033[91m"; GREEN="\033[92m"; YELLOW="\033[93m"; RESET="\033[0m"
 BASE="https://api.openai.com/v1"
 SUITES_DIR=os.path.expanduser("~/.openclaw/suites")
+RUNS_DIR=os.path.expanduser("~/.openclaw/eval_runs")
+RESPONSE_CACHE=os.path.expanduser("~/.openclaw/eval_cache.sqlite")
+RETRIES=5
+_SESSION=None
 
 def _key():
     k=os.environ.get("OPENAI_API_KEY")
@@ -14,12 +19,88 @@ def _key():
 def _load_suite(suite_file):
     with open(suite_file) as f: return json.load(f)
 
-def _run_model(prompt, model):
-    resp=requests.post(f"{BASE}/chat/completions",
-        headers={"Authorization":f"Bearer {_key()}","Content-Type":"application/json"},
-        json={"model":model,"messages":[{"role":"user","content":prompt}]},timeout=30)
-    if not resp.ok: return None
-    return resp.json()["choices"][0]["message"]["content"]
+def _session(pool_size):
+    global _SESSION
+    if _SESSION is None:
+        _SESSION=requests.Session()
+        _SESSION.mount("https://",requests.adapters.HTTPAdapter(pool_connections=1,pool_maxsize=pool_size))
+        _SESSION.headers.update({"Authorization":f"Bearer {_key()}","Content-Type":"application/json"})
+    return _SESSION
+
+def _limiter(rpm,tpm):
+    """Token buckets for requests and tokens per minute; acquire(n) blocks until both allow a request of ~n tokens."""
+    lock=threading.Lock(); state={"req":float(rpm or 0),"tok":float(tpm or 0),"t":time.monotonic()}
+    def refill():
+        now=time.monotonic(); el=now-state["t"]; state["t"]=now
+        if rpm: state["req"]=min(rpm,state["req"]+el*rpm/60)
+        if tpm: state["tok"]=min(tpm,state["tok"]+el*tpm/60)
+    def acquire(n):
+        n=min(n,tpm) if tpm else 0
+        while True:
+            with lock:
+                refill()
+                if (not rpm or state["req"]>=1) and (not tpm or state["tok"]>=n):
+                    if rpm: state["req"]-=1
+                    if tpm: state["tok"]-=n
+                    return
+                wait=max((1-state["req"])*60/rpm if rpm else 0,(n-state["tok"])*60/tpm if tpm else 0)
+            time.sleep(min(max(wait,0.01),5))
+    def debit(n):
+        if tpm:
+            with lock: state["tok"]-=n
+    return acquire,debit
+
+def _retry_delay(resp,attempt):
+    """Seconds before the next attempt: the Retry-After header (delta-seconds or HTTP-date) if present, else exponential backoff with jitter."""
+    value=resp.headers.get("Retry-After") if resp is not None else None
+    if value:
+        try: return min(max(float(value),0),60)
+        except ValueError:
+            try: return min(max(email.utils.parsedate_to_datetime(value).timestamp()-time.time(),0),60)
+            except (TypeError,ValueError): pass
+    return min(2**attempt+random.random(),60)
+
+def _run_model(prompt,model,params,limit=None,pool_size=1):
+    """One chat completion, retrying 429/5xx and connection errors with exponential backoff; raises RuntimeError when retries run out."""
+    est=len(prompt)//4+params.get("max_tokens",256)
+    for attempt in range(RETRIES+1):
+        if limit: limit[0](est)
+        try: resp=_session(pool_size).post(f"{BASE}/chat/completions",json={"model":model,"messages":[{"role":"user","content":prompt}],**params},timeout=120)
+        except requests.RequestException as e: resp=None; error=str(e)
+        else:
+            if resp.ok:
+                data=resp.json()
+                if limit: limit[1](data.get("usage",{}).get("total_tokens",est)-est)
+                return data["choices"][0]["message"]["content"]
+            error=resp.text
+            if resp.status_code!=429 and resp.status_code<500: break
+        if attempt<RETRIES:
+            time.sleep(_retry_delay(resp,attempt))
+    raise RuntimeError(error)
+
+def _cache_open():
+    os.makedirs(os.path.dirname(RESPONSE_CACHE),exist_ok=True)
+    db=sqlite3.connect(RESPONSE_CACHE)
+    db.execute("CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, output TEXT)")
+    return db
+
+def _cache_key(model,prompt,params):
+    return hashlib.sha256(json.dumps([model,prompt,params],sort_keys=True).encode("utf-8")).hexdigest()
+
+def _load_run(path):
+    """A run as {"model", "suite", "tests"}; reads JSONL run files (header line + one line per test) and legacy JSON runs."""
+    if not path.endswith(".jsonl"):
+        with open(path) as f: return json.load(f)
+    run=None; tests={}
+    with open(path) as f:
+        for line in f:
+            if not line.strip(): continue
+            try: rec=json.loads(line)
+            except ValueError: continue  # torn final line from a crash
+            if run is None: run=rec; continue
+            tests[rec["id"]]=rec
+    run=run or {}; run["tests"]=list(tests.values())
+    return run
 
 def _score(output, expected):
     if not expected: return None
@@ -27,24 +108,66 @@ def _score(output, expected):
     words=set(expected.lower().split()); out_words=set(output.lower().split())
     return len(words&out_words)/len(words) if words else 0.0
 
+def _print_result(rec):
+    score=rec["score"]
+    color=GREEN if rec["passed"] else RED
+    print(f"  {color}{'PASS' if rec['passed'] else 'FAIL'}{RESET}  [{rec['id']}]"+(f"  score={score:.2f}" if score is not None else "")+(f"  {RED}error: {rec['error'][:80]}{RESET}" if rec.get("error") else ""))
+
 def run(args):
     suite=_load_suite(args.suite_file)
-    results={"model":args.model,"suite":args.suite_file,"timestamp":time.time(),"tests":[]}
-    passed=failed=0
-    for test in suite.get("tests",[]):
-        output=_run_model(test["prompt"],args.model)
-        score=_score(output or "",test.get("expected",""))
-        ok=score is None or score>=0.5
-        if ok: passed+=1; color=GREEN
-        else: failed+=1; color=RED
-        results["tests"].append({"id":test.get("id","?"),"score":score,"passed":ok,"output":(output or "")[:200]})
-        print(f"  {color}{'PASS' if ok else 'FAIL'}{RESET}  [{test.get('id','?')}]  score={score:.2f}" if score is not None else f"  {GREEN}PASS{RESET}  [{test.get('id','?')}]")
-    print(f"\n{GREEN}{passed} passed{RESET}  {RED if failed else GREEN}{failed} failed{RESET}")
-    if args.output_dir:
+    params={k:v for k,v in (("temperature",args.temperature),("max_tokens",args.max_tokens)) if v is not None}
+    if args.resume:
+        run_file=args.resume
+        if not run_file.endswith(".jsonl"): print(f"{RED}--resume needs a .jsonl run file; {run_file} is a legacy JSON run, so start a new run instead{RESET}"); sys.exit(1)
+        prev=_load_run(run_file)
+        if prev.get("model")!=args.model or prev.get("params",{})!=params:
+            print(f"{RED}Run {run_file} used model {prev.get('model')} with {prev.get('params',{})}; refusing to resume with {args.model} {params}{RESET}"); sys.exit(1)
+        done={t["id"]:t for t in prev["tests"] if not t.get("error")}
+        with open(run_file,"rb+") as f:  # drop a torn final line so appends start clean
+            data=f.read(); f.truncate(data.rfind(b"\n")+1)
+    else:
         os.makedirs(args.output_dir,exist_ok=True)
-        out=os.path.join(args.output_dir,f"run_{int(time.time())}.json")
-        with open(out,"w") as f: json.dump(results,f,indent=2)
-        print(f"{GREEN}Results: {out}{RESET}")
+        run_file=os.path.join(args.output_dir,f"run_{int(time.time())}.jsonl"); done={}
+        with open(run_file,"w") as f: f.write(json.dumps({"model":args.model,"suite":args.suite_file,"timestamp":time.time(),"params":params})+"\n")
+    tests=[dict(t,id=t.get("id",f"test_{i+1}")) for i,t in enumerate(suite.get("tests",[]))]
+    todo=[t for t in tests if t["id"] not in done]
+    if done: print(f"{YELLOW}Resuming {run_file}: {len(done)} done, {len(todo)} to go{RESET}")
+    db=_cache_open(); out=open(run_file,"a"); hits=0; t0=time.perf_counter()
+    def record(test,output,error=None):
+        score=_score(output or "",test.get("expected",""))
+        rec={"id":test["id"],"score":score,"passed":not error and (score is None or score>=0.5),"output":(output or "")[:200]}
+        if error: rec["error"]=error
+        out.write(json.dumps(rec)+"\n"); out.flush()
+        done[test["id"]]=rec; _print_result(rec)
+    try:
+        pending=[]
+        for test in todo:
+            key=_cache_key(args.model,test["prompt"],params)
+            row=db.execute("SELECT output FROM responses WHERE key = ?",(key,)).fetchone()
+            if row: hits+=1; record(test,row[0])
+            else: pending.append((key,test))
+        limit=_limiter(args.rpm,args.tpm) if args.rpm or args.tpm else None
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            futs={pool.submit(_run_model,test["prompt"],args.model,params,limit,args.concurrency):(key,test) for key,test in pending}
+            try:
+                for fut in as_completed(futs):
+                    key,test=futs[fut]
+                    try: output=fut.result()
+                    except RuntimeError as e: record(test,None,str(e)); continue
+                    db.execute("INSERT OR REPLACE INTO responses VALUES (?, ?)",(key,output)); db.commit()
+                    record(test,output)
+            except KeyboardInterrupt:  # drop queued requests instead of waiting for them on the way out
+                pool.shutdown(wait=False,cancel_futures=True); raise
+    except KeyboardInterrupt:
+        print(f"\n{YELLOW}Interrupted; continue with --resume {run_file}{RESET}"); sys.exit(130)
+    finally: out.close(); db.close()
+    el=time.perf_counter()-t0
+    results=[done[t["id"]] for t in tests if t["id"] in done]
+    passed=sum(1 for r in results if r["passed"]); failed=len(results)-passed
+    errors=sum(1 for r in results if r.get("error"))
+    print(f"\n{GREEN}{passed} passed{RESET}  {RED if failed else GREEN}{failed} failed{RESET}"+(f"  {RED}{errors} API errors{RESET}" if errors else ""))
+    print(f"{YELLOW}{len(todo)} tests in {el:.1f}s, {hits} from cache, concurrency {args.concurrency}{RESET}")
+    print(f"{GREEN}Results: {run_file}{RESET}")
 
 def add_test(args):
     if os.path.exists(args.suite_file):
@@ -61,8 +184,7 @@ def list_tests(args):
     for t in suite.get("tests",[]): print(f"  [{t.get('id','?')}] {t['prompt'][:60]}")
 
 def compare_runs(args):
-    with open(args.run_a) as f: a=json.load(f)
-    with open(args.run_b) as f: b=json.load(f)
+    a=_load_run(args.run_a); b=_load_run(args.run_b)
     a_by_id={t["id"]:t for t in a.get("tests",[])}; b_by_id={t["id"]:t for t in b.get("tests",[])}
     print(f"{GREEN}Comparing {a['model']} vs {b['model']}{RESET}")
     for tid in set(a_by_id)|set(b_by_id):
@@ -70,12 +192,15 @@ def compare_runs(args):
         sa=ta.get("score"); sb=tb.get("score")
         diff=f"{(sb or 0)-(sa or 0):+.2f}" if sa is not None and sb is not None else "N/A"
         color=GREEN if (sb or 0)>=(sa or 0) else RED
-        print(f"  [{tid}]  A={sa:.2f}  B={sb:.2f}  {color}Δ={diff}{RESET}")
+        fa=f"{sa:.2f}" if sa is not None else "N/A"; fb=f"{sb:.2f}" if sb is not None else "N/A"
+        print(f"  [{tid}]  A={fa}  B={fb}  {color}Δ={diff}{RESET}")
 
 def main():
     p=argparse.ArgumentParser(description="Eval Suite Runner")
     s=p.add_subparsers(dest="command",required=True)
-    pr=s.add_parser("run"); pr.add_argument("--suite-file",required=True); pr.add_argument("--model",default="gpt-4o-mini"); pr.add_argument("--output-dir",default=None)
+    pr=s.add_parser("run"); pr.add_argument("--suite-file",required=True); pr.add_argument("--model",default="gpt-4o-mini"); pr.add_argument("--output-dir",default=RUNS_DIR)
+    pr.add_argument("--concurrency",type=int,default=4); pr.add_argument("--rpm",type=int,default=None,help="Requests per minute limit"); pr.add_argument("--tpm",type=int,default=None,help="Tokens per minute limit")
+    pr.add_argument("--temperature",type=float,default=None); pr.add_argument("--max-tokens",type=int,default=None); pr.add_argument("--resume",default=None,metavar="RUN_FILE",help="Continue an interrupted .jsonl run")
     pa=s.add_parser("add-test"); pa.add_argument("--suite-file",required=True); pa.add_argument("--prompt",required=True); pa.add_argument("--expected",default=""); pa.add_argument("--id",default=None)
     s.add_parser("list-tests").add_argument("--suite-file",required=True)
     pc=s.add_parser("compare-runs"); pc.add_argument("--run-a",required=True); pc.add_argument("--run-b",required=True)
@@ -1,79 +1,352 @@
 #!/usr/bin/env python3
 """Knowledge Graph Builder – OC-0122"""
-import argparse, json, os, sys, requests
+import argparse, csv, difflib, email.utils, fnmatch, glob, hashlib, json, os, random, re, sqlite3, sys, time, requests
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 RED="\033[91m"; GREEN="\033[92m"; YELLOW="\033[93m"; RESET="\033[0m"
 BASE="https://api.openai.com/v1"
-DEFAULT_GRAPH=os.path.expanduser("~/.openclaw/knowledge.json")
+DEFAULT_GRAPH=os.path.expanduser("~/.openclaw/knowledge.db")
+SQL_BATCH=500  # ids per IN (...) clause
+MODEL="gpt-4o-mini"
+EXTRACT_PROMPT="Extract entities and relationships. Return JSON: {{entities:[{{name,type}}], relationships:[{{from,relation,to}}]}}\n\n{text}"
+RETRIES=5
+BLOCK_LIMIT=200  # candidates read per blocking key; very common tokens are not worth comparing against
+ARTICLES={"the","a","an"}
+_SESSION=None
 
 def _key():
     k=os.environ.get("OPENAI_API_KEY")
     if not k: print(f"{RED}Error: OPENAI_API_KEY not set{RESET}"); sys.exit(1)
     return k
 
+def _session():
+    global _SESSION
+    if _SESSION is None:
+        _SESSION=requests.Session()
+        _SESSION.mount("https://",requests.adapters.HTTPAdapter(pool_connections=1,pool_maxsize=32))
+        _SESSION.headers.update({"Authorization":f"Bearer {_key()}","Content-Type":"application/json"})
+    return _SESSION
+
+def _retry_delay(resp,attempt):
+    """Seconds before the next attempt: the Retry-After header (delta-seconds or HTTP-date) if present, else exponential backoff with jitter."""
+    value=resp.headers.get("Retry-After") if resp is not None else None
+    if value:
+        try: return min(max(float(value),0),60)
+        except ValueError:
+            try: return min(max(email.utils.parsedate_to_datetime(value).timestamp()-time.time(),0),60)
+            except (TypeError,ValueError): pass
+    return min(2**attempt+random.random(),60)
+
 def _chat(prompt):
-    resp=requests.post(f"{BASE}/chat/completions",
-        headers={"Authorization":f"Bearer {_key()}","Content-Type":"application/json"},
-        json={"model":"gpt-4o-mini","messages":[{"role":"user","content":prompt}],
-              "response_format":{"type":"json_object"}})
-    if not resp.ok: print(f"{RED}API error: {resp.text}{RESET}"); sys.exit(1)
-    return json.loads(resp.json()["choices"][0]["message"]["content"])
-
-def _load(graph_file):
-    if os.path.exists(graph_file):
-        with open(graph_file) as f: return json.load(f)
-    return {"nodes":[],"edges":[]}
-
-def _save(graph,graph_file):
-    os.makedirs(os.path.dirname(graph_file),exist_ok=True)
-    with open(graph_file,"w") as f: json.dump(graph,f,indent=2)
+    """JSON-mode completion, retrying 429/5xx and connection errors with exponential backoff; raises RuntimeError when retries run out."""
+    for attempt in range(RETRIES+1):
+        try: resp=_session().post(f"{BASE}/chat/completions",json={"model":MODEL,"messages":[{"role":"user","content":prompt}],"response_format":{"type":"json_object"}},timeout=120)
+        except requests.RequestException as e: resp=None; error=str(e)
+        else:
+            if resp.ok: return json.loads(resp.json()["choices"][0]["message"]["content"])
+            error=resp.text
+            if resp.status_code!=429 and resp.status_code<500: break
+        if attempt<RETRIES:
+            time.sleep(_retry_delay(resp,attempt))
+    raise RuntimeError(error)
+
+def _norm(name): return " ".join(str(name).split()).lower()
+
+def _canon(name):
+    """Resolution key: casefolded, punctuation and possessives stripped, leading article dropped."""
+    words=re.sub(r"[^\w\s]"," ",re.sub(r"['’]s\b","",str(name).casefold())).split()
+    if len(words)>1 and words[0] in ARTICLES: words=words[1:]
+    return " ".join(words)
+
+def _blocks(canon):
+    """Blocking keys for fuzzy matching: each word of 3+ chars, plus the sorted word set for reordered names."""
+    words=canon.split()
+    return {w for w in words if len(w)>=3}|{"~"+" ".join(sorted(words))}
+
+def _open(graph_file):
+    """Open the SQLite graph store, creating it if needed.
+
+    Nodes are keyed by normalised name (unique index) and edges are stored once per
+    (src, relation, dst) with a reverse index, so neighbour lookups in either
+    direction are O(degree). A legacy .json graph is imported into a sibling .db,
+    whether the .json path is passed or the .db is new and the .json sits next to it.
+    """
+    legacy=None
+    if graph_file.endswith(".json"):
+        legacy=graph_file; graph_file=graph_file[:-5]+".db"
+    elif graph_file.endswith(".db"): legacy=graph_file[:-3]+".json"  # e.g. the old default ~/.openclaw/knowledge.json
+    os.makedirs(os.path.dirname(os.path.abspath(graph_file)),exist_ok=True)
+    fresh=not os.path.exists(graph_file)
+    db=sqlite3.connect(graph_file)
+    db.execute("PRAGMA journal_mode=WAL"); db.execute("PRAGMA synchronous=NORMAL"); db.execute("PRAGMA cache_size=-65536")
+    db.executescript("""
+        CREATE TABLE IF NOT EXISTS nodes (id INTEGER PRIMARY KEY, key TEXT NOT NULL UNIQUE, name TEXT NOT NULL, type TEXT);
+        CREATE TABLE IF NOT EXISTS edges (src INTEGER NOT NULL, relation TEXT NOT NULL, dst INTEGER NOT NULL, PRIMARY KEY (src, relation, dst)) WITHOUT ROWID;
+        CREATE INDEX IF NOT EXISTS edges_dst ON edges (dst, relation, src);
+        CREATE TABLE IF NOT EXISTS chunk_cache (hash TEXT PRIMARY KEY, result TEXT NOT NULL);
+        CREATE TABLE IF NOT EXISTS sources (path TEXT PRIMARY KEY, hash TEXT NOT NULL);
+    """)
+    if fresh and legacy and os.path.exists(legacy):
+        with open(legacy) as f: graph=json.load(f)
+        _add_triples(db,graph.get("nodes",[]),graph.get("edges",[])); db.commit()
+        print(f"{YELLOW}Imported {len(graph.get('nodes',[]))} nodes and {len(graph.get('edges',[]))} edges from {legacy} into {graph_file}{RESET}")
+    if not db.execute("SELECT 1 FROM sqlite_master WHERE name = 'aliases'").fetchone():
+        # Alias and blocking tables for entity resolution, backfilled from existing nodes (including a legacy import above).
+        db.executescript("""
+            CREATE TABLE aliases (alias TEXT PRIMARY KEY, node INTEGER NOT NULL);
+            CREATE TABLE blocks (block TEXT NOT NULL, node INTEGER NOT NULL, PRIMARY KEY (block, node)) WITHOUT ROWID;
+        """)
+        _index_nodes(db,db.execute("SELECT id, name FROM nodes").fetchall()); db.commit()
+    return db
+
+def _node_ids(db,names,types=None):
+    """Ids for names, inserting unseen nodes; a known type fills in a missing one."""
+    rows={}
+    for name in names:
+        key=_norm(name)
+        if key and key not in rows: rows[key]=(key,str(name).strip(),(types or {}).get(key))
+    db.executemany("INSERT INTO nodes (key, name, type) VALUES (?, ?, ?) ON CONFLICT(key) DO UPDATE SET type=COALESCE(type, excluded.type)",rows.values())
+    keys=list(rows); ids={}
+    for lo in range(0,len(keys),SQL_BATCH):
+        part=keys[lo:lo+SQL_BATCH]
+        ids.update(db.execute(f"SELECT key, id FROM nodes WHERE key IN ({','.join('?'*len(part))})",part))
+    return ids
+
+def _add_triples(db,entities,relationships):
+    """Insert entities and relationships; duplicates are ignored. Returns (new nodes, new edges)."""
+    n0=db.execute("SELECT COUNT(*) FROM nodes").fetchone()[0]
+    types={_norm(e["name"]):e.get("type") for e in entities if e.get("name")}
+    rels=[(_norm(r["from"]),str(r["relation"]).strip(),_norm(r["to"]),r) for r in relationships if r.get("from") and r.get("to") and r.get("relation")]
+    names={k:e["name"] for k,e in ((_norm(e.get("name","")),e) for e in entities) if k}
+    for a,_,b,r in rels: names.setdefault(a,r["from"]); names.setdefault(b,r["to"])
+    ids=_node_ids(db,names.values(),types)
+    e0=db.total_changes
+    # Sorted inserts walk the edge B-tree in order instead of seeking at random.
+    db.executemany("INSERT OR IGNORE INTO edges VALUES (?, ?, ?)",sorted((ids[a],rel,ids[b]) for a,rel,b,_ in rels if a and b))
+    return db.execute("SELECT COUNT(*) FROM nodes").fetchone()[0]-n0,db.total_changes-e0
+
+def _index_nodes(db,rows):
+    """Register (node id, surface name) pairs as aliases and under their blocking keys."""
+    rows=[(i,_canon(n)) for i,n in rows]
+    db.executemany("INSERT OR IGNORE INTO aliases VALUES (?, ?)",[(c,i) for i,c in rows if c])
+    db.executemany("INSERT OR IGNORE INTO blocks VALUES (?, ?)",[(b,i) for i,c in rows if c for b in _blocks(c)])
+
+def _resolve(db,entities,names,threshold):
+    """Map each surface name to the name of the entity it refers to.
+
+    A name resolves through, in order: an exact alias (normalised form seen before),
+    then the best fuzzy match among candidates sharing a blocking key, scored with
+    difflib and accepted at >= threshold when types do not conflict. Unmatched names
+    become new entities that later names in the same batch can resolve to.
+    """
+    types={_canon(e["name"]):e.get("type") for e in entities if e.get("name")}
+    pending={}; pending_blocks={}; mapping={}
+    for name in dict.fromkeys(names):
+        c=_canon(name)
+        if not c: continue
+        t=types.get(c)
+        if c in pending: mapping[name]=pending[c][0]; continue
+        row=db.execute("SELECT n.name FROM aliases a JOIN nodes n ON n.id = a.node WHERE a.alias = ?",(c,)).fetchone()
+        if row: mapping[name]=row[0]; continue
+        best=None; best_score=threshold
+        if threshold<1:
+            cands={}
+            for b in _blocks(c):
+                for cname,ctype in db.execute("SELECT n.name, n.type FROM blocks b JOIN nodes n ON n.id = b.node WHERE b.block = ? LIMIT ?",(b,BLOCK_LIMIT)): cands[_canon(cname)]=(cname,ctype)
+                for cc in pending_blocks.get(b,()): cands[cc]=pending[cc]
+            for cc,(cname,ctype) in cands.items():
+                if t and ctype and t.lower()!=ctype.lower(): continue
+                score=1.0 if sorted(cc.split())==sorted(c.split()) else difflib.SequenceMatcher(None,c,cc).ratio()
+                if score>=best_score: best,best_score=cname,score
+        if best: mapping[name]=best; pending[c]=(best,t); continue
+        mapping[name]=name; pending[c]=(name,t)
+        for b in _blocks(c): pending_blocks.setdefault(b,[]).append(c)
+    return mapping
+
+def _ingest(db,result,threshold):
+    """Resolve extracted entities against the graph and insert them. Returns (new nodes, new edges)."""
+    entities=[e for e in result.get("entities",[]) if isinstance(e,dict) and e.get("name")]
+    rels=[r for r in result.get("relationships",[]) if isinstance(r,dict) and r.get("from") and r.get("to") and r.get("relation")]
+    surface=[e["name"] for e in entities]+[n for r in rels for n in (r["from"],r["to"])]
+    mapping=_resolve(db,entities,surface,threshold)
+    entities=[dict(e,name=mapping.get(e["name"],e["name"])) for e in entities]
+    rels=[dict(r,**{"from":mapping.get(r["from"],r["from"]),"to":mapping.get(r["to"],r["to"])}) for r in rels]
+    added=_add_triples(db,entities,rels)
+    ids={}; keys=list({_norm(v) for v in mapping.values()})
+    for lo in range(0,len(keys),SQL_BATCH):
+        part=keys[lo:lo+SQL_BATCH]
+        ids.update(db.execute(f"SELECT key, id FROM nodes WHERE key IN ({','.join('?'*len(part))})",part))
+    _index_nodes(db,[(ids[_norm(target)],name) for name,target in mapping.items() if _norm(target) in ids])
+    return added
+
+def _chunks(text,size):
+    """Split text into chunks of about size chars on paragraph, then line, then hard boundaries."""
+    out=[]; buf=""
+    for para in re.split(r"\n\s*\n",text):
+        para=para.strip()
+        if not para: continue
+        while len(para)>size:
+            cut=para.rfind("\n",0,size)
+            if cut<size//2: cut=para.rfind(" ",0,size)
+            if cut<size//2: cut=size
+            if buf: out.append(buf); buf=""
+            out.append(para[:cut].strip()); para=para[cut:].strip()
+        if buf and len(buf)+len(para)+2>size: out.append(buf); buf=""
+        buf=f"{buf}\n\n{para}" if buf else para
+    if buf: out.append(buf)
+    return out
+
+def _iter_files(paths,pattern):
+    for path in paths:
+        for match in (sorted(glob.glob(path,recursive=True)) if glob.has_magic(path) else [path]):
+            if os.path.isdir(match):
+                for root,dirs,files in os.walk(match):
+                    dirs[:]=sorted(d for d in dirs if not d.startswith("."))
+                    for name in sorted(files):
+                        if fnmatch.fnmatch(name,pattern): yield os.path.join(root,name)
+            elif os.path.isfile(match): yield match
+
+def _find_node(db,entity):
+    """Exact normalised match, then indexed prefix match, then substring scan."""
+    key=_norm(entity)
+    row=db.execute("SELECT id, name, type FROM nodes WHERE key = ?",(key,)).fetchone()
+    if row: return row
+    row=db.execute("SELECT id, name, type FROM nodes WHERE key >= ? AND key < ? ORDER BY length(key) LIMIT 1",(key,key+"\uffff")).fetchone()
+    if row: return row
+    return db.execute("SELECT id, name, type FROM nodes WHERE instr(key, ?) > 0 ORDER BY length(key) LIMIT 1",(key,)).fetchone()
+
+def _neighbours(db,frontier,direction,relations):
+    """All edges touching the frontier ids, batched; yields (src, relation, dst, neighbour id)."""
+    frontier=list(frontier); rel_sql=""; rel_args=[]
+    if relations: rel_sql=f" AND relation IN ({','.join('?'*len(relations))})"; rel_args=list(relations)
+    for lo in range(0,len(frontier),SQL_BATCH):
+        part=frontier[lo:lo+SQL_BATCH]; marks=",".join("?"*len(part))
+        if direction in ("out","both"):
+            for src,rel,dst in db.execute(f"SELECT src, relation, dst FROM edges WHERE src IN ({marks}){rel_sql}",part+rel_args): yield src,rel,dst,dst
+        if direction in ("in","both"):
+            for src,rel,dst in db.execute(f"SELECT src, relation, dst FROM edges WHERE dst IN ({marks}){rel_sql}",part+rel_args): yield src,rel,dst,src
+
+def _names(db,ids):
+    ids=list(ids); out={}
+    for lo in range(0,len(ids),SQL_BATCH):
+        part=ids[lo:lo+SQL_BATCH]
+        out.update(db.execute(f"SELECT id, name FROM nodes WHERE id IN ({','.join('?'*len(part))})",part))
+    return out
 
 def extract(args):
-    result=_chat(f"Extract entities and relationships from this text. Return JSON: {{entities:[{{name,type}}], relationships:[{{from,relation,to}}]}}\n\n{args.text}")
+    try: result=_chat(EXTRACT_PROMPT.format(text=args.text))
+    except RuntimeError as e: print(f"{RED}API error: {e}{RESET}"); sys.exit(1)
     print(f"{GREEN}Entities:{RESET}"); [print(f"  {e['name']} ({e['type']})") for e in result.get("entities",[])]
     print(f"{GREEN}Relationships:{RESET}"); [print(f"  {r['from']} --[{r['relation']}]--> {r['to']}") for r in result.get("relationships",[])]
 
 def add_document(args):
-    with open(args.file) as f: text=f.read()
-    result=_chat(f"Extract entities and relationships. Return JSON: {{entities:[{{name,type}}], relationships:[{{from,relation,to}}]}}\n\n{text[:5000]}")
-    graph=_load(args.graph_file)
-    existing_names={n["name"] for n in graph["nodes"]}
-    for e in result.get("entities",[]):
-        if e["name"] not in existing_names:
-            graph["nodes"].append(e); existing_names.add(e["name"])
-    graph["edges"].extend(result.get("relationships",[]))
-    _save(graph,args.graph_file)
-    print(f"{GREEN}Added {len(result.get('entities',[]))} entities and {len(result.get('relationships',[]))} relationships{RESET}")
+    db=_open(args.graph_file); t0=time.perf_counter()
+    docs={}; skipped=0
+    for path in dict.fromkeys(_iter_files(args.file,args.pattern)):
+        try:
+            with open(path,encoding="utf-8") as f: text=f.read()
+        except (UnicodeDecodeError,OSError) as e: print(f"{YELLOW}Skipping {path}: {e}{RESET}"); continue
+        digest=hashlib.sha256(text.encode("utf-8")).hexdigest()
+        row=db.execute("SELECT hash FROM sources WHERE path = ?",(os.path.abspath(path),)).fetchone()
+        if row and row[0]==digest and not args.force: skipped+=1; continue
+        docs[path]={"hash":digest,"chunks":_chunks(text,args.chunk_chars),"results":{}}
+    if not docs: print(f"{YELLOW}Nothing to add ({skipped} unchanged files skipped){RESET}"); return
+    # Chunk results already in the cache are reused; the rest are extracted concurrently.
+    todo=[]; hits=0
+    for path,doc in docs.items():
+        for i,chunk in enumerate(doc["chunks"]):
+            h=hashlib.sha256(f"{MODEL}\0{EXTRACT_PROMPT}\0{chunk}".encode("utf-8")).hexdigest()
+            row=db.execute("SELECT result FROM chunk_cache WHERE hash = ?",(h,)).fetchone()
+            if row: doc["results"][i]=json.loads(row[0]); hits+=1
+            else: todo.append((path,i,h))
+    n_chunks=sum(len(d["chunks"]) for d in docs.values())
+    print(f"{YELLOW}{len(docs)} files, {n_chunks} chunks ({hits} cached, {skipped} unchanged files skipped), {args.workers} workers ...{RESET}")
+    nodes=edges=failed=0
+    def finish(path):
+        nonlocal nodes,edges
+        doc=docs[path]
+        with db:
+            for i in range(len(doc["chunks"])):
+                n,e=_ingest(db,doc["results"][i],args.fuzzy); nodes+=n; edges+=e
+            db.execute("INSERT OR REPLACE INTO sources VALUES (?, ?)",(os.path.abspath(path),doc["hash"]))
+        print(f"  {GREEN}{path}{RESET}  {len(doc['chunks'])} chunks")
+    for path,doc in docs.items():
+        if len(doc["results"])==len(doc["chunks"]): finish(path)
+    with ThreadPoolExecutor(max_workers=args.workers) as pool:
+        futs={pool.submit(_chat,EXTRACT_PROMPT.format(text=docs[path]["chunks"][i])):(path,i,h) for path,i,h in todo}
+        for fut in as_completed(futs):
+            path,i,h=futs[fut]; doc=docs[path]
+            try: result=fut.result()
+            except RuntimeError as e:
+                print(f"  {RED}{path} chunk {i+1}: {str(e)[:200]}{RESET}"); doc["failed"]=True; failed+=1; continue
+            with db: db.execute("INSERT OR REPLACE INTO chunk_cache VALUES (?, ?)",(h,json.dumps(result)))
+            doc["results"][i]=result
+            if len(doc["results"])==len(doc["chunks"]): finish(path)
+    # Files with failed chunks keep what was extracted but are not marked done, so a re-run retries them.
+    for path,doc in docs.items():
+        if doc.get("failed") and doc["results"]:
+            with db:
+                for r in doc["results"].values(): n,e=_ingest(db,r,args.fuzzy); nodes+=n; edges+=e
+    db.close()
+    print(f"{GREEN}Added {nodes} new entities and {edges} new relationships in {time.perf_counter()-t0:.1f}s{RESET}"+(f"  {RED}{failed} chunks failed{RESET}" if failed else ""))
 
 def query_graph(args):
-    graph=_load(args.graph_file)
-    matches=[n for n in graph["nodes"] if args.entity.lower() in n["name"].lower()]
-    if not matches: print(f"{YELLOW}No entity matching '{args.entity}' found{RESET}"); return
-    entity_name=matches[0]["name"]
-    related=[e for e in graph["edges"] if entity_name in (e.get("from",""),e.get("to",""))]
-    print(f"{GREEN}Entity: {entity_name}{RESET}")
-    for r in related[:10]: print(f"  {r.get('from')} --[{r.get('relation')}]--> {r.get('to')}")
+    db=_open(args.graph_file); t0=time.perf_counter()
+    start=_find_node(db,args.entity)
+    if not start: print(f"{YELLOW}No entity matching '{args.entity}' found{RESET}"); return
+    relations=[r.strip() for r in args.relation.split(",")] if args.relation else None
+    seen={start[0]:0}; frontier=[start[0]]; hops=[]; seen_edges=set()
+    for depth in range(1,args.depth+1):
+        if not frontier: break
+        edges=[]; nxt=[]
+        for src,rel,dst,other in _neighbours(db,frontier,args.direction,relations):
+            if (src,rel,dst) not in seen_edges: seen_edges.add((src,rel,dst)); edges.append((src,rel,dst))  # an edge back into an earlier hop was already listed there
+            if other not in seen: seen[other]=depth; nxt.append(other)
+        hops.append(edges); frontier=nxt
+    names=_names(db,seen); el=time.perf_counter()-t0; db.close()
+    print(f"{GREEN}Entity: {start[1]}{RESET}"+(f" ({start[2]})" if start[2] else ""))
+    shown=0
+    for depth,edges in enumerate(hops,1):
+        if not edges or shown>=args.limit: continue
+        print(f"{YELLOW}Hop {depth}: {len(edges)} edges{RESET}")
+        for src,rel,dst in edges:
+            if shown>=args.limit: break
+            print(f"  {names[src]} --[{rel}]--> {names[dst]}"); shown+=1
+    total=sum(len(e) for e in hops)
+    if total>shown: print(f"  ... {total-shown} more (raise --limit)")
+    print(f"{GREEN}{len(seen)-1} entities within {args.depth} hops, {total} edges ({el*1000:.1f} ms){RESET}")
 
 def export_graph(args):
-    graph=_load(args.graph_file)
+    db=_open(args.graph_file)
     fmt=args.format
-    if fmt=="dot":
-        lines=["digraph G {"]+[f'  "{e.get("from")}" -> "{e.get("to")}" [label="{e.get("relation")}"];' for e in graph["edges"]]+["}"]
-        content="\n".join(lines)
-    elif fmt=="csv":
-        content="from,relation,to\n"+"\n".join(f"{e.get('from')},{e.get('relation')},{e.get('to')}" for e in graph["edges"])
-    else:
-        content=json.dumps(graph,indent=2)
+    n_nodes=db.execute("SELECT COUNT(*) FROM nodes").fetchone()[0]; n_edges=db.execute("SELECT COUNT(*) FROM edges").fetchone()[0]
+    edges=db.execute("SELECT a.name, e.relation, b.name FROM edges e JOIN nodes a ON a.id = e.src JOIN nodes b ON b.id = e.dst")
     out=args.output or f"knowledge_graph.{fmt}"
-    with open(out,"w") as f: f.write(content)
-    print(f"{GREEN}Exported to {out} ({len(graph['nodes'])} nodes, {len(graph['edges'])} edges){RESET}")
+    with open(out,"w",newline="") as f:
+        if fmt=="dot":
+            f.write("digraph G {\n")
+            for a,rel,b in edges: f.write(f'  {json.dumps(a)} -> {json.dumps(b)} [label={json.dumps(rel)}];\n')
+            f.write("}")
+        elif fmt=="csv":
+            w=csv.writer(f); w.writerow(["from","relation","to"]); w.writerows(edges)
+        else:
+            f.write('{"nodes": [\n')
+            for i,(name,t) in enumerate(db.execute("SELECT name, type FROM nodes ORDER BY id")): f.write(("," if i else "")+json.dumps({"name":name,"type":t})+"\n")
+            f.write('], "edges": [\n')
+            for i,(a,rel,b) in enumerate(edges): f.write(("," if i else "")+json.dumps({"from":a,"relation":rel,"to":b})+"\n")
+            f.write("]}\n")
+    db.close()
+    print(f"{GREEN}Exported to {out} ({n_nodes} nodes, {n_edges} edges){RESET}")
 
 def main():
     p=argparse.ArgumentParser(description="Knowledge Graph Builder")
     s=p.add_subparsers(dest="command",required=True)
     s.add_parser("extract").add_argument("--text",required=True)
-    pad=s.add_parser("add-document"); pad.add_argument("--file",required=True); pad.add_argument("--graph-file",default=DEFAULT_GRAPH)
+    pad=s.add_parser("add-document"); pad.add_argument("--file","--path",nargs="+",required=True,help="Files, directories or glob patterns"); pad.add_argument("--graph-file",default=DEFAULT_GRAPH)
+    pad.add_argument("--pattern",default="*",help="File name pattern when walking directories"); pad.add_argument("--chunk-chars",type=int,default=4000); pad.add_argument("--workers",type=int,default=4)
+    pad.add_argument("--fuzzy",type=float,default=0.92,help="Similarity needed to merge entity names (1 disables fuzzy matching)"); pad.add_argument("--force",action="store_true",help="Re-ingest unchanged files")
     pq=s.add_parser("query-graph"); pq.add_argument("--entity",required=True); pq.add_argument("--graph-file",default=DEFAULT_GRAPH); pq.add_argument("--depth",type=int,default=2)
+    pq.add_argument("--relation",default=None,help="Comma-separated edge types to follow"); pq.add_argument("--direction",choices=["out","in","both"],default="both"); pq.add_argument("--limit",type=int,default=50,help="Max edges to print")
     pe=s.add_parser("export-graph"); pe.add_argument("--graph-file",default=DEFAULT_GRAPH); pe.add_argument("--format",choices=["json","dot","csv"],default="json"); pe.add_argument("--output",default=None)
     args=p.parse_args()
     {"extract":extract,"add-document":add_document,"query-graph":query_graph,"export-graph":export_graph}[args.command](args)
@@ -2,10 +2,14 @@
 """Model Benchmarker – OC-0119"""
 
 import argparse
+import csv
+import io
 import json
 import os
 import sys
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
 import requests
 
 RED = "\033[91m"
@@ -13,6 +17,10 @@ GREEN = "\033[92m"
 YELLOW = "\033[93m"
 RESET = "\033[0m"
 
+MAX_CONCURRENCY = 256
+ROW_FIELDS = ["model", "provider", "concurrency", "run", "ok", "error", "latency_s", "ttft_s", "itl_ms",
+              "itl_p95_ms", "tokens_per_s", "input_tokens", "output_tokens", "cost_usd"]
+
 MODELS = {
     "gpt-4o":              {"provider": "openai",    "input": 2.50,  "output": 10.00},
     "gpt-4o-mini":         {"provider": "openai",    "input": 0.15,  "output": 0.60},
@@ -21,87 +29,229 @@ MODELS = {
 }
 
 
+_SESSION = None
+
+
+def _session():
+    global _SESSION
+    if _SESSION is None:
+        _SESSION = requests.Session()
+        _SESSION.mount("https://", requests.adapters.HTTPAdapter(pool_connections=2, pool_maxsize=MAX_CONCURRENCY))
+    return _SESSION
+
+
+def _pct(values, p):
+    """Linear-interpolated percentile of a list; None when empty."""
+    if not values:
+        return None
+    values = sorted(values)
+    pos = (len(values) - 1) * p / 100
+    lo = int(pos)
+    hi = min(lo + 1, len(values) - 1)
+    return values[lo] + (values[hi] - values[lo]) * (pos - lo)
+
+
+def _iter_sse(resp):
+    """Yield (arrival time, parsed data) for each server-sent event of a streaming response."""
+    for line in resp.iter_lines():
+        if not line or not line.startswith(b"data:"):
+            continue
+        payload = line[5:].strip()
+        if payload == b"[DONE]":
+            return
+        yield time.perf_counter(), json.loads(payload)
+
+
+def _timings(t0, arrivals, output_tokens, output):
+    """Latency metrics from the arrival times of streamed content deltas."""
+    end = time.perf_counter()
+    gaps = [(b - a) * 1000 for a, b in zip(arrivals, arrivals[1:])]
+    decode = arrivals[-1] - arrivals[0] if len(arrivals) > 1 else 0
+    output_tokens = output_tokens or len(arrivals)
+    return {
+        "output": output,
+        "output_tokens": output_tokens,
+        "latency_s": round(end - t0, 4),
+        "ttft_s": round(arrivals[0] - t0, 4) if arrivals else None,
+        "itl_ms": round(sum(gaps) / len(gaps), 2) if gaps else None,
+        "itl_p95_ms": round(_pct(gaps, 95), 2) if gaps else None,
+        # Decode rate: tokens after the first one over the time spent streaming them.
+        "tokens_per_s": round((output_tokens - 1) / decode, 1) if decode > 0 else None,
+    }
+
+
 def _run_openai(prompt, model):
     key = os.environ.get("OPENAI_API_KEY")
     if not key:
         return None, "OPENAI_API_KEY not set"
-    t0 = time.time()
-    resp = requests.post(
-        "https://api.openai.com/v1/chat/completions",
-        headers={"Authorization": f"Bearer {key}", "Content-Type": "application/json"},
-        json={"model": model, "messages": [{"role": "user", "content": prompt}]},
-        timeout=60,
-    )
-    elapsed = time.time() - t0
+    t0 = time.perf_counter()
+    try:
+        resp = _session().post(
+            "https://api.openai.com/v1/chat/completions",
+            headers={"Authorization": f"Bearer {key}", "Content-Type": "application/json"},
+            json={"model": model, "messages": [{"role": "user", "content": prompt}],
+                  "stream": True, "stream_options": {"include_usage": True}},
+            timeout=60, stream=True,
+        )
+    except requests.RequestException as e:
+        return None, str(e)
     if not resp.ok:
         return None, resp.text
-    data = resp.json()
-    usage = data.get("usage", {})
-    return {
-        "output": data["choices"][0]["message"]["content"],
-        "input_tokens": usage.get("prompt_tokens", 0),
-        "output_tokens": usage.get("completion_tokens", 0),
-        "latency_s": round(elapsed, 2),
-    }, None
+    arrivals, parts, usage = [], [], {}
+    try:
+        with resp:
+            for t, event in _iter_sse(resp):
+                if event.get("usage"):
+                    usage = event["usage"]
+                for choice in event.get("choices", []):
+                    text = choice.get("delta", {}).get("content")
+                    if text:
+                        arrivals.append(t)
+                        parts.append(text)
+    except (requests.RequestException, ValueError) as e:
+        # Dropped connection, read timeout or a malformed event mid-stream.
+        return None, f"stream interrupted: {e}"
+    result = _timings(t0, arrivals, usage.get("completion_tokens", 0), "".join(parts))
+    result["input_tokens"] = usage.get("prompt_tokens", 0)
+    return result, None
 
 
 def _run_anthropic(prompt, model):
     key = os.environ.get("ANTHROPIC_API_KEY")
     if not key:
         return None, "ANTHROPIC_API_KEY not set"
-    t0 = time.time()
-    resp = requests.post(
-        "https://api.anthropic.com/v1/messages",
-        headers={"x-api-key": key, "anthropic-version": "2023-06-01",
-                 "Content-Type": "application/json"},
-        json={"model": model, "max_tokens": 1024,
-              "messages": [{"role": "user", "content": prompt}]},
-        timeout=60,
-    )
-    elapsed = time.time() - t0
+    t0 = time.perf_counter()
+    try:
+        resp = _session().post(
+            "https://api.anthropic.com/v1/messages",
+            headers={"x-api-key": key, "anthropic-version": "2023-06-01",
+                     "Content-Type": "application/json"},
+            json={"model": model, "max_tokens": 1024, "stream": True,
+                  "messages": [{"role": "user", "content": prompt}]},
+            timeout=60, stream=True,
+        )
+    except requests.RequestException as e:
+        return None, str(e)
     if not resp.ok:
         return None, resp.text
-    data = resp.json()
-    return {
-        "output": data["content"][0]["text"],
-        "input_tokens": data["usage"]["input_tokens"],
-        "output_tokens": data["usage"]["output_tokens"],
-        "latency_s": round(elapsed, 2),
-    }, None
+    arrivals, parts = [], []
+    input_tokens = output_tokens = 0
+    try:
+        with resp:
+            for t, event in _iter_sse(resp):
+                kind = event.get("type")
+                if kind == "message_start":
+                    input_tokens = event["message"]["usage"].get("input_tokens", 0)
+                elif kind == "content_block_delta" and event["delta"].get("text"):
+                    arrivals.append(t)
+                    parts.append(event["delta"]["text"])
+                elif kind == "message_delta":
+                    output_tokens = event.get("usage", {}).get("output_tokens", output_tokens)
+                elif kind == "error":
+                    return None, json.dumps(event.get("error"))
+    except (requests.RequestException, ValueError) as e:
+        # Dropped connection, read timeout or a malformed event mid-stream.
+        return None, f"stream interrupted: {e}"
+    result = _timings(t0, arrivals, output_tokens, "".join(parts))
+    result["input_tokens"] = input_tokens
+    return result, None
+
+
+def _row(model, concurrency, run, result, err):
+    """Flat record for JSONL/CSV output."""
+    info = MODELS[model]
+    row = {"model": model, "provider": info["provider"], "concurrency": concurrency, "run": run,
+           "ok": err is None, "error": (err or "")[:200]}
+    for field in ROW_FIELDS[6:]:
+        row[field] = (result or {}).get(field)
+    if result:
+        row["cost_usd"] = round((result["input_tokens"] * info["input"]
+                                 + result["output_tokens"] * info["output"]) / 1e6, 6)
+    return row
+
+
+def _level_stats(runs, wall):
+    """Percentiles for one model at one concurrency level."""
+    stats = {"requests": len(runs), "wall_s": round(wall, 3)}
+    for field in ("latency_s", "ttft_s", "itl_ms"):
+        values = [r[field] for r in runs if r.get(field) is not None]
+        for p in (50, 95, 99):
+            v = _pct(values, p)
+            stats[f"{field}_p{p}"] = round(v, 4) if v is not None else None
+    rates = [r["tokens_per_s"] for r in runs if r.get("tokens_per_s")]
+    stats["tokens_per_s_mean"] = round(sum(rates) / len(rates), 1) if rates else None
+    stats["aggregate_tokens_per_s"] = round(sum(r["output_tokens"] for r in runs) / wall, 1) if wall > 0 else None
+    return stats
+
+
+def _open_rows(path):
+    """Writer for flat per-request rows; the format follows the file extension."""
+    f = open(path, "w", newline="")
+    if path.endswith(".csv"):
+        writer = csv.DictWriter(f, fieldnames=ROW_FIELDS)
+        writer.writeheader()
+        return f, lambda row: (writer.writerow(row), f.flush())
+    return f, lambda row: (f.write(json.dumps(row) + "\n"), f.flush())
 
 
 def run_benchmark(args):
     models = [m.strip() for m in args.models.split(",")]
-    results = {"prompt": args.prompt, "runs": args.runs, "models": {}}
-    for model in models:
-        info = MODELS.get(model)
-        if not info:
-            print(f"{YELLOW}Unknown model: {model} — skipping{RESET}")
-            continue
-        print(f"{YELLOW}Benchmarking {model} ({args.runs} runs) ...{RESET}")
-        runs = []
-        for _ in range(args.runs):
-            if info["provider"] == "openai":
-                result, err = _run_openai(args.prompt, model)
-            else:
-                result, err = _run_anthropic(args.prompt, model)
-            if err:
-                print(f"  {RED}Error: {err}{RESET}")
-            else:
-                runs.append(result)
-        if runs:
-            avg_latency = sum(r["latency_s"] for r in runs) / len(runs)
-            results["models"][model] = {
-                "runs": runs, "avg_latency_s": round(avg_latency, 2),
-                "sample_output": runs[0]["output"][:200],
-            }
-            print(f"  {GREEN}avg latency: {avg_latency:.2f}s{RESET}")
-            print(f"  Output: {runs[0]['output'][:150]}...")
+    levels = [int(c) for c in str(args.concurrency).split(",")]
+    if any(c < 1 or c > MAX_CONCURRENCY for c in levels):
+        print(f"{RED}Concurrency levels must be between 1 and {MAX_CONCURRENCY}{RESET}")
+        sys.exit(1)
+    results = {"prompt": args.prompt, "runs": args.runs, "concurrency": levels, "models": {}}
+    rows_file, write_row = _open_rows(args.rows) if args.rows else (None, None)
+    try:
+        for model in models:
+            info = MODELS.get(model)
+            if not info:
+                print(f"{YELLOW}Unknown model: {model} — skipping{RESET}")
+                continue
+            call = _run_openai if info["provider"] == "openai" else _run_anthropic
+            runs, stats = [], {}
+            for level in levels:
+                n = max(args.runs, level)
+                print(f"{YELLOW}Benchmarking {model} ({n} runs, concurrency {level}) ...{RESET}")
+                level_runs = []
+                t0 = time.perf_counter()
+                with ThreadPoolExecutor(max_workers=level) as pool:
+                    futures = {pool.submit(call, args.prompt, model): i for i in range(n)}
+                    for future in as_completed(futures):
+                        result, err = future.result()
+                        if write_row:
+                            write_row(_row(model, level, futures[future], result, err))
+                        if err:
+                            print(f"  {RED}Error: {err[:200]}{RESET}")
+                        else:
+                            result["concurrency"] = level
+                            level_runs.append(result)
+                wall = time.perf_counter() - t0
+                if level_runs:
+                    st = stats[str(level)] = _level_stats(level_runs, wall)
+                    ttft = f"{st['ttft_s_p50']:.3f}/{st['ttft_s_p95']:.3f}/{st['ttft_s_p99']:.3f}s" if st["ttft_s_p50"] is not None else "n/a"
+                    print(f"  {GREEN}latency p50/p95/p99: {st['latency_s_p50']:.3f}/{st['latency_s_p95']:.3f}/{st['latency_s_p99']:.3f}s  "
+                          f"TTFT {ttft}  decode {st['tokens_per_s_mean'] or 0:.1f} tok/s  "
+                          f"aggregate {st['aggregate_tokens_per_s'] or 0:.1f} tok/s{RESET}")
+                runs.extend(level_runs)
+            if runs:
+                avg_latency = sum(r["latency_s"] for r in runs) / len(runs)
+                results["models"][model] = {
+                    "runs": runs, "avg_latency_s": round(avg_latency, 2), "levels": stats,
+                    "sample_output": runs[0]["output"][:200],
+                }
+                print(f"  {GREEN}avg latency: {avg_latency:.2f}s{RESET}")
+                print(f"  Output: {runs[0]['output'][:150]}...")
+    finally:
+        if rows_file:
+            rows_file.close()
+    if args.rows:
+        print(f"\n{GREEN}Per-request rows saved to {args.rows}{RESET}")
     if args.output:
         with open(args.output, "w") as f:
             json.dump(results, f, indent=2)
         print(f"\n{GREEN}Results saved to {args.output}{RESET}")
-    else:
+    elif not args.rows:
         print(json.dumps(results, indent=2))
 
 
@@ -117,6 +267,15 @@ def compare(args):
             avg_in = sum(r["input_tokens"] for r in runs) / len(runs)
             avg_out = sum(r["output_tokens"] for r in runs) / len(runs)
             print(f"  {model:<33} {data['avg_latency_s']:>11.2f}s {avg_in:>10.0f} {avg_out:>11.0f}")
+    levels = [(m, c, st) for m, data in results.get("models", {}).items() for c, st in data.get("levels", {}).items()]
+    if levels:
+        print(f"\n{'Model':<35} {'Conc':>5} {'p50':>8} {'p95':>8} {'p99':>8} {'TTFT p50':>9} {'TTFT p99':>9} {'tok/s':>7}")
+        print("-" * 96)
+        for model, c, st in levels:
+            fmt = lambda v: f"{v:.3f}" if v is not None else "-"
+            print(f"  {model:<33} {c:>5} {fmt(st['latency_s_p50']):>8} {fmt(st['latency_s_p95']):>8} "
+                  f"{fmt(st['latency_s_p99']):>8} {fmt(st['ttft_s_p50']):>9} {fmt(st['ttft_s_p99']):>9} "
+                  f"{st['tokens_per_s_mean'] or 0:>7.1f}")
 
 
 def list_models(args):
@@ -136,12 +295,25 @@ def export_results(args):
         for model, data in results.get("models", {}).items():
             lines.append(f"\n## {model}")
             lines.append(f"- Avg latency: {data['avg_latency_s']}s")
+            for c, st in data.get("levels", {}).items():
+                lines.append(f"- Concurrency {c}: latency p50/p95/p99 {st['latency_s_p50']}/{st['latency_s_p95']}/"
+                             f"{st['latency_s_p99']}s, TTFT p50 {st['ttft_s_p50']}s, {st['tokens_per_s_mean']} tok/s")
             lines.append(f"- Sample: {data.get('sample_output','')[:200]}")
         content = "\n".join(lines)
+    elif fmt == "csv":
+        buf = io.StringIO()
+        writer = csv.DictWriter(buf, fieldnames=ROW_FIELDS)
+        writer.writeheader()
+        for model, data in results.get("models", {}).items():
+            if model not in MODELS:
+                continue
+            for i, r in enumerate(data.get("runs", [])):
+                writer.writerow(_row(model, r.get("concurrency", 1), i, r, None))
+        content = buf.getvalue()
     else:
         content = json.dumps(results, indent=2)
     output = args.output or f"benchmark.{fmt}"
-    with open(output, "w") as f:
+    with open(output, "w", newline="") as f:
         f.write(content)
     print(f"{GREEN}Exported to {output}{RESET}")
 
@@ -154,7 +326,9 @@ def main():
     p_r.add_argument("--prompt", required=True)
     p_r.add_argument("--models", default="gpt-4o,claude-3-5-sonnet-20241022")
     p_r.add_argument("--runs", type=int, default=3)
+    p_r.add_argument("--concurrency", default="1", help="Comma-separated levels to sweep, e.g. 1,4,16")
     p_r.add_argument("--output", default=None)
+    p_r.add_argument("--rows", default=None, help="Write one flat row per request to a .jsonl or .csv file")
 
     p_c = sub.add_parser("compare")
     p_c.add_argument("--results-file", required=True)
@@ -2,9 +2,14 @@
 """Prompt Version Control – OC-0115"""
 
 import argparse
+import difflib
+import hashlib
 import os
-import sys
+import re
+import sqlite3
 import subprocess
+import sys
+import time
 
 RED = "\033[91m"
 GREEN = "\033[92m"
@@ -12,95 +17,274 @@ YELLOW = "\033[93m"
 RESET = "\033[0m"
 
 STORE = os.path.expanduser("~/.openclaw/prompts")
+OBJECTS = os.path.join(STORE, "objects")
+INDEX = os.path.join(STORE, "index.sqlite")
+REL_RE = re.compile(r"^(?:HEAD|latest)(?:~(\d+))?$")
 
 
-def _git(args, cwd=STORE, check=True):
-    result = subprocess.run(["git"] + args, cwd=cwd, capture_output=True, text=True)
+def _git(args, cwd=STORE, check=True, input=None):
+    result = subprocess.run(["git"] + args, cwd=cwd, capture_output=True, input=input)
     if check and result.returncode != 0:
-        print(f"{RED}git error: {result.stderr}{RESET}")
+        print(f"{RED}git error: {result.stderr.decode(errors='replace')}{RESET}")
         sys.exit(1)
-    return result.stdout.strip()
+    return result.stdout
+
+
+def _blob_path(digest):
+    return os.path.join(OBJECTS, digest[:2], digest[2:])
+
 
+def _put_blob(content):
+    """Store content under its sha256 and return the hash; existing blobs are not rewritten."""
+    data = content.encode("utf-8")
+    digest = hashlib.sha256(data).hexdigest()
+    path = _blob_path(digest)
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+    return digest
 
-def _init_store():
+
+def _get_blob(digest):
+    with open(_blob_path(digest), "rb") as f:
+        return f.read().decode("utf-8")
+
+
+def _open():
+    """Open the index, importing a legacy git-backed store on first use."""
     os.makedirs(STORE, exist_ok=True)
-    if not os.path.exists(os.path.join(STORE, ".git")):
-        _git(["init"])
-        _git(["commit", "--allow-empty", "-m", "Init prompt store"])
+    fresh = not os.path.exists(INDEX)
+    db = sqlite3.connect(INDEX)
+    db.executescript("""
+        CREATE TABLE IF NOT EXISTS versions (
+            name TEXT NOT NULL, version INTEGER NOT NULL, hash TEXT NOT NULL,
+            message TEXT, created REAL NOT NULL, PRIMARY KEY (name, version));
+        CREATE TABLE IF NOT EXISTS tags (
+            name TEXT NOT NULL, tag TEXT NOT NULL, version INTEGER NOT NULL, PRIMARY KEY (name, tag));
+        CREATE INDEX IF NOT EXISTS versions_hash ON versions (hash);
+    """)
+    if fresh and os.path.isdir(os.path.join(STORE, ".git")):
+        with db:
+            _import_git(db)
+    return db
+
+
+def _import_git(db):
+    """One-off import of the old layout (<name>/prompt.txt committed to a git repo in STORE).
+
+    Reads the history with a single `git log` and all blob contents through one
+    `git cat-file --batch` process. Old tags were repo-wide, so each becomes a tag
+    on every prompt's version as of the tagged commit.
+    """
+    log = _git(["log", "--reverse", "--format=%x01%H%x00%ct%x00%s", "--name-only", "--", "*/prompt.txt"],
+               check=False).decode("utf-8", errors="replace")
+    changes = []
+    for entry in log.split("\x01")[1:]:
+        head, _, files = entry.partition("\n")
+        commit, ts, subject = head.split("\x00", 2)
+        for path in files.split():
+            if path.endswith("/prompt.txt"):
+                changes.append((commit, int(ts), subject, path[:-len("/prompt.txt")]))
+    if not changes:
+        return
+    proc = subprocess.Popen(["git", "cat-file", "--batch"], cwd=STORE, stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+    tags_by_commit = {}
+    for line in _git(["show-ref", "--tags", "-d"], check=False).decode().splitlines():
+        sha, ref = line.split(" ", 1)
+        tags_by_commit.setdefault(sha, []).append(ref[len("refs/tags/"):].removesuffix("^{}"))
+    current = {}
+    imported = 0
+    for commit, ts, subject, name in changes:
+        proc.stdin.write(f"{commit}:{name}/prompt.txt\n".encode())
+        proc.stdin.flush()
+        header = proc.stdout.readline().split()
+        if header[-1] == b"missing":
+            continue  # deleted in this commit
+        data = proc.stdout.read(int(header[2]))
+        proc.stdout.read(1)
+        version = current.get(name, 0) + 1
+        db.execute("INSERT INTO versions VALUES (?, ?, ?, ?, ?)",
+                   (name, version, _put_blob(data.decode("utf-8", errors="replace")), subject, ts))
+        current[name] = version
+        imported += 1
+        for t in tags_by_commit.get(commit, []):
+            db.executemany("INSERT OR REPLACE INTO tags VALUES (?, ?, ?)", [(n, t, v) for n, v in current.items()])
+    proc.stdin.close()
+    proc.wait()
+    print(f"{YELLOW}Imported {imported} versions of {len(current)} prompts from the git store{RESET}")
+
+
+def _latest(db, name):
+    row = db.execute("SELECT MAX(version) FROM versions WHERE name = ?", (name,)).fetchone()
+    return row[0]
+
+
+def _resolve(db, name, ref):
+    """(version, hash) for a ref: a version number, a tag, HEAD/latest with optional ~N, or a hash prefix."""
+    latest = _latest(db, name)
+    if latest is None:
+        print(f"{RED}Prompt '{name}' not found{RESET}")
+        sys.exit(1)
+    version = None
+    ref = str(ref) if ref is not None else "HEAD"
+    m = REL_RE.match(ref)
+    if m:
+        version = latest - int(m.group(1) or 0)
+    else:
+        row = db.execute("SELECT version FROM tags WHERE name = ? AND tag = ?", (name, ref)).fetchone()
+        if row:
+            version = row[0]
+        elif ref.lstrip("v").isdigit():
+            version = int(ref.lstrip("v"))
+        elif re.fullmatch(r"[0-9a-f]{6,64}", ref):
+            rows = db.execute("SELECT version FROM versions WHERE name = ? AND hash LIKE ? ORDER BY version DESC",
+                              (name, ref + "%")).fetchall()
+            if rows:
+                version = rows[0][0]
+    row = db.execute("SELECT version, hash FROM versions WHERE name = ? AND version = ?", (name, version)).fetchone()
+    if not row:
+        print(f"{RED}Version '{ref}' of prompt '{name}' not found (latest is {latest}){RESET}")
+        sys.exit(1)
+    return row
+
+
+def _add_version(db, name, content, message):
+    digest = _put_blob(content)
+    latest = _latest(db, name)
+    if latest is not None:
+        current = db.execute("SELECT hash FROM versions WHERE name = ? AND version = ?", (name, latest)).fetchone()[0]
+        if current == digest:
+            return None
+    version = (latest or 0) + 1
+    with db:
+        db.execute("INSERT INTO versions VALUES (?, ?, ?, ?, ?)", (name, version, digest, message, time.time()))
+    return version
 
 
 def save(args):
-    _init_store()
+    db = _open()
     name = args.name
-    prompt_dir = os.path.join(STORE, name)
-    os.makedirs(prompt_dir, exist_ok=True)
-    dest = os.path.join(prompt_dir, "prompt.txt")
     if args.file:
         with open(args.file) as f:
             content = f.read()
     else:
         print(f"{YELLOW}Enter prompt content (Ctrl+D to finish):{RESET}")
         content = sys.stdin.read()
-    with open(dest, "w") as f:
-        f.write(content)
-    _git(["add", dest])
-    msg = args.message or f"Update {name}"
-    _git(["commit", "-m", msg])
-    print(f"{GREEN}Saved prompt '{name}'{RESET}")
+    version = _add_version(db, name, content, args.message or f"Update {name}")
+    if version is None:
+        print(f"{YELLOW}Prompt '{name}' unchanged{RESET}")
+    else:
+        print(f"{GREEN}Saved prompt '{name}' as version {version}{RESET}")
 
 
 def list_prompts(args):
-    _init_store()
-    entries = [d for d in os.listdir(STORE) if os.path.isdir(os.path.join(STORE, d)) and d != ".git"]
-    if not entries:
+    db = _open()
+    rows = db.execute("""
+        SELECT name, version, hash, message, created FROM (
+            SELECT *, ROW_NUMBER() OVER (PARTITION BY name ORDER BY version DESC) AS rn FROM versions)
+        WHERE rn <= 3 ORDER BY name, version DESC""").fetchall()
+    if not rows:
         print(f"{YELLOW}No prompts saved yet.{RESET}")
         return
+    tags = {}
+    for name, tag_name, version in db.execute("SELECT name, tag, version FROM tags ORDER BY tag"):
+        tags.setdefault((name, version), []).append(tag_name)
+    counts = dict(db.execute("SELECT name, COUNT(*) FROM versions GROUP BY name"))
     print(f"{GREEN}Saved prompts:{RESET}")
-    for name in sorted(entries):
-        log = _git(["log", "--oneline", "-3", "--", f"{name}/prompt.txt"], check=False)
-        print(f"  {GREEN}{name}{RESET}")
-        for line in log.splitlines():
-            print(f"    {line}")
+    current = None
+    for name, version, digest, message, created in rows:
+        if name != current:
+            print(f"  {GREEN}{name}{RESET}  ({counts[name]} versions)")
+            current = name
+        when = time.strftime("%Y-%m-%d %H:%M", time.localtime(created))
+        labels = f"  {YELLOW}[{', '.join(tags[(name, version)])}]{RESET}" if (name, version) in tags else ""
+        print(f"    v{version}  {digest[:10]}  {when}  {message or ''}{labels}")
 
 
 def load(args):
-    _init_store()
-    prompt_file = os.path.join(STORE, args.name, "prompt.txt")
-    if args.version:
-        content = _git(["show", f"{args.version}:{args.name}/prompt.txt"])
-    elif os.path.exists(prompt_file):
-        with open(prompt_file) as f:
-            content = f.read()
-    else:
-        print(f"{RED}Prompt '{args.name}' not found{RESET}")
-        sys.exit(1)
-    print(content)
+    db = _open()
+    _, digest = _resolve(db, args.name, args.version)
+    print(_get_blob(digest), end="")
 
 
 def diff(args):
-    _init_store()
-    result = _git(["diff", args.v1, args.v2, "--", f"{args.name}/prompt.txt"])
-    if result:
-        print(result)
+    db = _open()
+    v1, h1 = _resolve(db, args.name, args.v1)
+    v2, h2 = _resolve(db, args.name, args.v2)
+    lines = list(difflib.unified_diff(_get_blob(h1).splitlines(keepends=True), _get_blob(h2).splitlines(keepends=True),
+                                      f"{args.name}@v{v1}", f"{args.name}@v{v2}"))
+    if lines:
+        print("".join(lines), end="" if lines[-1].endswith("\n") else "\n")
     else:
         print(f"{YELLOW}No differences found{RESET}")
 
 
 def tag(args):
-    _init_store()
-    _git(["tag", args.tag, "HEAD"])
-    print(f"{GREEN}Tagged HEAD as '{args.tag}' for prompt '{args.name}'{RESET}")
+    db = _open()
+    version, _ = _resolve(db, args.name, args.version)
+    with db:
+        db.execute("INSERT OR REPLACE INTO tags VALUES (?, ?, ?)", (args.name, args.tag, version))
+    print(f"{GREEN}Tagged version {version} of prompt '{args.name}' as '{args.tag}'{RESET}")
 
 
 def rollback(args):
-    _init_store()
-    content = _git(["show", f"{args.version}:{args.name}/prompt.txt"])
-    dest = os.path.join(STORE, args.name, "prompt.txt")
-    with open(dest, "w") as f:
-        f.write(content)
-    _git(["add", dest])
-    _git(["commit", "-m", f"Rollback {args.name} to {args.version}"])
-    print(f"{GREEN}Rolled back '{args.name}' to {args.version}{RESET}")
+    db = _open()
+    version, digest = _resolve(db, args.name, args.version)
+    new = _add_version(db, args.name, _get_blob(digest), f"Rollback {args.name} to {args.version}")
+    if new is None:
+        print(f"{YELLOW}'{args.name}' already matches {args.version}{RESET}")
+    else:
+        print(f"{GREEN}Rolled back '{args.name}' to {args.version} (version {version}), saved as version {new}{RESET}")
+
+
+def export_git(args):
+    """Write the whole history to a git repository in one `git fast-import` run.
+
+    One commit per version in save order on `main` with <name>/prompt.txt files;
+    tags become refs/tags/<name>/<tag>. Output is deterministic, so re-exporting
+    an unchanged store reproduces the same commits.
+    """
+    db = _open()
+    repo = os.path.abspath(args.repo)
+    if not os.path.isdir(os.path.join(repo, ".git")) and not os.path.exists(os.path.join(repo, "HEAD")):
+        os.makedirs(repo, exist_ok=True)
+        _git(["init", "-q"], cwd=repo)
+    if os.path.isdir(os.path.join(repo, ".git")) and _git(["status", "--porcelain"], cwd=repo).strip():
+        # The export ends with a hard reset of the working tree onto the new main.
+        print(f"{RED}{repo} has uncommitted changes; commit or stash them before exporting.{RESET}")
+        sys.exit(1)
+    stream = [b"reset refs/heads/main\n\n"]
+    blob_marks = {}
+    commit_marks = {}
+    mark = 0
+    rows = db.execute("SELECT name, version, hash, message, created FROM versions ORDER BY created, rowid").fetchall()
+    for name, version, digest, message, created in rows:
+        if digest not in blob_marks:
+            mark += 1
+            blob_marks[digest] = mark
+            data = _get_blob(digest).encode("utf-8")
+            stream += [b"blob\n", f"mark :{mark}\ndata {len(data)}\n".encode(), data, b"\n"]
+        mark += 1
+        msg = (message or f"Update {name}").encode("utf-8")
+        stream += [f"commit refs/heads/main\nmark :{mark}\n"
+                   f"committer prompt-store <prompts@openclaw> {int(created)} +0000\n"
+                   f"data {len(msg)}\n".encode(), msg, b"\n"]
+        stream.append(f"M 100644 :{blob_marks[digest]} {name}/prompt.txt\n\n".encode())
+        commit_marks[(name, version)] = mark
+    for name, tag_name, version in db.execute("SELECT name, tag, version FROM tags"):
+        if (name, version) in commit_marks:
+            stream.append(f"reset refs/tags/{name}/{tag_name}\nfrom :{commit_marks[(name, version)]}\n\n".encode())
+    if not rows:
+        print(f"{YELLOW}No prompts saved yet.{RESET}")
+        return
+    _git(["fast-import", "--force", "--quiet"], cwd=repo, input=b"".join(stream))
+    if os.path.isdir(os.path.join(repo, ".git")):
+        _git(["symbolic-ref", "HEAD", "refs/heads/main"], cwd=repo)
+        _git(["reset", "-q", "--hard"], cwd=repo)
+    print(f"{GREEN}Exported {len(rows)} versions ({len(blob_marks)} blobs) to {repo}{RESET}")
 
 
 def main():
@@ -126,15 +310,19 @@ def main():
     p_t = sub.add_parser("tag")
     p_t.add_argument("--name", required=True)
     p_t.add_argument("--tag", required=True)
+    p_t.add_argument("--version", default=None, help="Version to tag (default: latest)")
 
     p_r = sub.add_parser("rollback")
     p_r.add_argument("--name", required=True)
     p_r.add_argument("--version", required=True)
 
+    p_x = sub.add_parser("export-git")
+    p_x.add_argument("--repo", required=True, help="Repository to (re)write with the full history")
+
     args = parser.parse_args()
     dispatch = {
         "save": save, "list": list_prompts, "load": load,
-        "diff": diff, "tag": tag, "rollback": rollback,
+        "diff": diff, "tag": tag, "rollback": rollback, "export-git": export_git,
     }
     dispatch[args.command](args)
 
@@ -2,10 +2,24 @@
 """RAG Manager – OC-0118"""
 
 import argparse
+import array
+import email.utils
+import hashlib
+import http.server
 import json
-import math
 import os
+import random
+import re
+import shutil
+import sqlite3
 import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
 import requests
 
 RED = "\033[91m"
@@ -15,6 +29,22 @@ RESET = "\033[0m"
 
 OPENAI_BASE = "https://api.openai.com/v1"
 STORE_DIR = os.path.expanduser("~/.openclaw/rag")
+DAEMON_FILE = os.path.join(STORE_DIR, ".daemon")
+EMBED_MODEL = "text-embedding-3-small"
+EMBED_CACHE = os.path.expanduser("~/.openclaw/embedding_cache.sqlite")
+EMBED_BATCH_INPUTS = 2048      # API limit on inputs per request
+EMBED_BATCH_TOKENS = 250_000   # below the API's 300k tokens per request
+EMBED_WORKERS = 4
+EMBED_RETRIES = 5
+COMPACT_HINT = 16
+READ_BLOCK = 1 << 20
+PARAGRAPH_RE = re.compile(r"\n[ \t]*\n")
+HEADING_RE = re.compile(r"^#{1,6}\s")
+TERM_RE = re.compile(r"\w+")
+TERM_MAX = 64
+RRF_K = 60
+RRF_DEPTH = 50
+INDEX_BLOCK = 65536
 
 
 def _key():
@@ -25,97 +55,1114 @@ def _key():
     return k
 
 
-def _embed(texts):
-    resp = requests.post(
-        f"{OPENAI_BASE}/embeddings",
-        headers={"Authorization": f"Bearer {_key()}", "Content-Type": "application/json"},
-        json={"model": "text-embedding-3-small", "input": texts},
-    )
-    if not resp.ok:
-        print(f"{RED}Embedding error: {resp.text}{RESET}")
+_ENCODER = None
+_SESSION = None
+
+
+def _token_len(text):
+    """Token count with a cached tiktoken encoder, or a ~4 chars/token estimate without it."""
+    global _ENCODER
+    if _ENCODER is None:
+        try:
+            import tiktoken
+            _ENCODER = tiktoken.get_encoding("cl100k_base")
+        except ImportError:
+            _ENCODER = False
+    if _ENCODER:
+        return len(_ENCODER.encode(text, disallowed_special=()))
+    return len(text) // 4 + 1
+
+
+def _session():
+    global _SESSION
+    if _SESSION is None:
+        _SESSION = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=EMBED_WORKERS)
+        _SESSION.mount("https://", adapter)
+        _SESSION.headers.update({"Authorization": f"Bearer {_key()}",
+                                 "Content-Type": "application/json"})
+    return _SESSION
+
+
+def _cache_open():
+    os.makedirs(os.path.dirname(EMBED_CACHE), exist_ok=True)
+    db = sqlite3.connect(EMBED_CACHE)
+    db.execute("CREATE TABLE IF NOT EXISTS embeddings ("
+               "model TEXT, hash BLOB, vec BLOB, PRIMARY KEY (model, hash)) WITHOUT ROWID")
+    return db
+
+
+def _retry_delay(resp, attempt):
+    """Seconds before the next attempt: the Retry-After header (delta-seconds or HTTP-date) if present, else exponential backoff with jitter."""
+    value = resp.headers.get("Retry-After") if resp is not None else None
+    if value:
+        try:
+            return min(max(float(value), 0), 60)
+        except ValueError:
+            try:
+                return min(max(email.utils.parsedate_to_datetime(value).timestamp() - time.time(), 0), 60)
+            except (TypeError, ValueError):
+                pass
+    return min(2 ** attempt + random.random(), 60)
+
+
+def _embed_request(batch):
+    """POST one batch, retrying 429/5xx and connection errors with exponential backoff."""
+    for attempt in range(EMBED_RETRIES + 1):
+        try:
+            resp = _session().post(f"{OPENAI_BASE}/embeddings", timeout=120,
+                                   json={"model": EMBED_MODEL, "input": [t for _, t in batch]})
+        except requests.RequestException as e:
+            resp, error = None, str(e)
+        else:
+            if resp.ok:
+                data = sorted(resp.json()["data"], key=lambda d: d["index"])
+                return [(key, d["embedding"]) for (key, _), d in zip(batch, data)]
+            error = resp.text
+            if resp.status_code != 429 and resp.status_code < 500:
+                break
+        if attempt < EMBED_RETRIES:
+            time.sleep(_retry_delay(resp, attempt))
+    raise RuntimeError(error)
+
+
+def _embed_stream(texts, report=False):
+    """Yield (text, sha256, vector) for each text, in order, while later batches are in flight.
+
+    Vectors are cached in SQLite keyed by (model, sha256(text)). Misses are
+    deduplicated, grouped into token-bounded batches and sent concurrently over a
+    pooled session, with at most 2 * EMBED_WORKERS requests outstanding so memory
+    stays bounded for arbitrarily long inputs.
+    """
+    t0 = time.perf_counter()
+    stats = {"n": 0, "hits": 0}
+    db = _cache_open()
+    queue = deque()    # (text, hash) in input order, waiting to be yielded
+    need = {}          # hash -> number of queued entries still waiting for it
+    ready = {}         # hash -> vector
+    inflight = {}      # hash -> future that will return it
+    futures = deque()
+    batch, batch_tokens = [], 0
+
+    def collect(future):
+        rows = [(h, np.asarray(v, dtype=np.float32)) for h, v in future.result()]
+        db.executemany("INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?)",
+                       [(EMBED_MODEL, h, v.tobytes()) for h, v in rows])
+        db.commit()
+        for h, v in rows:
+            inflight.pop(h, None)
+            ready[h] = v
+
+    def drain(wait):
+        while queue:
+            text, h = queue[0]
+            if h not in ready:
+                future = inflight.get(h)
+                if future is None or (not wait and not future.done()):
+                    return
+                futures.remove(future)
+                collect(future)
+            queue.popleft()
+            need[h] -= 1
+            vec = ready[h] if need[h] else ready.pop(h)
+            if not need[h]:
+                del need[h]
+            yield text, h, vec
+
+    try:
+        with ThreadPoolExecutor(max_workers=EMBED_WORKERS) as pool:
+            def submit():
+                future = pool.submit(_embed_request, list(batch))
+                for h, _ in batch:
+                    inflight[h] = future
+                futures.append(future)
+                batch.clear()
+
+            for text in texts:
+                h = hashlib.sha256(text.encode("utf-8")).digest()
+                stats["n"] += 1
+                queue.append((text, h))
+                known = h in need
+                need[h] = need.get(h, 0) + 1
+                if known:
+                    stats["hits"] += h in ready
+                    continue
+                row = db.execute("SELECT vec FROM embeddings WHERE model = ? AND hash = ?",
+                                 (EMBED_MODEL, h)).fetchone()
+                if row:
+                    stats["hits"] += 1
+                    ready[h] = np.frombuffer(row[0], dtype=np.float32)
+                else:
+                    n = _token_len(text)
+                    if batch and (len(batch) >= EMBED_BATCH_INPUTS
+                                  or batch_tokens + n > EMBED_BATCH_TOKENS):
+                        submit()
+                        batch_tokens = 0
+                    batch.append((h, text))
+                    batch_tokens += n
+                while len(futures) >= 2 * EMBED_WORKERS:
+                    collect(futures.popleft())
+                yield from drain(wait=False)
+            if batch:
+                submit()
+            yield from drain(wait=True)
+    except RuntimeError as e:
+        print(f"{RED}Embedding error: {e}{RESET}")
         sys.exit(1)
-    return [d["embedding"] for d in resp.json()["data"]]
+    finally:
+        db.close()
+    if report and stats["n"]:
+        elapsed = time.perf_counter() - t0
+        print(f"{YELLOW}  {stats['n']} embeddings in {elapsed:.2f}s "
+              f"({stats['n'] / max(elapsed, 1e-9):,.0f}/s), "
+              f"cache hit rate {stats['hits'] / stats['n']:.0%}{RESET}")
+
+
+def _embed(texts, report=False):
+    """Embed texts as an (n, d) float32 array."""
+    vectors = [v for _, _, v in _embed_stream(texts, report)]
+    if not vectors:
+        return np.zeros((0, 0), dtype=np.float32)
+    return np.vstack(vectors)
 
 
-def _chunk(text, size=500):
-    words = text.split()
-    return [" ".join(words[i:i+size]) for i in range(0, len(words), size)]
+def _encode(text):
+    """Tokens for chunking: tiktoken ids, or whitespace-delimited words without tiktoken."""
+    _token_len("")
+    if _ENCODER:
+        return _ENCODER.encode(text, disallowed_special=())
+    return re.findall(r"\S+\s*", text)
 
 
-def _store_path(collection):
+def _decode(tokens):
+    return _ENCODER.decode(tokens) if _ENCODER else "".join(tokens)
+
+
+def _iter_units(path):
+    """Yield (text, is_heading) paragraphs from a file read in bounded blocks.
+
+    Paragraphs end at blank lines; Markdown headings become their own units.
+    Text with no blank line for a whole block is cut at the last newline (or
+    whitespace) so memory stays bounded by READ_BLOCK.
+    """
+    def units(paragraph):
+        body = []
+        for line in paragraph.splitlines():
+            if HEADING_RE.match(line):
+                if body:
+                    yield "\n".join(body).strip(), False
+                    body = []
+                yield line.strip(), True
+            else:
+                body.append(line)
+        text = "\n".join(body).strip()
+        if text:
+            yield text, False
+
+    pending = ""
+    with open(path, encoding="utf-8", errors="replace") as f:
+        while True:
+            block = f.read(READ_BLOCK)
+            if not block:
+                break
+            pending += block
+            parts = PARAGRAPH_RE.split(pending)
+            pending = parts.pop()
+            for part in parts:
+                yield from units(part)
+            if len(pending) > READ_BLOCK:
+                cut = pending.rfind("\n")
+                if cut <= 0:
+                    cut = max(pending.rfind(" "), 0) or len(pending)
+                yield from units(pending[:cut])
+                pending = pending[cut:]
+    if pending.strip():
+        yield from units(pending)
+
+
+def _iter_chunks(path, max_tokens=500, overlap=50):
+    """Stream token-bounded chunks of a file, preferring heading and paragraph boundaries.
+
+    Consecutive chunks within a section share ``overlap`` tokens; a Markdown
+    heading always starts a new chunk without overlap. Headings with no body
+    text after them (consecutive or trailing) are carried into the next
+    section's chunk or dropped, never emitted as chunks of their own.
+    """
+    overlap = max(0, min(overlap, max_tokens - 1))
+    cur = []
+    fresh = 0    # tokens in cur not already emitted as part of the previous chunk
+    body = 0     # non-heading tokens in cur, so a heading is never emitted on its own
+    for text, heading in _iter_units(path):
+        if heading:
+            if body and fresh:
+                yield _decode(cur).strip()
+            if body or not fresh:
+                # Otherwise cur holds only headings so far; keep them as a prefix of this section.
+                cur, fresh, body = [], 0, 0
+        tokens = _encode(text + "\n\n")
+        if body and len(cur) + len(tokens) > max_tokens:
+            yield _decode(cur).strip()
+            cur = cur[len(cur) - overlap:] if overlap else []
+            fresh = 0
+        cur.extend(tokens)
+        fresh += len(tokens)
+        body += 0 if heading else len(tokens)
+        start = 0
+        while len(cur) - start > max_tokens:
+            yield _decode(cur[start:start + max_tokens]).strip()
+            start += max_tokens - overlap
+        if start:
+            cur = cur[start:]
+            fresh = body = max(0, len(cur) - overlap)
+    if body and fresh:
+        yield _decode(cur).strip()
+
+
+def _collection_dir(collection):
+    return os.path.join(STORE_DIR, collection)
+
+
+def _legacy_path(collection):
     return os.path.join(STORE_DIR, f"{collection}.json")
 
 
+def _normalize(embeddings):
+    mat = np.asarray(embeddings, dtype=np.float32)
+    if mat.ndim == 1:
+        mat = mat[None, :]
+    norms = np.linalg.norm(mat, axis=1, keepdims=True)
+    return mat / np.maximum(norms, 1e-10)
+
+
+def _chunk_hash(text):
+    return hashlib.sha256(text.encode("utf-8")).digest()
+
+
+def _manifest_path(collection):
+    return os.path.join(_collection_dir(collection), "manifest.json")
+
+
+def _load_manifest(collection):
+    path = _manifest_path(collection)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def _save_manifest(collection, manifest):
+    path = _manifest_path(collection)
+    with open(path + ".tmp", "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(path + ".tmp", path)
+
+
+def _new_manifest(model=EMBED_MODEL):
+    return {"model": model, "dim": 0, "count": 0, "next_segment": 1, "segments": []}
+
+
+def _terms(text):
+    return [t[:TERM_MAX] for t in TERM_RE.findall(text.lower())]
+
+
+def _open_segment(collection, manifest):
+    """Start an immutable segment; rows are appended with _append_segment.
+
+    Each segment under ``STORE_DIR/<collection>/segments/<name>/`` holds:
+      embeddings.npy  float32 (N, d) matrix of L2-normalised embeddings
+      chunks.bin      UTF-8 chunk texts, concatenated
+      offsets.npy     int64 (N + 1) byte offsets of each chunk in chunks.bin
+      hashes.npy      uint8 (N, 32) sha256 digests of the chunk texts
+      terms.bin       UTF-8 vocabulary of the segment's BM25 inverted index, sorted by bytes
+      term_offsets.npy int64 (V + 1) byte offsets of each term in terms.bin
+      postings.npy    int64 (V + 1) start of each term's postings
+      docs.npy        int32 chunk ids of all postings, grouped by term
+      tfs.npy         int32 term frequencies matching docs.npy
+      doclen.npy      int32 (N) number of terms in each chunk
+    The directory is built under a temporary name and renamed into place by
+    _close_segment. Embeddings are streamed to a raw file and postings to
+    compact int arrays, so memory stays independent of segment size.
+    """
+    name = f"seg-{manifest['next_segment']:06d}"
+    manifest["next_segment"] += 1
+    tmp = os.path.join(_collection_dir(collection), "segments", f".{name}.tmp")
+    if os.path.isdir(tmp):
+        shutil.rmtree(tmp)
+    os.makedirs(tmp)
+    return {
+        "name": name, "tmp": tmp, "count": 0, "dim": 0, "offsets": [0], "hashes": [],
+        "chunks": open(os.path.join(tmp, "chunks.bin"), "wb"),
+        "raw": open(os.path.join(tmp, "embeddings.f32"), "wb"),
+        "vocab": {}, "post_terms": array.array("i"), "post_docs": array.array("i"),
+        "post_tfs": array.array("i"), "doclen": array.array("i"),
+    }
+
+
+def _append_segment(seg, text, h, vector):
+    data = text.encode("utf-8")
+    seg["chunks"].write(data)
+    seg["offsets"].append(seg["offsets"][-1] + len(data))
+    seg["hashes"].append(h)
+    row = _normalize(vector)[0]
+    seg["dim"] = len(row)
+    seg["raw"].write(row.tobytes())
+    terms = _terms(text)
+    vocab = seg["vocab"]
+    for term, tf in Counter(terms).items():
+        seg["post_terms"].append(vocab.setdefault(term, len(vocab)))
+        seg["post_docs"].append(seg["count"])
+        seg["post_tfs"].append(tf)
+    seg["doclen"].append(len(terms))
+    seg["count"] += 1
+
+
+def _write_postings(seg):
+    """Sort the buffered postings by (term, chunk) and save them as arrays."""
+    terms = [t.encode("utf-8") for t in seg["vocab"]]
+    by_name = np.array(sorted(range(len(terms)), key=terms.__getitem__), dtype=np.int64)
+    rank = np.empty(len(terms), dtype=np.int64)
+    rank[by_name] = np.arange(len(terms))
+    term_ids = rank[np.frombuffer(seg["post_terms"], dtype=np.intc)]
+    docs = np.frombuffer(seg["post_docs"], dtype=np.intc).astype(np.int32)
+    tfs = np.frombuffer(seg["post_tfs"], dtype=np.intc).astype(np.int32)
+    order = np.lexsort((docs, term_ids))
+    postings = np.zeros(len(terms) + 1, dtype=np.int64)
+    postings[1:] = np.cumsum(np.bincount(term_ids, minlength=len(terms)))
+    sorted_terms = [terms[i] for i in by_name]
+    with open(os.path.join(seg["tmp"], "terms.bin"), "wb") as f:
+        f.write(b"".join(sorted_terms))
+    term_offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+    term_offsets[1:] = np.cumsum([len(t) for t in sorted_terms])
+    np.save(os.path.join(seg["tmp"], "term_offsets.npy"), term_offsets)
+    np.save(os.path.join(seg["tmp"], "postings.npy"), postings)
+    np.save(os.path.join(seg["tmp"], "docs.npy"), docs[order])
+    np.save(os.path.join(seg["tmp"], "tfs.npy"), tfs[order])
+    np.save(os.path.join(seg["tmp"], "doclen.npy"),
+            np.frombuffer(seg["doclen"], dtype=np.intc).astype(np.int32))
+
+
+def _close_segment(collection, manifest, seg):
+    """Finish a segment and publish it in the manifest; empty segments are discarded."""
+    seg["chunks"].close()
+    seg["raw"].close()
+    if not seg["count"]:
+        shutil.rmtree(seg["tmp"])
+        return None
+    raw = os.path.join(seg["tmp"], "embeddings.f32")
+    with open(os.path.join(seg["tmp"], "embeddings.npy"), "wb") as out:
+        np.lib.format.write_array_header_1_0(
+            out, {"descr": "<f4", "fortran_order": False, "shape": (seg["count"], seg["dim"])})
+        with open(raw, "rb") as f:
+            shutil.copyfileobj(f, out)
+    os.remove(raw)
+    np.save(os.path.join(seg["tmp"], "offsets.npy"), np.array(seg["offsets"], dtype=np.int64))
+    np.save(os.path.join(seg["tmp"], "hashes.npy"),
+            np.frombuffer(b"".join(seg["hashes"]), dtype=np.uint8).reshape(-1, 32))
+    _write_postings(seg)
+    os.rename(seg["tmp"], os.path.join(os.path.dirname(seg["tmp"]), seg["name"]))
+    entry = {"name": seg["name"], "count": seg["count"], "terms": int(sum(seg["doclen"]))}
+    manifest["segments"].append(entry)
+    manifest["count"] += seg["count"]
+    manifest["dim"] = seg["dim"]
+    _save_manifest(collection, manifest)
+    return entry
+
+
+def _load_segment(collection, entry):
+    path = os.path.join(_collection_dir(collection), "segments", entry["name"])
+    seg = {
+        "name": entry["name"],
+        "path": path,
+        "count": entry["count"],
+        "embeddings": np.load(os.path.join(path, "embeddings.npy"), mmap_mode="r"),
+        "offsets": np.load(os.path.join(path, "offsets.npy"), mmap_mode="r"),
+        "bm25": None,
+    }
+    if os.path.exists(os.path.join(path, "term_offsets.npy")):
+        seg["bm25"] = {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r")
+                       for name in ("term_offsets", "postings", "docs", "tfs", "doclen")}
+        with open(os.path.join(path, "terms.bin"), "rb") as f:
+            seg["bm25"]["terms"] = f.read()
+    elif os.path.exists(os.path.join(path, "terms.npy")):
+        # Older segments kept the vocabulary as fixed-width "<U" strings; codepoint order
+        # matches UTF-8 byte order, so it converts without re-sorting.
+        seg["bm25"] = {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r")
+                       for name in ("postings", "docs", "tfs", "doclen")}
+        encoded = [t.encode("utf-8") for t in np.load(os.path.join(path, "terms.npy")).tolist()]
+        seg["bm25"]["terms"] = b"".join(encoded)
+        seg["bm25"]["term_offsets"] = np.concatenate(([0], np.cumsum([len(t) for t in encoded]))).astype(np.int64)
+    return seg
+
+
+def _term_position(idx, term):
+    """Index of a UTF-8 term in a segment's sorted vocabulary, or -1 if absent."""
+    blob, offsets = idx["terms"], idx["term_offsets"]
+    lo, hi = 0, len(offsets) - 1
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if blob[offsets[mid]:offsets[mid + 1]] < term:
+            lo = mid + 1
+        else:
+            hi = mid
+    if lo < len(offsets) - 1 and blob[offsets[lo]:offsets[lo + 1]] == term:
+        return lo
+    return -1
+
+
 def _load_store(collection):
-    path = _store_path(collection)
-    if os.path.exists(path):
-        with open(path) as f:
-            return json.load(f)
-    return {"chunks": [], "embeddings": []}
+    """Open a collection with every segment memory-mapped, or return None if absent."""
+    manifest = _load_manifest(collection)
+    if manifest is None:
+        return None
+    segments = [_load_segment(collection, e) for e in manifest["segments"]]
+    bases = np.zeros(len(segments) + 1, dtype=np.int64)
+    bases[1:] = np.cumsum([s["count"] for s in segments])
+    return {"manifest": manifest, "segments": segments, "bases": bases}
 
 
-def _save_store(collection, data):
-    os.makedirs(STORE_DIR, exist_ok=True)
-    with open(_store_path(collection), "w") as f:
-        json.dump(data, f)
+def _read_segment_chunks(seg, indices):
+    """Read chunk texts from one segment, seeking into chunks.bin instead of loading it."""
+    offsets = seg["offsets"]
+    texts = []
+    with open(os.path.join(seg["path"], "chunks.bin"), "rb") as f:
+        for idx in indices:
+            start, end = int(offsets[idx]), int(offsets[idx + 1])
+            f.seek(start)
+            texts.append(f.read(end - start).decode("utf-8"))
+    return texts
+
+
+def _read_chunks(store, ids):
+    """Read chunk texts by collection-wide id (segment base + local index)."""
+    seg_of = np.searchsorted(store["bases"], ids, side="right") - 1
+    return [_read_segment_chunks(store["segments"][s], [i - store["bases"][s]])[0]
+            for s, i in zip(seg_of, ids)]
+
+
+def _load_hashes(seg):
+    """Raw 32-byte digests of a segment as a uint8 (N, 32) array.
+
+    Older segments stored them as "S32", which drops trailing NUL bytes; padding
+    back to 32 bytes restores them exactly.
+    """
+    hashes = np.load(os.path.join(seg["path"], "hashes.npy"))
+    if hashes.dtype.kind == "S":
+        hashes = np.frombuffer(hashes.astype("S32").tobytes(), dtype=np.uint8).reshape(-1, 32)
+    return hashes
+
+
+def _known_hashes(store):
+    known = set()
+    for seg in store["segments"]:
+        known.update(map(bytes, _load_hashes(seg)))
+    return known
+
+
+def _top_k(scores, k):
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.zeros(0, dtype=np.int64)
+    idx = np.argpartition(-scores, k - 1)[:k]
+    return idx[np.argsort(-scores[idx])]
+
+
+def _search(store, q_emb, top_k, start=0):
+    """Exact search over ids >= start: per-segment matrix-vector scoring, merged top-k."""
+    ids, scores = [], []
+    for seg, base in zip(store["segments"], store["bases"]):
+        lo = max(0, start - int(base))
+        if lo >= seg["count"]:
+            continue
+        seg_scores = seg["embeddings"][lo:] @ q_emb
+        local = _top_k(seg_scores, top_k)
+        ids.append(local + base + lo)
+        scores.append(seg_scores[local])
+    if not ids:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+    ids, scores = np.concatenate(ids), np.concatenate(scores)
+    order = _top_k(scores, top_k)
+    return ids[order], scores[order]
+
+
+def _gather(store, ids):
+    """Fetch embedding rows by collection-wide id, returned in the order given."""
+    ids = np.asarray(ids, dtype=np.int64)
+    out = np.empty((len(ids), store["manifest"]["dim"]), dtype=np.float32)
+    seg_of = np.searchsorted(store["bases"], ids, side="right") - 1
+    for s in np.unique(seg_of):
+        mask = seg_of == s
+        local = ids[mask] - store["bases"][s]
+        order = np.argsort(local)
+        rows = store["segments"][s]["embeddings"][local[order]]
+        out[np.flatnonzero(mask)[order]] = rows
+    return out
+
+
+def _iter_blocks(store, block=INDEX_BLOCK):
+    for seg, base in zip(store["segments"], store["bases"]):
+        for lo in range(0, seg["count"], block):
+            yield int(base) + lo, seg["embeddings"][lo:lo + block]
+
 
+def _assign(vectors, centroids):
+    return np.argmax(vectors @ centroids.T, axis=1)
 
-def _cosine_sim(a, b):
-    dot = sum(x*y for x,y in zip(a,b))
-    na = math.sqrt(sum(x*x for x in a))
-    nb = math.sqrt(sum(x*x for x in b))
-    return dot / (na * nb + 1e-10)
+
+def _kmeans(sample, nlist, iters, rng):
+    """Spherical k-means: centroids stay L2-normalised so assignment is a max inner product."""
+    centroids = sample[rng.choice(len(sample), nlist, replace=False)].copy()
+    for _ in range(iters):
+        assign = _assign(sample, centroids)
+        order = np.argsort(assign, kind="stable")
+        counts = np.bincount(assign, minlength=nlist)
+        starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+        filled = counts > 0
+        sums = np.add.reduceat(sample[order], starts[filled], axis=0)
+        centroids[filled] = sums
+        empty = np.flatnonzero(~filled)
+        if len(empty):
+            centroids[empty] = sample[rng.choice(len(sample), len(empty), replace=False)]
+        centroids = _normalize(centroids)
+    return centroids
+
+
+def _index_dir(collection):
+    return os.path.join(_collection_dir(collection), "index")
+
+
+def _load_index(collection, store):
+    """Open the IVF-flat index, or return None if it is missing or built for other vectors.
+
+    Layout of ``STORE_DIR/<collection>/index/``:
+      meta.json         nlist, model, dim and the number of leading ids covered
+      centroids.npy     float32 (nlist, d) normalised k-means centroids
+      list_offsets.npy  int64 (nlist + 1) start of each inverted list
+      ids.npy           int64 (count,) collection-wide ids grouped by list
+      vectors.npy       float32 (count, d) embeddings in ids.npy order
+    Ids past ``count`` (chunks ingested after the build) are scanned exactly.
+    """
+    path = _index_dir(collection)
+    meta_path = os.path.join(path, "meta.json")
+    if not os.path.exists(meta_path):
+        return None
+    with open(meta_path) as f:
+        meta = json.load(f)
+    manifest = store["manifest"]
+    if (meta["model"] != manifest["model"] or meta["dim"] != manifest["dim"]
+            or meta["count"] > manifest["count"]):
+        return None
+    return {
+        "meta": meta,
+        "centroids": np.load(os.path.join(path, "centroids.npy")),
+        "list_offsets": np.load(os.path.join(path, "list_offsets.npy")),
+        "ids": np.load(os.path.join(path, "ids.npy"), mmap_mode="r"),
+        "vectors": np.load(os.path.join(path, "vectors.npy"), mmap_mode="r"),
+    }
+
+
+def _search_ivf(index, q_emb, top_k, nprobe):
+    offsets = index["list_offsets"]
+    probe = _top_k(index["centroids"] @ q_emb, nprobe)
+    ids, scores = [], []
+    for lst in probe:
+        lo, hi = int(offsets[lst]), int(offsets[lst + 1])
+        if lo == hi:
+            continue
+        list_scores = index["vectors"][lo:hi] @ q_emb
+        local = _top_k(list_scores, top_k)
+        ids.append(index["ids"][lo:hi][local])
+        scores.append(list_scores[local])
+    if not ids:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+    ids, scores = np.concatenate(ids), np.concatenate(scores)
+    order = _top_k(scores, top_k)
+    return ids[order], scores[order]
+
+
+def _retrieve(store, index, q_emb, top_k, nprobe):
+    """Search the IVF index for covered ids and scan the unindexed tail exactly."""
+    if index is None:
+        return _search(store, q_emb, top_k)
+    ids, scores = _search_ivf(index, q_emb, top_k, nprobe)
+    covered = index["meta"]["count"]
+    if covered < store["manifest"]["count"]:
+        tail_ids, tail_scores = _search(store, q_emb, top_k, start=covered)
+        ids, scores = np.concatenate([ids, tail_ids]), np.concatenate([scores, tail_scores])
+        order = _top_k(scores, top_k)
+        ids, scores = ids[order], scores[order]
+    return ids, scores
+
+
+def _search_bm25(store, text, top_k, k1=1.2, b=0.75):
+    """BM25 over the per-segment inverted indexes; needs no embedding call."""
+    terms = sorted({t.encode("utf-8") for t in _terms(text)})
+    segments = [s for s in store["segments"] if s["bm25"] is not None]
+    if not terms or not segments:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+    n_docs = sum(s["count"] for s in segments)
+    total_terms = sum(e.get("terms") or int(s["bm25"]["doclen"].sum())
+                      for e, s in zip(store["manifest"]["segments"], store["segments"])
+                      if s["bm25"] is not None)
+    avgdl = max(total_terms / n_docs, 1e-9)
+    # Posting ranges for every query term in every segment, then collection-wide df.
+    spans, df = [], np.zeros(len(terms))
+    for seg in segments:
+        idx = seg["bm25"]
+        seg_spans = []
+        for j, term in enumerate(terms):
+            p = _term_position(idx, term)
+            if p >= 0:
+                lo, hi = int(idx["postings"][p]), int(idx["postings"][p + 1])
+                seg_spans.append((j, lo, hi))
+                df[j] += hi - lo
+        spans.append(seg_spans)
+    idf = np.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+    ids, scores = [], []
+    bases = {s["name"]: base for s, base in zip(store["segments"], store["bases"])}
+    for seg, seg_spans in zip(segments, spans):
+        if not seg_spans:
+            continue
+        idx = seg["bm25"]
+        docs = np.concatenate([idx["docs"][lo:hi] for _, lo, hi in seg_spans])
+        tfs = np.concatenate([idx["tfs"][lo:hi] for _, lo, hi in seg_spans]).astype(np.float32)
+        weights = np.concatenate([np.full(hi - lo, idf[j], dtype=np.float32)
+                                  for j, lo, hi in seg_spans])
+        norm = k1 * (1 - b + b * idx["doclen"][docs] / avgdl)
+        contrib = weights * tfs * (k1 + 1) / (tfs + norm)
+        if len(docs) * 8 > seg["count"]:
+            # Dense postings: a direct scatter-add is cheaper than sorting.
+            seg_scores = np.bincount(docs, weights=contrib, minlength=seg["count"])
+            local = _top_k(seg_scores, top_k)
+            local = local[seg_scores[local] > 0]
+            doc_ids = local
+        else:
+            uniq, inverse = np.unique(docs, return_inverse=True)
+            seg_scores = np.bincount(inverse, weights=contrib)
+            local = _top_k(seg_scores, top_k)
+            doc_ids = uniq[local]
+        ids.append(doc_ids.astype(np.int64) + bases[seg["name"]])
+        scores.append(seg_scores[local])
+    if not ids:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+    ids, scores = np.concatenate(ids), np.concatenate(scores)
+    order = _top_k(scores, top_k)
+    return ids[order], scores[order]
+
+
+def _fuse(rankings, top_k):
+    """Reciprocal-rank fusion of several ranked id lists."""
+    fused = {}
+    for ids in rankings:
+        for rank, i in enumerate(ids):
+            fused[int(i)] = fused.get(int(i), 0.0) + 1.0 / (RRF_K + rank + 1)
+    best = sorted(fused.items(), key=lambda x: x[1], reverse=True)[:top_k]
+    return (np.array([i for i, _ in best], dtype=np.int64),
+            np.array([s for _, s in best], dtype=np.float32))
 
 
 def ingest(args):
-    with open(args.file) as f:
-        text = f.read()
-    chunks = _chunk(text, args.chunk_size)
-    print(f"{YELLOW}Embedding {len(chunks)} chunks ...{RESET}")
-    embeddings = _embed(chunks)
     store = _load_store(args.collection)
-    store["chunks"].extend(chunks)
-    store["embeddings"].extend(embeddings)
-    _save_store(args.collection, store)
-    print(f"{GREEN}Ingested {len(chunks)} chunks into collection '{args.collection}'{RESET}")
+    manifest = store["manifest"] if store else _new_manifest()
+    known = _known_hashes(store) if store else set()
+    skipped = [0]
+
+    def new_chunks():
+        for chunk in _iter_chunks(args.file, args.chunk_size, args.overlap):
+            h = _chunk_hash(chunk)
+            if h in known:
+                skipped[0] += 1
+                continue
+            known.add(h)
+            yield chunk
+
+    print(f"{YELLOW}Chunking and embedding {args.file} ...{RESET}")
+    os.makedirs(os.path.join(_collection_dir(args.collection), "segments"), exist_ok=True)
+    seg = _open_segment(args.collection, manifest)
+    try:
+        for text, h, vector in _embed_stream(new_chunks(), report=True):
+            _append_segment(seg, text, h, vector)
+    finally:
+        # Publish whatever was embedded, so a failed ingest resumes where it stopped.
+        entry = _close_segment(args.collection, manifest, seg)
+    if entry is None:
+        print(f"{GREEN}No new chunks for collection '{args.collection}' "
+              f"({skipped[0]} already embedded){RESET}")
+        return
+    print(f"{GREEN}Ingested {entry['count']} chunks into collection '{args.collection}' "
+          f"({skipped[0]} already embedded, {len(manifest['segments'])} segments){RESET}")
+    if len(manifest["segments"]) > COMPACT_HINT:
+        print(f"{YELLOW}Run 'rag_manager.py compact --collection {args.collection}' "
+              f"to merge segments.{RESET}")
+
+
+def _warn_legacy(collection):
+    if os.path.exists(_legacy_path(collection)):
+        print(f"{YELLOW}Found legacy JSON store for '{collection}'. "
+              f"Run 'rag_manager.py migrate' to convert it.{RESET}")
+
+
+def _answer(store, index, texts, top_k, nprobe, mode="vector"):
+    """Run one or more query texts; returns a list of [{"id", "score", "text"}] per text."""
+    depth = max(top_k * 4, RRF_DEPTH) if mode == "hybrid" else top_k
+    q_embs = _normalize(_embed(texts)) if mode != "bm25" else [None] * len(texts)
+    answers = []
+    for text, q_emb in zip(texts, q_embs):
+        if mode == "bm25":
+            ids, scores = _search_bm25(store, text, top_k)
+        elif mode == "vector":
+            ids, scores = _retrieve(store, index, q_emb, top_k, nprobe)
+        else:
+            vec_ids, _ = _retrieve(store, index, q_emb, depth, nprobe)
+            bm25_ids, _ = _search_bm25(store, text, depth)
+            ids, scores = _fuse([vec_ids, bm25_ids], top_k)
+        answers.append([{"id": int(i), "score": float(s), "text": t}
+                        for i, s, t in zip(ids, scores, _read_chunks(store, ids))])
+    return answers
+
+
+def _print_answer(text, top_k, hits):
+    print(f"{GREEN}Top {top_k} results for: '{text}'{RESET}")
+    for rank, hit in enumerate(hits, 1):
+        print(f"\n{YELLOW}[{rank}] score={hit['score']:.4f}{RESET}")
+        print(hit["text"][:400])
+
+
+def _daemon_query(payload):
+    """Send a query to a running `serve` daemon; None if there is no live daemon."""
+    try:
+        with open(DAEMON_FILE) as f:
+            daemon = json.load(f)
+        os.kill(daemon["pid"], 0)
+    except (OSError, ValueError, KeyError):
+        return None
+    req = urllib.request.Request(f"http://{daemon['host']}:{daemon['port']}/query",
+                                 data=json.dumps(payload).encode(),
+                                 headers={"Content-Type": "application/json"})
+    try:
+        with urllib.request.urlopen(req, timeout=60) as resp:
+            return json.load(resp)
+    except urllib.error.HTTPError as e:
+        try:
+            return json.load(e)
+        except ValueError:  # not the daemon answering, e.g. a proxy's HTML error page
+            return None
+    except (OSError, ValueError):
+        return None
 
 
 def query(args):
+    payload = {"collection": args.collection, "texts": [args.text], "top_k": args.top_k,
+               "nprobe": args.nprobe, "exact": args.exact, "mode": args.mode}
+    reply = None if args.no_daemon else _daemon_query(payload)
+    if reply is not None:
+        if "error" in reply:
+            print(f"{YELLOW}{reply['error']}{RESET}")
+            return
+        _print_answer(args.text, args.top_k, reply["results"][0])
+        return
     store = _load_store(args.collection)
-    if not store["chunks"]:
+    if not store or not store["manifest"]["count"]:
         print(f"{YELLOW}Collection '{args.collection}' is empty.{RESET}")
+        _warn_legacy(args.collection)
         return
-    q_emb = _embed([args.text])[0]
-    scored = [(i, _cosine_sim(q_emb, e)) for i, e in enumerate(store["embeddings"])]
-    top = sorted(scored, key=lambda x: x[1], reverse=True)[:args.top_k]
-    print(f"{GREEN}Top {args.top_k} results for: '{args.text}'{RESET}")
-    for rank, (idx, score) in enumerate(top, 1):
-        print(f"\n{YELLOW}[{rank}] score={score:.4f}{RESET}")
-        print(store["chunks"][idx][:400])
+    index = None if args.exact or args.mode == "bm25" else _load_index(args.collection, store)
+    hits = _answer(store, index, [args.text], args.top_k, args.nprobe, args.mode)[0]
+    _print_answer(args.text, args.top_k, hits)
+
+
+def _collection_signature(collection):
+    """mtimes of the files a reload depends on; any change means the collection moved on."""
+    sig = []
+    for path in (_manifest_path(collection), os.path.join(_index_dir(collection), "meta.json")):
+        try:
+            sig.append(os.stat(path).st_mtime_ns)
+        except OSError:
+            sig.append(None)
+    return tuple(sig)
+
+
+def _hot_collection(hot, collection):
+    """Return the resident (store, index) for a collection, (re)loading it if its files changed."""
+    sig = _collection_signature(collection)
+    entry = hot.get(collection)
+    if entry is None or entry["sig"] != sig:
+        store = _load_store(collection)
+        entry = {"sig": sig, "store": store,
+                 "index": _load_index(collection, store) if store else None}
+        hot[collection] = entry
+    return entry["store"], entry["index"]
+
+
+class QueryHandler(http.server.BaseHTTPRequestHandler):
+    hot = {}
+    lock = threading.Lock()
+
+    def _reply(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path != "/health":
+            self._reply(404, {"error": f"Unknown path {self.path}"})
+            return
+        with self.lock:
+            loaded = {name: e["store"]["manifest"]["count"]
+                      for name, e in self.hot.items() if e["store"]}
+        self._reply(200, {"pid": os.getpid(), "collections": loaded})
+
+    def do_POST(self):
+        if self.path != "/query":
+            self._reply(404, {"error": f"Unknown path {self.path}"})
+            return
+        try:
+            req = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+            collection, texts = req["collection"], req["texts"]
+        except (ValueError, KeyError, TypeError):
+            self._reply(400, {"error": "Expected JSON body with 'collection' and 'texts'"})
+            return
+        with self.lock:
+            store, index = _hot_collection(self.hot, collection)
+        if not store or not store["manifest"]["count"]:
+            self._reply(404, {"error": f"Collection '{collection}' is empty."})
+            return
+        if req.get("exact"):
+            index = None
+        try:
+            results = _answer(store, index, texts, int(req.get("top_k", 5)),
+                              int(req.get("nprobe", 8)), req.get("mode", "vector"))
+        except Exception as e:
+            self._reply(500, {"error": f"Query failed: {e}"})
+            return
+        self._reply(200, {"results": results})
+
+    def log_message(self, format, *args):
+        pass  # Suppress default logging
+
+
+def _watch(interval):
+    """Reload resident collections in the background when their files change."""
+    while True:
+        time.sleep(interval)
+        with QueryHandler.lock:
+            for name in list(QueryHandler.hot):
+                if QueryHandler.hot[name]["sig"] != _collection_signature(name):
+                    _hot_collection(QueryHandler.hot, name)
+                    print(f"{YELLOW}Reloaded collection '{name}'{RESET}")
+
+
+def serve(args):
+    os.makedirs(STORE_DIR, exist_ok=True)
+    names = args.collections.split(",") if args.collections else sorted(
+        d for d in os.listdir(STORE_DIR) if os.path.exists(_manifest_path(d)))
+    for name in names:
+        store, index = _hot_collection(QueryHandler.hot, name)
+        count = store["manifest"]["count"] if store else 0
+        print(f"  Loaded {name}  ({count} chunks{', IVF index' if index else ''})")
+    server = http.server.ThreadingHTTPServer((args.host, args.port), QueryHandler)
+    host, port = server.server_address[:2]
+    with open(DAEMON_FILE, "w") as f:
+        json.dump({"host": host, "port": port, "pid": os.getpid()}, f)
+    threading.Thread(target=_watch, args=(args.watch_interval,), daemon=True).start()
+    print(f"{GREEN}Serving queries at http://{host}:{port}/query{RESET}")
+    print("  Press Ctrl+C to stop")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print(f"\n{YELLOW}Server stopped.{RESET}")
+    finally:
+        server.server_close()
+        os.remove(DAEMON_FILE)
 
 
 def list_collections(args):
     os.makedirs(STORE_DIR, exist_ok=True)
-    files = [f for f in os.listdir(STORE_DIR) if f.endswith(".json")]
-    if not files:
+    names = sorted(d for d in os.listdir(STORE_DIR) if os.path.exists(_manifest_path(d)))
+    legacy = sorted(f[:-5] for f in os.listdir(STORE_DIR) if f.endswith(".json"))
+    if not names and not legacy:
         print(f"{YELLOW}No collections found.{RESET}")
         return
     print(f"{GREEN}Collections:{RESET}")
-    for f in files:
-        name = f[:-5]
-        data = _load_store(name)
-        print(f"  {name}  ({len(data['chunks'])} chunks)")
+    for name in names:
+        manifest = _load_manifest(name)
+        print(f"  {name}  ({manifest['count']} chunks, dim={manifest['dim']}, "
+              f"{len(manifest['segments'])} segments)")
+    for name in legacy:
+        print(f"  {name}  {YELLOW}(legacy JSON, run 'migrate'){RESET}")
 
 
 def delete_collection(args):
-    path = _store_path(args.collection)
-    if os.path.exists(path):
-        os.remove(path)
+    path = _collection_dir(args.collection)
+    deleted = False
+    if os.path.isdir(path):
+        shutil.rmtree(path)
+        deleted = True
+    if os.path.exists(_legacy_path(args.collection)):
+        os.remove(_legacy_path(args.collection))
+        deleted = True
+    if deleted:
         print(f"{GREEN}Deleted collection '{args.collection}'{RESET}")
     else:
         print(f"{YELLOW}Collection '{args.collection}' not found{RESET}")
 
 
+def _iter_segment(seg):
+    """Yield (text, hash, embedding) for every row of a segment, reading it sequentially."""
+    hashes = _load_hashes(seg)
+    with open(os.path.join(seg["path"], "chunks.bin"), "rb") as f:
+        for lo in range(0, seg["count"], INDEX_BLOCK):
+            vectors = np.asarray(seg["embeddings"][lo:lo + INDEX_BLOCK])
+            sizes = np.diff(seg["offsets"][lo:lo + len(vectors) + 1])
+            for i, (vec, size) in enumerate(zip(vectors, sizes)):
+                yield f.read(int(size)).decode("utf-8"), bytes(hashes[lo + i]), vec
+
+
+def compact(args):
+    store = _load_store(args.collection)
+    if not store:
+        print(f"{YELLOW}Collection '{args.collection}' not found{RESET}")
+        return
+    manifest = store["manifest"]
+    if len(store["segments"]) < 2 and all(s["bm25"] is not None for s in store["segments"]):
+        print(f"{GREEN}Collection '{args.collection}' already has "
+              f"{len(store['segments'])} segment(s), nothing to compact{RESET}")
+        return
+    old = [s["path"] for s in store["segments"]]
+    # Stream every row through the segment writer, which also rebuilds the BM25 postings.
+    manifest["segments"], manifest["count"] = [], 0
+    seg = _open_segment(args.collection, manifest)
+    for src in store["segments"]:
+        for text, h, vec in _iter_segment(src):
+            _append_segment(seg, text, h, vec)
+    entry = _close_segment(args.collection, manifest, seg)
+    for path in old:
+        shutil.rmtree(path)
+    print(f"{GREEN}Compacted {len(old)} segments into {entry['name']} ({entry['count']} chunks){RESET}")
+
+
+def build_index(args):
+    store = _load_store(args.collection)
+    if not store or not store["manifest"]["count"]:
+        print(f"{YELLOW}Collection '{args.collection}' is empty.{RESET}")
+        return
+    manifest = store["manifest"]
+    total, dim = manifest["count"], manifest["dim"]
+    nlist = args.nlist or max(1, int(4 * np.sqrt(total)))
+    nlist = min(nlist, total)
+    rng = np.random.default_rng(args.seed)
+    train_ids = np.sort(rng.choice(total, min(total, nlist * 64), replace=False))
+    print(f"{YELLOW}Training {nlist} centroids on {len(train_ids)} of {total} vectors ...{RESET}")
+    t0 = time.perf_counter()
+    centroids = _kmeans(_gather(store, train_ids), nlist, args.iters, rng)
+
+    assign = np.empty(total, dtype=np.int64)
+    for base, block in _iter_blocks(store):
+        assign[base:base + len(block)] = _assign(block, centroids)
+    order = np.argsort(assign, kind="stable")
+    list_offsets = np.zeros(nlist + 1, dtype=np.int64)
+    list_offsets[1:] = np.cumsum(np.bincount(assign, minlength=nlist))
+
+    path = _index_dir(args.collection)
+    tmp = path + ".tmp"
+    if os.path.isdir(tmp):
+        shutil.rmtree(tmp)
+    os.makedirs(tmp)
+    vectors = np.lib.format.open_memmap(os.path.join(tmp, "vectors.npy"), mode="w+",
+                                        dtype=np.float32, shape=(total, dim))
+    for lo in range(0, total, INDEX_BLOCK):
+        vectors[lo:lo + INDEX_BLOCK] = _gather(store, order[lo:lo + INDEX_BLOCK])
+    vectors.flush()
+    del vectors
+    np.save(os.path.join(tmp, "centroids.npy"), centroids)
+    np.save(os.path.join(tmp, "list_offsets.npy"), list_offsets)
+    np.save(os.path.join(tmp, "ids.npy"), order)
+    with open(os.path.join(tmp, "meta.json"), "w") as f:
+        json.dump({"type": "ivf-flat", "nlist": nlist, "model": manifest["model"],
+                   "dim": dim, "count": total}, f, indent=2)
+    if os.path.isdir(path):
+        shutil.rmtree(path)
+    os.rename(tmp, path)
+    sizes = np.diff(list_offsets)
+    print(f"{GREEN}Built IVF-flat index for '{args.collection}': {nlist} lists, "
+          f"{total} vectors in {time.perf_counter() - t0:.1f}s{RESET}")
+    print(f"  List size min/median/max: {sizes.min()}/{int(np.median(sizes))}/{sizes.max()}")
+
+
+def bench_index(args):
+    store = _load_store(args.collection)
+    if not store or not store["manifest"]["count"]:
+        print(f"{YELLOW}Collection '{args.collection}' is empty.{RESET}")
+        return
+    index = _load_index(args.collection, store)
+    if index is None:
+        print(f"{RED}No usable index for '{args.collection}'. Run 'build-index' first.{RESET}")
+        sys.exit(1)
+    # Queries are perturbed copies of stored vectors, so the benchmark needs no API calls.
+    total = store["manifest"]["count"]
+    rng = np.random.default_rng(args.seed)
+    picks = np.sort(rng.choice(total, min(args.queries, total), replace=False))
+    queries = _gather(store, picks)
+    queries = _normalize(queries + rng.normal(0, args.noise, queries.shape).astype(np.float32))
+
+    def run(search):
+        results, latencies = [], []
+        for q in queries:
+            t0 = time.perf_counter()
+            ids, _ = search(q)
+            latencies.append((time.perf_counter() - t0) * 1000)
+            results.append(ids)
+        return results, np.array(latencies)
+
+    truth, exact_ms = run(lambda q: _search(store, q, args.top_k))
+    print(f"{GREEN}Index benchmark for '{args.collection}' "
+          f"({total} vectors, nlist={index['meta']['nlist']}, {len(queries)} queries, k={args.top_k}){RESET}")
+    print(f"  {'mode':<14} {'recall@k':>9} {'p50 ms':>9} {'p99 ms':>9}")
+    print(f"  {'brute-force':<14} {1.0:>9.3f} {np.percentile(exact_ms, 50):>9.3f} "
+          f"{np.percentile(exact_ms, 99):>9.3f}")
+    for nprobe in [int(n) for n in args.nprobe.split(",")]:
+        found, ms = run(lambda q: _retrieve(store, index, q, args.top_k, nprobe))
+        hits = sum(len(np.intersect1d(f, t)) for f, t in zip(found, truth))
+        recall = hits / max(1, sum(len(t) for t in truth))
+        color = GREEN if recall >= 0.9 else YELLOW
+        print(f"  {'nprobe=' + str(nprobe):<14} {color}{recall:>9.3f}{RESET} "
+              f"{np.percentile(ms, 50):>9.3f} {np.percentile(ms, 99):>9.3f}")
+
+
+def migrate(args):
+    os.makedirs(STORE_DIR, exist_ok=True)
+    if args.collection:
+        names = [args.collection]
+    else:
+        names = sorted(f[:-5] for f in os.listdir(STORE_DIR) if f.endswith(".json"))
+    if not names:
+        print(f"{YELLOW}No legacy JSON collections to migrate.{RESET}")
+        return
+    for name in names:
+        src = _legacy_path(name)
+        if not os.path.exists(src):
+            print(f"{YELLOW}  {name}: no legacy store at {src}{RESET}")
+            continue
+        if _load_manifest(name) is not None:
+            print(f"{YELLOW}  {name}: already migrated, skipping{RESET}")
+            continue
+        with open(src) as f:
+            data = json.load(f)
+        os.makedirs(_collection_dir(name), exist_ok=True)
+        manifest = _new_manifest()
+        os.makedirs(os.path.join(_collection_dir(name), "segments"), exist_ok=True)
+        seg = _open_segment(name, manifest)
+        for text, vector in zip(data["chunks"], data["embeddings"]):
+            _append_segment(seg, text, _chunk_hash(text), vector)
+        if _close_segment(name, manifest, seg) is None:
+            _save_manifest(name, manifest)
+        if not args.keep_json:
+            os.remove(src)
+        print(f"{GREEN}  {name}: migrated {len(data['chunks'])} chunks{RESET}")
+
+
 def main():
     parser = argparse.ArgumentParser(description="RAG Manager")
     sub = parser.add_subparsers(dest="command", required=True)
@@ -123,23 +1170,60 @@ def main():
     p_i = sub.add_parser("ingest")
     p_i.add_argument("--file", required=True)
     p_i.add_argument("--collection", default="default")
-    p_i.add_argument("--chunk-size", type=int, default=500)
+    p_i.add_argument("--chunk-size", type=int, default=500, help="Maximum tokens per chunk")
+    p_i.add_argument("--overlap", type=int, default=50, help="Tokens shared by consecutive chunks")
 
     p_q = sub.add_parser("query")
     p_q.add_argument("--text", required=True)
     p_q.add_argument("--collection", default="default")
     p_q.add_argument("--top-k", type=int, default=5)
+    p_q.add_argument("--nprobe", type=int, default=8, help="IVF lists to scan when an index exists")
+    p_q.add_argument("--exact", action="store_true", help="Ignore the index and scan every vector")
+    p_q.add_argument("--mode", choices=["vector", "bm25", "hybrid"], default="vector",
+                     help="bm25 needs no API call; hybrid fuses both rankings")
+    p_q.add_argument("--no-daemon", action="store_true", help="Query in-process even if 'serve' is running")
+
+    p_s = sub.add_parser("serve")
+    p_s.add_argument("--host", default="127.0.0.1")
+    p_s.add_argument("--port", type=int, default=8799)
+    p_s.add_argument("--collections", default=None, help="Comma-separated collections to preload (default: all)")
+    p_s.add_argument("--watch-interval", type=float, default=2.0, help="Seconds between reload checks")
 
     sub.add_parser("list-collections")
 
     p_d = sub.add_parser("delete-collection")
     p_d.add_argument("--collection", required=True)
 
+    p_k = sub.add_parser("compact")
+    p_k.add_argument("--collection", required=True)
+
+    p_b = sub.add_parser("build-index")
+    p_b.add_argument("--collection", required=True)
+    p_b.add_argument("--nlist", type=int, default=None, help="Number of IVF lists (default 4*sqrt(N))")
+    p_b.add_argument("--iters", type=int, default=10)
+    p_b.add_argument("--seed", type=int, default=0)
+
+    p_bi = sub.add_parser("bench-index")
+    p_bi.add_argument("--collection", required=True)
+    p_bi.add_argument("--queries", type=int, default=200)
+    p_bi.add_argument("--top-k", type=int, default=10)
+    p_bi.add_argument("--nprobe", default="1,4,8,16,32")
+    p_bi.add_argument("--noise", type=float, default=0.05)
+    p_bi.add_argument("--seed", type=int, default=0)
+
+    p_m = sub.add_parser("migrate")
+    p_m.add_argument("--collection", default=None)
+    p_m.add_argument("--keep-json", action="store_true")
+
     args = parser.parse_args()
     dispatch = {
-        "ingest": ingest, "query": query,
+        "ingest": ingest, "query": query, "serve": serve,
         "list-collections": list_collections,
         "delete-collection": delete_collection,
+        "compact": compact,
+        "build-index": build_index,
+        "bench-index": bench_index,
+        "migrate": migrate,
     }
     dispatch[args.command](args)
 
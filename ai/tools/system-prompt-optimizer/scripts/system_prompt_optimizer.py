@@ -1,31 +1,173 @@
 #!/usr/bin/env python3
 """System Prompt Optimizer – OC-0121"""
-import argparse, json, os, sys, requests
+import argparse, email.utils, hashlib, json, math, os, random, re, sqlite3, sys, threading, time, requests
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 RED="\033[91m"; GREEN="\033[92m"; YELLOW="\033[93m"; RESET="\033[0m"
 BASE="https://api.openai.com/v1"
+SCORE_CACHE=os.path.expanduser("~/.openclaw/optimizer_cache.sqlite")
+RETRIES=5
+SCORE_RE=re.compile(r"-?\d+(?:\.\d+)?")
+_SESSION=None
 
 def _key():
     k=os.environ.get("OPENAI_API_KEY")
     if not k: print(f"{RED}Error: OPENAI_API_KEY not set{RESET}"); sys.exit(1)
     return k
 
-def _chat(messages,model="gpt-4o"):
-    resp=requests.post(f"{BASE}/chat/completions",
-        headers={"Authorization":f"Bearer {_key()}","Content-Type":"application/json"},
-        json={"model":model,"messages":messages})
-    if not resp.ok: print(f"{RED}API error: {resp.text}{RESET}"); sys.exit(1)
-    return resp.json()["choices"][0]["message"]["content"]
+def _session(pool_size=1):
+    global _SESSION
+    if _SESSION is None:
+        _SESSION=requests.Session()
+        _SESSION.mount("https://",requests.adapters.HTTPAdapter(pool_connections=1,pool_maxsize=pool_size))
+        _SESSION.headers.update({"Authorization":f"Bearer {_key()}","Content-Type":"application/json"})
+    return _SESSION
+
+def _limiter(rpm,tpm):
+    """Token buckets for requests and tokens per minute; acquire(n) blocks until both allow a request of ~n tokens."""
+    lock=threading.Lock(); state={"req":float(rpm or 0),"tok":float(tpm or 0),"t":time.monotonic()}
+    def refill():
+        now=time.monotonic(); el=now-state["t"]; state["t"]=now
+        if rpm: state["req"]=min(rpm,state["req"]+el*rpm/60)
+        if tpm: state["tok"]=min(tpm,state["tok"]+el*tpm/60)
+    def acquire(n):
+        n=min(n,tpm) if tpm else 0
+        while True:
+            with lock:
+                refill()
+                if (not rpm or state["req"]>=1) and (not tpm or state["tok"]>=n):
+                    if rpm: state["req"]-=1
+                    if tpm: state["tok"]-=n
+                    return
+                wait=max((1-state["req"])*60/rpm if rpm else 0,(n-state["tok"])*60/tpm if tpm else 0)
+            time.sleep(min(max(wait,0.01),5))
+    def debit(n):
+        if tpm:
+            with lock: state["tok"]-=n
+    return acquire,debit
+
+def _retry_delay(resp,attempt):
+    """Seconds before the next attempt: the Retry-After header (delta-seconds or HTTP-date) if present, else exponential backoff with jitter."""
+    value=resp.headers.get("Retry-After") if resp is not None else None
+    if value:
+        try: return min(max(float(value),0),60)
+        except ValueError:
+            try: return min(max(email.utils.parsedate_to_datetime(value).timestamp()-time.time(),0),60)
+            except (TypeError,ValueError): pass
+    return min(2**attempt+random.random(),60)
+
+def _chat(messages,model="gpt-4o",limit=None,pool_size=1,**params):
+    """One chat completion, retrying 429/5xx and connection errors with exponential backoff; raises RuntimeError when retries run out."""
+    est=sum(len(m["content"]) for m in messages)//4+params.get("max_tokens",512)
+    for attempt in range(RETRIES+1):
+        if limit: limit[0](est)
+        try: resp=_session(pool_size).post(f"{BASE}/chat/completions",json={"model":model,"messages":messages,**params},timeout=120)
+        except requests.RequestException as e: resp=None; error=str(e)
+        else:
+            if resp.ok:
+                data=resp.json()
+                if limit: limit[1](data.get("usage",{}).get("total_tokens",est)-est)
+                return data["choices"][0]["message"]["content"]
+            error=resp.text
+            if resp.status_code!=429 and resp.status_code<500: break
+        if attempt<RETRIES:
+            time.sleep(_retry_delay(resp,attempt))
+    raise RuntimeError(error)
+
+def _hash(*parts):
+    return hashlib.sha256("\0".join(parts).encode()).hexdigest()
+
+def _cache_open():
+    os.makedirs(os.path.dirname(SCORE_CACHE),exist_ok=True)
+    db=sqlite3.connect(SCORE_CACHE)
+    db.execute("CREATE TABLE IF NOT EXISTS scores (prompt_hash TEXT, input_hash TEXT, score REAL, PRIMARY KEY (prompt_hash, input_hash))")
+    return db
+
+def _score_case(prompt,case,model,judge,limit,pool_size):
+    """Run one test input under the prompt and have the judge grade it 0-10; None if the grade is unparseable."""
+    result=_chat([{"role":"system","content":prompt},{"role":"user","content":case["input"]}],model,limit,pool_size)
+    score_resp=_chat([{"role":"user","content":
+        f"Score this response 0-10 for quality. Expected: {case.get('expected','')}\nActual: {result}\nReturn only a number."}],judge,limit,pool_size)
+    m=SCORE_RE.search(score_resp)
+    return min(max(float(m.group()),0),10) if m else None
+
+def _score_all(pairs,cases,args,db,pool,limit,stats):
+    """Score (prompt, case index) pairs, reading and filling the (prompt hash, input hash) memo; returns {pair: score}."""
+    judge=args.judge_model or args.model
+    keys={pair:(_hash(args.model,judge,pair[0]),_hash(json.dumps(cases[pair[1]],sort_keys=True))) for pair in set(pairs)}
+    out={}; todo=[]
+    for pair,(ph,ih) in keys.items():
+        row=db.execute("SELECT score FROM scores WHERE prompt_hash=? AND input_hash=?",(ph,ih)).fetchone()
+        if row: out[pair]=row[0]; stats["hits"]+=1
+        else: todo.append(pair)
+    futs={pool.submit(_score_case,pair[0],cases[pair[1]],args.model,judge,limit,args.concurrency):pair for pair in todo}
+    for fut in as_completed(futs):
+        pair=futs[fut]
+        try: score=fut.result()
+        except RuntimeError as e: stats["errors"]+=1; print(f"  {RED}API error: {str(e)[:200]}{RESET}"); continue
+        stats["scored"]+=1
+        if score is None: continue
+        out[pair]=score
+        with db: db.execute("INSERT OR REPLACE INTO scores VALUES (?,?,?)",(*keys[pair],score))
+    return out
+
+def _mean(prompt,idx,scores):
+    vals=[scores[(prompt,i)] for i in idx if (prompt,i) in scores]
+    return sum(vals)/len(vals) if vals else 0.0
+
+def _generate(current,goal,n,pool,limit,model,pool_size):
+    prompts=[[{"role":"user","content":
+        f"You are a prompt engineering expert. Improve this system prompt to better achieve this goal: {goal}\n\nCurrent prompt:\n{current}\n\n"
+        f"This is variant {i+1} of {n}; explore a different direction from the other variants.\nReturn ONLY the improved prompt text."}] for i in range(n)]
+    out=[]
+    for fut in as_completed([pool.submit(_chat,m,model,limit,pool_size,temperature=1.0) for m in prompts]):
+        try: cand=fut.result().strip()
+        except RuntimeError as e: print(f"  {RED}API error: {str(e)[:200]}{RESET}"); continue
+        if cand and cand!=current and cand not in out: out.append(cand)
+    return out
+
+def _halving(pool_prompts,order,cases,args,db,pool,limit,stats):
+    """Successive halving: every survivor is scored on a growing prefix of the shuffled inputs and the weaker half is cut after each rung.
+
+    The first prompt is the incumbent and always survives to the last rung, so the winner is picked
+    on the full input set against it rather than on a lucky short prefix."""
+    alive=list(pool_prompts); rungs=max(1,math.ceil(math.log2(len(alive)))) if len(alive)>1 else 1; scores={}
+    for k in range(rungs):
+        budget=len(order) if k==rungs-1 else max(1,len(order)>>(rungs-1-k)); idx=order[:budget]
+        scores.update(_score_all([(p,i) for p in alive for i in idx],cases,args,db,pool,limit,stats))
+        ranked=sorted(alive,key=lambda p:(-_mean(p,idx,scores),pool_prompts.index(p)))
+        print(f"    rung {k+1}/{rungs}: {len(alive)} candidates x {budget} inputs, best {_mean(ranked[0],idx,scores):.2f}")
+        alive=ranked if k==rungs-1 else ranked[:math.ceil(len(ranked)/2)]
+        if pool_prompts[0] not in alive: alive.append(pool_prompts[0])
+    return alive[0],_mean(alive[0],order,scores),{p:_mean(p,order,scores) for p in alive}
 
 def optimize(args):
     with open(args.prompt_file) as f: prompt=f.read()
-    print(f"{YELLOW}Optimizing prompt ({args.iterations} iterations) ...{RESET}")
     current=prompt
-    for i in range(args.iterations):
-        feedback=_chat([{"role":"user","content":
-            f"You are a prompt engineering expert. Improve this system prompt to better achieve this goal: {args.goal}\n\nCurrent prompt:\n{current}\n\nReturn ONLY the improved prompt text."}])
-        current=feedback
-        print(f"  {GREEN}Iteration {i+1} complete{RESET}")
+    if not args.test_cases_file:
+        print(f"{YELLOW}Optimizing prompt ({args.rounds} iterations) ...{RESET}")
+        for i in range(args.rounds):
+            current=_chat([{"role":"user","content":
+                f"You are a prompt engineering expert. Improve this system prompt to better achieve this goal: {args.goal}\n\nCurrent prompt:\n{current}\n\nReturn ONLY the improved prompt text."}],model=args.meta_model)
+            print(f"  {GREEN}Iteration {i+1} complete{RESET}")
+    else:
+        with open(args.test_cases_file) as f: cases=json.load(f)
+        if not cases: print(f"{RED}Error: no test cases in {args.test_cases_file}{RESET}"); sys.exit(1)
+        order=list(range(len(cases))); random.Random(args.seed).shuffle(order)
+        limit=_limiter(args.rpm,args.tpm) if args.rpm or args.tpm else None
+        db=_cache_open(); stats={"hits":0,"scored":0,"errors":0}; t0=time.monotonic()
+        print(f"{YELLOW}Optimizing prompt: {args.rounds} rounds x {args.candidates} candidates on {len(cases)} test cases (concurrency {args.concurrency}) ...{RESET}")
+        with ThreadPoolExecutor(args.concurrency) as pool:
+            best=_mean(current,order,_score_all([(current,i) for i in order],cases,args,db,pool,limit,stats))
+            print(f"  Baseline score: {best:.2f}/10")
+            for r in range(args.rounds):
+                cands=_generate(current,args.goal,args.candidates,pool,limit,args.meta_model,args.concurrency)
+                print(f"  {YELLOW}Round {r+1}: {len(cands)} new candidates{RESET}")
+                winner,score,_=_halving([current]+cands,order,cases,args,db,pool,limit,stats)
+                if winner!=current and score>best: current,best=winner,score; print(f"  {GREEN}Round {r+1}: new best {best:.2f}/10{RESET}")
+                else: print(f"  Round {r+1}: no candidate beat the current prompt ({best:.2f}/10)")
+        el=time.monotonic()-t0
+        print(f"{GREEN}Search done in {el:.1f}s: {stats['scored']} inputs scored, {stats['hits']} cached, {stats['errors']} errors{RESET}")
     print(f"\n{GREEN}Optimized prompt:{RESET}\n{current}")
     out=args.output or args.prompt_file.replace(".txt","_optimized.txt")
     with open(out,"w") as f: f.write(current)
@@ -34,16 +176,14 @@ def optimize(args):
 def evaluate(args):
     with open(args.prompt_file) as f: prompt=f.read()
     with open(args.test_cases_file) as f: cases=json.load(f)
+    if args.max_cases: cases=cases[:args.max_cases]
     print(f"{YELLOW}Evaluating {len(cases)} test cases ...{RESET}")
-    scores=[]
-    for case in cases[:5]:
-        result=_chat([{"role":"system","content":prompt},{"role":"user","content":case["input"]}])
-        score_resp=_chat([{"role":"user","content":
-            f"Score this response 0-10 for quality. Expected: {case.get('expected','')}\nActual: {result}\nReturn only a number."}])
-        try: score=float(score_resp.strip()); scores.append(score)
-        except: pass
-    avg=sum(scores)/len(scores) if scores else 0
-    print(f"{GREEN}Average score: {avg:.1f}/10{RESET}")
+    limit=_limiter(args.rpm,args.tpm) if args.rpm or args.tpm else None
+    stats={"hits":0,"scored":0,"errors":0}
+    with ThreadPoolExecutor(args.concurrency) as pool:
+        scores=_score_all([(prompt,i) for i in range(len(cases))],cases,args,_cache_open(),pool,limit,stats)
+    avg=sum(scores.values())/len(scores) if scores else 0
+    print(f"{GREEN}Average score: {avg:.1f}/10{RESET} ({len(scores)} scored, {stats['hits']} cached, {stats['errors']} errors)")
 
 def compare_versions(args):
     with open(args.v1_file) as f: v1=f.read()
@@ -61,11 +201,17 @@ def apply(args):
 def main():
     p=argparse.ArgumentParser(description="System Prompt Optimizer")
     s=p.add_subparsers(dest="command",required=True)
-    po=s.add_parser("optimize"); po.add_argument("--prompt-file",required=True); po.add_argument("--goal",required=True); po.add_argument("--iterations",type=int,default=3); po.add_argument("--output",default=None)
-    pe=s.add_parser("evaluate"); pe.add_argument("--prompt-file",required=True); pe.add_argument("--test-cases-file",required=True); pe.add_argument("--model",default="gpt-4o-mini")
+    po=s.add_parser("optimize"); po.add_argument("--prompt-file",required=True); po.add_argument("--goal",required=True); po.add_argument("--rounds","--iterations",type=int,default=3); po.add_argument("--output",default=None)
+    po.add_argument("--test-cases-file",default=None,help="JSON list of {input, expected}; enables the candidate search"); po.add_argument("--candidates",type=int,default=4)
+    po.add_argument("--meta-model",default="gpt-4o",help="Model that writes candidates"); po.add_argument("--seed",type=int,default=0)
+    pe=s.add_parser("evaluate"); pe.add_argument("--prompt-file",required=True); pe.add_argument("--test-cases-file",required=True); pe.add_argument("--max-cases","--limit",type=int,default=5,help="Evaluate the first N cases (0 for all)")
+    for sp in (po,pe):
+        sp.add_argument("--model",default="gpt-4o-mini",help="Model the prompt runs on"); sp.add_argument("--judge-model",default=None,help="Grading model (default: --model)")
+        sp.add_argument("--concurrency",type=int,default=8); sp.add_argument("--rpm",type=int,default=None); sp.add_argument("--tpm",type=int,default=None)
     pc=s.add_parser("compare-versions"); pc.add_argument("--v1-file",required=True); pc.add_argument("--v2-file",required=True)
     pa=s.add_parser("apply"); pa.add_argument("--prompt-file",required=True); pa.add_argument("--output",default=None)
     args=p.parse_args()
-    {"optimize":optimize,"evaluate":evaluate,"compare-versions":compare_versions,"apply":apply}[args.command](args)
+    try: {"optimize":optimize,"evaluate":evaluate,"compare-versions":compare_versions,"apply":apply}[args.command](args)
+    except RuntimeError as e: print(f"{RED}API error: {e}{RESET}"); sys.exit(1)
 
 if __name__=="__main__": main()
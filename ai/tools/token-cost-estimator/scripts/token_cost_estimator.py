@@ -2,14 +2,21 @@
 """Token Cost Estimator – OC-0116"""
 
 import argparse
+import fnmatch
+import glob
+import json
 import os
 import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
 RED = "\033[91m"
 GREEN = "\033[92m"
 YELLOW = "\033[93m"
 RESET = "\033[0m"
 
+BLOCK_SIZE = 4 * 1024 * 1024
+
 # Pricing: (input_per_1M, output_per_1M) in USD
 PRICING = {
     "gpt-4o":                    (2.50,  10.00),
@@ -25,17 +32,29 @@ PRICING = {
 }
 
 
-def _count_tokens(text, model):
-    try:
-        import tiktoken
+_ENCODERS = {}
+
+
+def _encoder(model):
+    """tiktoken encoder for a model, cached per process; None when tiktoken is missing."""
+    if model not in _ENCODERS:
         try:
-            enc = tiktoken.encoding_for_model(model)
-        except KeyError:
-            enc = tiktoken.get_encoding("cl100k_base")
-        return len(enc.encode(text))
-    except ImportError:
+            import tiktoken
+            try:
+                _ENCODERS[model] = tiktoken.encoding_for_model(model)
+            except KeyError:
+                _ENCODERS[model] = tiktoken.get_encoding("cl100k_base")
+        except ImportError:
+            _ENCODERS[model] = None
+    return _ENCODERS[model]
+
+
+def _count_tokens(text, model):
+    enc = _encoder(model)
+    if enc is None:
         # Approximation: ~4 chars per token
         return len(text) // 4
+    return len(enc.encode_ordinary(text))
 
 
 def _cost(tokens, model, direction="input"):
@@ -69,6 +88,138 @@ def estimate_file(args):
     _print_estimate(text, args.model)
 
 
+def _iter_files(paths, pattern):
+    """Expand files, directories (walked recursively) and glob patterns."""
+    for path in paths:
+        matches = glob.glob(path, recursive=True) if glob.has_magic(path) else [path]
+        for match in sorted(matches):
+            if os.path.isdir(match):
+                for root, dirs, files in os.walk(match):
+                    dirs[:] = sorted(d for d in dirs if not d.startswith("."))
+                    for name in sorted(files):
+                        if fnmatch.fnmatch(name, pattern):
+                            yield os.path.join(root, name)
+            elif os.path.isfile(match):
+                yield match
+
+
+def _split_ranges(path, split_size):
+    """Byte ranges of roughly split_size; workers align them to line starts."""
+    size = os.path.getsize(path)
+    return [(path, start, min(start + split_size, size)) for start in range(0, max(size, 1), split_size)]
+
+
+def _iter_lines(f, start, end):
+    """Lines whose first byte lies in [start, end), read in BLOCK_SIZE blocks."""
+    if start:
+        f.seek(start - 1)
+        f.readline()  # finish the line the previous range owns
+    pos = f.tell()
+    while pos < end:
+        lines = f.readlines(BLOCK_SIZE)
+        if not lines:
+            break
+        for line in lines:
+            if pos >= end:
+                return
+            pos += len(line)
+            yield line
+
+
+def _count_range(path, start, end, model, text_field):
+    """Worker: count tokens in one byte range of a file. Returns (path, tokens, bytes, records)."""
+    tokens = nbytes = records = 0
+    jsonl = text_field is not None and path.endswith((".jsonl", ".ndjson"))
+    sep = b"\n" if jsonl else b""  # raw lines keep their own newline; extracted fields must not run together
+    with open(path, "rb") as f:
+        buf = []
+        buf_size = 0
+        for line in _iter_lines(f, start, end):
+            nbytes += len(line)
+            if jsonl:
+                if not line.strip():
+                    continue
+                try:
+                    value = json.loads(line).get(text_field, "")
+                except (ValueError, AttributeError):
+                    continue
+                records += 1
+                line = (value if isinstance(value, str) else json.dumps(value)).encode("utf-8")
+            buf.append(line)
+            buf_size += len(line)
+            if buf_size >= BLOCK_SIZE:
+                tokens += _count_tokens(sep.join(buf).decode("utf-8", errors="replace"), model)
+                buf, buf_size = [], 0
+        if buf:
+            tokens += _count_tokens(sep.join(buf).decode("utf-8", errors="replace"), model)
+    return path, tokens, nbytes, records
+
+
+def estimate_corpus(args):
+    files = list(dict.fromkeys(_iter_files(args.path, args.pattern)))
+    if not files:
+        print(f"{YELLOW}No files matched.{RESET}")
+        return
+    split_size = args.split_mb * 1024 * 1024
+    ranges = [r for path in files for r in _split_ranges(path, split_size)]
+    total_bytes = sum(os.path.getsize(p) for p in files)
+    workers = args.workers or os.cpu_count() or 1
+    print(f"{YELLOW}Tokenising {len(files):,} files ({total_bytes / 1e6:,.1f} MB, {len(ranges):,} ranges) "
+          f"with {workers} workers ...{RESET}")
+    if _encoder(args.model) is None:
+        print(f"{YELLOW}tiktoken not installed; using ~4 chars/token approximation{RESET}")
+
+    per_file = {p: {"tokens": 0, "bytes": 0, "records": 0} for p in files}
+    t0 = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(_count_range, path, start, end, args.model, args.text_field)
+                   for path, start, end in ranges]
+        for future in as_completed(futures):
+            path, tokens, nbytes, records = future.result()
+            stats = per_file[path]
+            stats["tokens"] += tokens
+            stats["bytes"] += nbytes
+            stats["records"] += records
+    elapsed = time.perf_counter() - t0
+
+    per_ext = {}
+    for path, stats in per_file.items():
+        ext = os.path.splitext(path)[1].lower() or "(none)"
+        agg = per_ext.setdefault(ext, {"files": 0, "tokens": 0, "bytes": 0})
+        agg["files"] += 1
+        agg["tokens"] += stats["tokens"]
+        agg["bytes"] += stats["bytes"]
+    total = sum(s["tokens"] for s in per_file.values())
+
+    print(f"\n{GREEN}Top {min(args.top, len(files))} files by tokens ({args.model} tokenizer):{RESET}")
+    for path, stats in sorted(per_file.items(), key=lambda x: x[1]["tokens"], reverse=True)[:args.top]:
+        print(f"  {stats['tokens']:>15,}  {path}")
+    print(f"\n{GREEN}By extension:{RESET}")
+    print(f"  {'Ext':<12} {'Files':>8} {'MB':>10} {'Tokens':>16}")
+    for ext, agg in sorted(per_ext.items(), key=lambda x: x[1]["tokens"], reverse=True):
+        print(f"  {ext:<12} {agg['files']:>8,} {agg['bytes'] / 1e6:>10,.1f} {agg['tokens']:>16,}")
+    print(f"\n{GREEN}Total: {total:,} tokens in {len(files):,} files{RESET}")
+    print(f"  Throughput: {total / max(elapsed, 1e-9):,.0f} tokens/s  "
+          f"({total_bytes / 1e6 / max(elapsed, 1e-9):,.1f} MB/s, {elapsed:.1f}s)")
+    print(f"\n{'Model':<30} {'In $/1M':>10} {'Input cost':>14} {'Output cost':>14}")
+    print("-" * 70)
+    for model, (inp, out) in sorted(PRICING.items(), key=lambda x: x[1][0]):
+        print(f"  {model:<28} ${inp:>9.3f} ${_cost(total, model, 'input'):>13,.2f} "
+              f"${_cost(total, model, 'output'):>13,.2f}")
+
+    if args.output:
+        report = {
+            "tokenizer_model": args.model, "total_tokens": total, "total_bytes": total_bytes,
+            "elapsed_s": elapsed, "tokens_per_s": total / max(elapsed, 1e-9),
+            "files": per_file, "extensions": per_ext,
+            "cost": {m: {"input": _cost(total, m, "input"), "output": _cost(total, m, "output")}
+                     for m in PRICING},
+        }
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\n{GREEN}Report saved to {args.output}{RESET}")
+
+
 def compare_models(args):
     text = args.text
     if args.file:
@@ -103,6 +254,16 @@ def main():
     p_f.add_argument("--file", required=True)
     p_f.add_argument("--model", default="gpt-4o")
 
+    p_k = sub.add_parser("estimate-corpus")
+    p_k.add_argument("--path", nargs="+", required=True, help="Files, directories or glob patterns")
+    p_k.add_argument("--pattern", default="*", help="File name pattern when walking directories")
+    p_k.add_argument("--text-field", default=None, help="Count only this field of .jsonl records")
+    p_k.add_argument("--model", default="gpt-4o", help="Model whose tokenizer is used")
+    p_k.add_argument("--workers", type=int, default=None, help="Processes (default: CPU count)")
+    p_k.add_argument("--split-mb", type=int, default=64, help="Split larger files into ranges of this size")
+    p_k.add_argument("--top", type=int, default=20)
+    p_k.add_argument("--output", default=None, help="Write the full JSON report here")
+
     p_c = sub.add_parser("compare-models")
     g = p_c.add_mutually_exclusive_group(required=True)
     g.add_argument("--text")
@@ -114,6 +275,7 @@ def main():
     dispatch = {
         "estimate": estimate,
         "estimate-file": estimate_file,
+        "estimate-corpus": estimate_corpus,
         "compare-models": compare_models,
         "show-pricing": show_pricing,
     }
@@ -1,6 +1,9 @@
 #!/usr/bin/env python3
 """Tool Use Validator – OC-0123"""
-import argparse, json, os, re, sys
+import argparse, ipaddress, json, os, re, sys, time, uuid
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import date, datetime
 
 RED="\033[91m"; GREEN="\033[92m"; YELLOW="\033[93m"; RESET="\033[0m"
 
@@ -10,33 +13,140 @@ RULES=[
     ("no_extra_fields","No undeclared fields allowed (if strict mode)"),
     ("non_empty_strings","String fields must not be empty"),
     ("valid_enums","Enum fields must use allowed values"),
+    ("nested","properties, items and additionalProperties are checked recursively"),
+    ("bounds","minLength/maxLength, minimum/maximum, minItems/maxItems and pattern"),
+    ("formats","date-time, date, email, uri, uuid, ipv4 and ipv6 formats"),
 ]
 
-def _validate_call(call, schema):
-    errors=[]
-    required=schema.get("required",[])
-    props=schema.get("properties",{})
-    for field in required:
-        if field not in call: errors.append(f"Missing required field: '{field}'")
-    for field, value in call.items():
-        if field in props:
-            expected_type=props[field].get("type")
-            type_map={"string":str,"integer":int,"number":(int,float),"boolean":bool,"array":list,"object":dict}
-            if expected_type and expected_type in type_map:
-                if not isinstance(value, type_map[expected_type]):
-                    errors.append(f"Field '{field}': expected {expected_type}, got {type(value).__name__}")
-            enum_vals=props[field].get("enum")
-            if enum_vals and value not in enum_vals:
-                errors.append(f"Field '{field}': '{value}' not in allowed values {enum_vals}")
-            if isinstance(value,str) and not value.strip():
-                errors.append(f"Field '{field}': empty string not allowed")
-    return errors
+TYPES={"string":(str,),"integer":(int,),"number":(int,float),"boolean":(bool,),"array":(list,),"object":(dict,),"null":(type(None),)}
+EMAIL_RE=re.compile(r"^[^@\s]+@[^@\s]+\.[^@\s]+$")
+URI_RE=re.compile(r"^[a-zA-Z][a-zA-Z0-9+.-]*:\S+$")
+INDEX_RE=re.compile(r"\[\d+\]")
+
+def _is_date_time(v):
+    try: datetime.fromisoformat(v.replace("Z","+00:00")); return "T" in v or " " in v
+    except ValueError: return False
+
+def _is_parsed(parse):
+    def check(v):
+        try: parse(v); return True
+        except ValueError: return False
+    return check
+
+FORMATS={
+    "date-time":_is_date_time,"date":_is_parsed(date.fromisoformat),"email":lambda v:bool(EMAIL_RE.match(v)),
+    "uri":lambda v:bool(URI_RE.match(v)),"uuid":_is_parsed(uuid.UUID),
+    "ipv4":_is_parsed(ipaddress.IPv4Address),"ipv6":_is_parsed(ipaddress.IPv6Address),
+}
+
+def _type_name(v): return "null" if v is None else type(v).__name__
+
+def _hashable(v): return json.dumps(v,sort_keys=True) if isinstance(v,(dict,list)) else (type(v) is bool,v)
+
+def _join(path,key): return f"{path}.{key}" if path else key
+
+def _compile(schema,strict=False):
+    """Compile a JSON schema once into a tree of closures.
+
+    The returned check(value, path, errors) appends (path, rule, message) tuples.
+    Lookups that were per-call work (type tuples, enum sets, regexes, nested
+    validators) are resolved here, so validating a call does no schema walking.
+    """
+    checks=[]
+    types=schema.get("type")
+    if types:
+        names=[types] if isinstance(types,str) else list(types)
+        allowed=tuple(t for n in names for t in TYPES.get(n,()))
+        no_bool="boolean" not in names  # bool is an int subclass but not a JSON integer/number
+        if allowed:
+            label="/".join(names)
+            def check_type(v,path,errors):
+                if not isinstance(v,allowed) or (no_bool and isinstance(v,bool)):
+                    errors.append((path,"type",f"Field '{path}': expected {label}, got {_type_name(v)}")); return False
+                return True
+            checks.append(check_type)
+    if "enum" in schema:
+        values=schema["enum"]; allowed_set=frozenset(_hashable(v) for v in values)
+        str_set=frozenset(v for v in values if isinstance(v,str))
+        def check_enum(v,path,errors):
+            if not (v in str_set if type(v) is str else _hashable(v) in allowed_set): errors.append((path,"enum",f"Field '{path}': '{v}' not in allowed values {values}"))
+            return True
+        checks.append(check_enum)
+    if "const" in schema:
+        const=_hashable(schema["const"])
+        def check_const(v,path,errors):
+            if _hashable(v)!=const: errors.append((path,"const",f"Field '{path}': must equal {schema['const']!r}"))
+            return True
+        checks.append(check_const)
+    str_checks=[]
+    if schema.get("minLength") is not None or schema.get("maxLength") is not None:
+        lo=schema.get("minLength",0); hi=schema.get("maxLength",float("inf"))
+        str_checks.append(lambda v,path,errors: lo<=len(v)<=hi or errors.append((path,"length",f"Field '{path}': length {len(v)} outside [{lo}, {hi}]")))
+    if schema.get("pattern"):
+        rx=re.compile(schema["pattern"])
+        str_checks.append(lambda v,path,errors: rx.search(v) or errors.append((path,"pattern",f"Field '{path}': does not match /{rx.pattern}/")))
+    if schema.get("format") in FORMATS:
+        fmt=schema["format"]; is_fmt=FORMATS[fmt]
+        str_checks.append(lambda v,path,errors: is_fmt(v) or errors.append((path,"format",f"Field '{path}': not a valid {fmt}")))
+    if str_checks:
+        def check_str(v,path,errors):
+            if isinstance(v,str):
+                for c in str_checks: c(v,path,errors)
+            return True
+        checks.append(check_str)
+    if schema.get("minimum") is not None or schema.get("maximum") is not None:
+        lo=schema.get("minimum",float("-inf")); hi=schema.get("maximum",float("inf"))
+        def check_range(v,path,errors):
+            if isinstance(v,(int,float)) and not isinstance(v,bool) and not lo<=v<=hi: errors.append((path,"range",f"Field '{path}': {v} outside [{lo}, {hi}]"))
+            return True
+        checks.append(check_range)
+    props=schema.get("properties")
+    if props is not None or "required" in schema or "additionalProperties" in schema:
+        prop_checks={k:_compile(v,strict) for k,v in (props or {}).items()}
+        required=tuple(schema.get("required",()))
+        extra=schema.get("additionalProperties",not strict)
+        extra_check=_compile(extra,strict) if isinstance(extra,dict) else None
+        def check_object(v,path,errors):
+            if not isinstance(v,dict): return True
+            for field in required:
+                if field not in v: errors.append((_join(path,field),"required",f"Missing required field: '{_join(path,field)}'"))
+            for field,value in v.items():
+                fp=f"{path}.{field}" if path else field; c=prop_checks.get(field)
+                if c is not None:
+                    if type(value) is str and not value.strip(): errors.append((fp,"non_empty",f"Field '{fp}': empty string not allowed"))
+                    c(value,fp,errors)
+                elif extra_check is not None: extra_check(value,fp,errors)
+                elif extra is False: errors.append((fp,"extra_field",f"Undeclared field: '{fp}'"))
+            return True
+        checks.append(check_object)
+    items=schema.get("items")
+    if isinstance(items,dict) or schema.get("minItems") is not None or schema.get("maxItems") is not None:
+        item_check=_compile(items,strict) if isinstance(items,dict) else None
+        lo=schema.get("minItems",0); hi=schema.get("maxItems",float("inf"))
+        def check_array(v,path,errors):
+            if not isinstance(v,list): return True
+            if not lo<=len(v)<=hi: errors.append((path,"length",f"Field '{path}': {len(v)} items outside [{lo}, {hi}]"))
+            if item_check is not None:
+                for i,item in enumerate(v): item_check(item,f"{path}[{i}]",errors)
+            return True
+        checks.append(check_array)
+    if len(checks)==1: return checks[0]
+    def check(v,path,errors):
+        for c in checks:
+            if not c(v,path,errors): return False  # wrong type: skip checks that assume it
+        return True
+    return check
+
+def _validate_call(call, schema, strict=False):
+    """Error messages for one call; compiles the schema, so prefer _compile for repeated use."""
+    errors=[]; _compile(dict(schema,type=schema.get("type","object")),strict)(call,"",errors)
+    return [m for _,_,m in errors]
 
 def validate(args):
     try: call=json.loads(args.tool_call)
     except json.JSONDecodeError as e: print(f"{RED}Invalid JSON: {e}{RESET}"); sys.exit(1)
     with open(args.schema_file) as f: schema=json.load(f)
-    errors=_validate_call(call,schema)
+    errors=_validate_call(call,schema,args.strict)
     if errors:
         print(f"{RED}FAIL — {len(errors)} error(s):{RESET}")
         for e in errors: print(f"  ✗ {e}")
@@ -44,16 +154,114 @@ def validate(args):
     else:
         print(f"{GREEN}PASS — tool call is valid{RESET}")
 
+_WORKER={}
+
+def _load_schemas(schema_file,schema_map,strict):
+    """Compiled validators by tool name ("*" for the fallback --schema-file)."""
+    raw={}
+    if schema_map:
+        if os.path.isdir(schema_map):
+            for name in os.listdir(schema_map):
+                if name.endswith(".json"):
+                    with open(os.path.join(schema_map,name)) as f: raw[name[:-5]]=json.load(f)
+        else:
+            with open(schema_map) as f: raw=json.load(f)
+    if schema_file:
+        with open(schema_file) as f: raw["*"]=json.load(f)
+    return {k:_compile(dict(v,type=v.get("type","object")),strict) for k,v in raw.items()}
+
+def _init_worker(schema_file,schema_map,strict):
+    _WORKER["schemas"]=_load_schemas(schema_file,schema_map,strict)
+
+def _unwrap(rec):
+    """(tool name, arguments) for a logged tool call, accepting OpenAI, Anthropic and bare-argument records."""
+    fn=rec.get("function") if isinstance(rec.get("function"),dict) else None
+    name=(fn or rec).get("name") or rec.get("tool")
+    for key in ("arguments","input","args","parameters"):
+        if key in (fn or rec):
+            args=(fn or rec)[key]
+            if isinstance(args,str): args=json.loads(args)
+            return name,args
+    return name,rec
+
+def _check_record(rec,schemas,hist):
+    """Validate one record into the histogram; returns a list of error messages (empty when valid)."""
+    if len(schemas)==1 and "*" in schemas: name,call=None,rec  # single schema: records are the arguments themselves
+    else:
+        try: name,call=_unwrap(rec)
+        except (ValueError,AttributeError): hist[("?","","invalid_json")]+=1; return ["arguments are not valid JSON"]
+    check=schemas.get(name) or schemas.get("*")
+    if check is None: hist[(name or "?","","no_schema")]+=1; return [f"No schema for tool '{name}'"]
+    errors=[]; check(call,"",errors)
+    for path,rule,_ in errors: hist[(name or "*",INDEX_RE.sub("[]",path) if "[" in path else path,rule)]+=1
+    return [m for _,_,m in errors]
+
+def _validate_range(path,start,end,show):
+    """Worker: validate the JSONL lines starting in [start, end)."""
+    schemas=_WORKER["schemas"]; hist=Counter(); passed=failed=0; samples=[]
+    with open(path,"rb") as f:
+        if start:
+            f.seek(start-1); f.readline()
+        pos=f.tell()
+        while pos<end:
+            line=f.readline()
+            if not line: break
+            offset=pos; pos+=len(line)
+            if not line.strip(): continue
+            try: rec=json.loads(line)
+            except ValueError: errors=["line is not valid JSON"]; hist[("?","","invalid_json")]+=1
+            else: errors=_check_record(rec,schemas,hist) if isinstance(rec,dict) else ["record is not an object"]
+            if errors:
+                failed+=1
+                if len(samples)<show: samples.append((offset,errors))
+            else: passed+=1
+    return passed,failed,hist,samples
+
+def _first_line_is_json(path):
+    """True when the first non-blank line parses on its own, i.e. the file holds one object per line."""
+    with open(path,"rb") as f:
+        for line in f:
+            if line.strip():
+                try: json.loads(line); return True
+                except ValueError: return False
+    return False
+
 def validate_file(args):
-    with open(args.file) as f: calls=json.load(f)
-    with open(args.schema_file) as f: schema=json.load(f)
-    if not isinstance(calls,list): calls=[calls]
-    passed=failed=0
-    for i,call in enumerate(calls):
-        errors=_validate_call(call,schema)
-        if errors: failed+=1; print(f"  {RED}[{i}] FAIL:{RESET} {errors[0]}")
-        else: passed+=1; print(f"  {GREEN}[{i}] PASS{RESET}")
-    print(f"\n{GREEN}{passed} passed{RESET}, {RED if failed else GREEN}{failed} failed{RESET}")
+    if not args.schema_file and not args.schema_map: print(f"{RED}Give --schema-file and/or --schema-map{RESET}"); sys.exit(1)
+    with open(args.file,"rb") as f: head=f.read(4096).lstrip()
+    calls=None
+    if head.startswith(b"["):
+        # Small JSON array: per-call report as before.
+        with open(args.file) as f: calls=json.load(f)
+    elif head.startswith(b"{") and not _first_line_is_json(args.file):
+        # A single (pretty-printed) call object rather than JSONL.
+        try:
+            with open(args.file) as f: calls=[json.load(f)]
+        except ValueError: pass  # not one document either; the JSONL pass reports the bad lines
+    if calls is not None:
+        schemas=_load_schemas(args.schema_file,args.schema_map,args.strict); hist=Counter()
+        passed=failed=0
+        for i,call in enumerate(calls):
+            errors=_check_record(call,schemas,hist)
+            if errors: failed+=1; print(f"  {RED}[{i}] FAIL:{RESET} {errors[0]}")
+            else: passed+=1; print(f"  {GREEN}[{i}] PASS{RESET}")
+        print(f"\n{GREEN}{passed} passed{RESET}, {RED if failed else GREEN}{failed} failed{RESET}")
+        return
+    size=os.path.getsize(args.file); split=args.chunk_mb*1024*1024
+    ranges=[(s,min(s+split,size)) for s in range(0,max(size,1),split)]
+    workers=args.workers or os.cpu_count() or 1
+    t0=time.perf_counter(); passed=failed=0; hist=Counter(); samples=[]
+    with ProcessPoolExecutor(max_workers=workers,initializer=_init_worker,initargs=(args.schema_file,args.schema_map,args.strict)) as pool:
+        for fut in as_completed([pool.submit(_validate_range,args.file,s,e,args.show) for s,e in ranges]):
+            p,fl,h,sm=fut.result(); passed+=p; failed+=fl; hist.update(h); samples.extend(sm)
+    el=time.perf_counter()-t0; total=passed+failed
+    for offset,errors in sorted(samples)[:args.show]: print(f"  {RED}[byte {offset}] FAIL:{RESET} {errors[0]}"+(f" (+{len(errors)-1} more)" if len(errors)>1 else ""))
+    if hist:
+        print(f"\n{YELLOW}Error histogram:{RESET}")
+        print(f"  {'Count':>10}  {'Tool':<24} {'Rule':<12} Path")
+        for (tool,path,rule),n in hist.most_common(args.top): print(f"  {n:>10,}  {tool[:24]:<24} {rule:<12} {path or '-'}")
+    print(f"\n{GREEN}{passed:,} passed{RESET}, {RED if failed else GREEN}{failed:,} failed{RESET}  ({total:,} calls in {el:.1f}s, {total/max(el,1e-9):,.0f} calls/s, {workers} workers)")
+    if failed and args.fail: sys.exit(1)
 
 def generate_schema(args):
     with open(args.example_call_file) as f: example=json.load(f)
@@ -71,8 +279,11 @@ def list_rules(args):
 def main():
     p=argparse.ArgumentParser(description="Tool Use Validator")
     s=p.add_subparsers(dest="command",required=True)
-    pv=s.add_parser("validate"); pv.add_argument("--tool-call",required=True); pv.add_argument("--schema-file",required=True)
-    pvf=s.add_parser("validate-file"); pvf.add_argument("--file",required=True); pvf.add_argument("--schema-file",required=True)
+    pv=s.add_parser("validate"); pv.add_argument("--tool-call",required=True); pv.add_argument("--schema-file",required=True); pv.add_argument("--strict",action="store_true",help="Reject undeclared fields")
+    pvf=s.add_parser("validate-file"); pvf.add_argument("--file",required=True,help="JSONL of tool calls (or a JSON array)"); pvf.add_argument("--schema-file",default=None,help="Schema for calls without a per-tool schema")
+    pvf.add_argument("--schema-map",default=None,help="JSON {tool: schema} or a directory of <tool>.json schemas"); pvf.add_argument("--strict",action="store_true",help="Reject undeclared fields")
+    pvf.add_argument("--workers",type=int,default=None); pvf.add_argument("--chunk-mb",type=int,default=16); pvf.add_argument("--show",type=int,default=20,help="Failing calls to print"); pvf.add_argument("--top",type=int,default=30,help="Histogram rows")
+    pvf.add_argument("--fail",action="store_true",help="Exit non-zero if any call fails")
     pg=s.add_parser("generate-schema"); pg.add_argument("--tool-name",required=True); pg.add_argument("--example-call-file",required=True)
     s.add_parser("list-rules")
     args=p.parse_args()
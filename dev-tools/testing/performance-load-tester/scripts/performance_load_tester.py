@@ -4,17 +4,28 @@ Performance Load Tester — OC-0184
 Run skills in parallel to test concurrency and resource usage bounds.
 """
 
+import io
 import os
 import sys
 import json
+import math
 import time
+import random
 import shlex
+import fnmatch
 import argparse
+import threading
+import importlib.util
 import statistics
 import subprocess
 import datetime
 from pathlib import Path
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
 
 RED    = "\033[91m"
 GREEN  = "\033[92m"
@@ -23,12 +34,104 @@ CYAN   = "\033[96m"
 BOLD   = "\033[1m"
 RESET  = "\033[0m"
 
+MODES = ("subprocess", "forkserver", "inproc")
+PROFILES = ("constant", "step", "linear", "spike")
+METRICS = {"latency": "latency_ms", "rss": "rss_mb", "cpu": "cpu_ms"}
+RSS_DIVISOR = 1024 * 1024 if sys.platform == "darwin" else 1024  # ru_maxrss is bytes on macOS, KiB on Linux
+SUB_BUCKET_BITS = 7
+SUB_BUCKETS = 1 << SUB_BUCKET_BITS
+
+
+class _Histogram:
+    """Log-bucketed latency histogram in microseconds, HDR-style: 128 linear sub-buckets per
+    power of two keep every recorded value within 1% while memory stays a few hundred buckets."""
+
+    def __init__(self):
+        self.counts = {}
+        self.count = 0
+        self.sum = 0
+        self.min = None
+        self.max = 0
+
+    @staticmethod
+    def _index(us: int) -> int:
+        if us < SUB_BUCKETS:
+            return us
+        shift = us.bit_length() - SUB_BUCKET_BITS - 1
+        return ((shift + 1) << SUB_BUCKET_BITS) + (us >> shift) - SUB_BUCKETS
+
+    @staticmethod
+    def _value(index: int) -> int:
+        """Midpoint of a bucket."""
+        if index < SUB_BUCKETS:
+            return index
+        shift = (index >> SUB_BUCKET_BITS) - 1
+        return (((index & (SUB_BUCKETS - 1)) + SUB_BUCKETS) << shift) + ((1 << shift) - 1) // 2
+
+    def record(self, seconds: float):
+        us = max(int(seconds * 1_000_000), 0)
+        index = self._index(us)
+        self.counts[index] = self.counts.get(index, 0) + 1
+        self.count += 1
+        self.sum += us
+        self.min = us if self.min is None else min(self.min, us)
+        self.max = max(self.max, us)
+
+    def merge(self, other: "_Histogram"):
+        for index, n in other.counts.items():
+            self.counts[index] = self.counts.get(index, 0) + n
+        self.count += other.count
+        self.sum += other.sum
+        if other.min is not None:
+            self.min = other.min if self.min is None else min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        return self
+
+    def percentile(self, pct: float) -> float:
+        """Value at or below which pct% of recordings fall, in seconds."""
+        if not self.count:
+            return 0.0
+        target = max(1, -(-self.count * pct // 100))
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= target:
+                return min(max(self._value(index), self.min), self.max) / 1_000_000
+        return self.max / 1_000_000
+
+    def summary(self) -> dict:
+        ms = lambda us: round(us / 1000, 1)
+        return {
+            "min_ms":   ms(self.min or 0),
+            "max_ms":   ms(self.max),
+            "mean_ms":  ms(self.sum / self.count) if self.count else 0.0,
+            "p50_ms":   ms(self.percentile(50) * 1_000_000),
+            "p90_ms":   ms(self.percentile(90) * 1_000_000),
+            "p95_ms":   ms(self.percentile(95) * 1_000_000),
+            "p99_ms":   ms(self.percentile(99) * 1_000_000),
+            "p999_ms":  ms(self.percentile(99.9) * 1_000_000),
+        }
+
+    def to_dict(self) -> dict:
+        return {"unit": "us", "sub_bucket_bits": SUB_BUCKET_BITS, "count": self.count, "sum": self.sum,
+                "min": self.min, "max": self.max, "counts": sorted(self.counts.items())}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "_Histogram":
+        if data.get("sub_bucket_bits", SUB_BUCKET_BITS) != SUB_BUCKET_BITS:
+            raise ValueError("histogram was written with a different bucket layout")
+        h = cls()
+        h.counts = {int(i): int(n) for i, n in data["counts"]}
+        h.count, h.sum, h.min, h.max = data["count"], data["sum"], data["min"], data["max"]
+        return h
+
 
 def _skills_root() -> Path:
     script = Path(__file__).resolve()
-    root = script.parent.parent.parent.parent
-    if (root / "IDEAS.md").exists():
-        return root
+    root = script.parents[4]
+    for parent in script.parents:
+        if (parent / "IDEAS.md").exists():
+            return parent
     cwd = Path.cwd()
     while cwd != cwd.parent:
         if (cwd / "IDEAS.md").exists():
@@ -51,12 +154,18 @@ def _find_script(skill_name: str) -> Path:
     return scripts[0]
 
 
+def _usage(ru) -> dict:
+    return {"rss_mb": ru.ru_maxrss / RSS_DIVISOR, "user_s": ru.ru_utime, "sys_s": ru.ru_stime}
+
+
 def _execute_once(script: Path, cmd_args: list, timeout: int = 30) -> dict:
+    if hasattr(os, "wait4"):
+        return _execute_waited(script, cmd_args, timeout)
     start = time.perf_counter()
     try:
         result = subprocess.run(
             [sys.executable, str(script)] + cmd_args,
-            capture_output=True, text=True, timeout=timeout
+            capture_output=True, text=True, timeout=timeout, stdin=subprocess.DEVNULL
         )
         elapsed = time.perf_counter() - start
         return {
@@ -73,23 +182,293 @@ def _execute_once(script: Path, cmd_args: list, timeout: int = 30) -> dict:
         return {"success": False, "exit_code": -1, "duration": elapsed, "timed_out": False, "error": str(e)}
 
 
-def _run_load(script: Path, cmd_args: list, workers: int, iterations: int, timeout: int = 30) -> dict:
+def _execute_waited(script: Path, cmd_args: list, timeout: int) -> dict:
+    """Run the script in a fresh interpreter and reap it with wait4(), which returns that child's
+    own rusage (peak RSS, user and system CPU) even while other iterations run concurrently."""
+    start = time.perf_counter()
+    try:
+        proc = subprocess.Popen([sys.executable, str(script)] + cmd_args, stdin=subprocess.DEVNULL,
+                                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    except Exception as e:
+        elapsed = time.perf_counter() - start
+        return {"success": False, "exit_code": -1, "duration": elapsed, "timed_out": False, "error": str(e)}
+    killed = threading.Event()
+    timer = threading.Timer(timeout, lambda: (killed.set(), proc.kill()))
+    timer.start()
+    try:
+        _, status, ru = os.wait4(proc.pid, 0)
+    finally:
+        timer.cancel()
+    elapsed = time.perf_counter() - start
+    proc.returncode = code = os.waitstatus_to_exitcode(status)
+    if killed.is_set():
+        return {"success": False, "exit_code": -1, "duration": elapsed, "timed_out": True, **_usage(ru)}
+    return {"success": code == 0, "exit_code": code, "duration": elapsed, "timed_out": False, **_usage(ru)}
+
+
+def _load_module(script: Path):
+    """Import a skill script as a module (its __main__ guard keeps main() from running); returns (module, seconds)."""
+    if str(script.parent) not in sys.path:
+        sys.path.insert(0, str(script.parent))
+    start = time.perf_counter()
+    spec = importlib.util.spec_from_file_location(f"_skill_{script.stem}", script)
+    module = importlib.util.module_from_spec(spec)
+    try:
+        spec.loader.exec_module(module)
+    except SystemExit as e:
+        print(f"{RED}Importing {script.name} exited with status {e.code}; use --mode subprocess.{RESET}")
+        sys.exit(1)
+    elapsed = time.perf_counter() - start
+    if not callable(getattr(module, "main", None)):
+        print(f"{RED}{script.name} has no main() function; use --mode subprocess.{RESET}")
+        sys.exit(1)
+    return module, elapsed
+
+
+def _cold_start(script: Path, samples: int = 5) -> float:
+    """Median time for a fresh interpreter to start and import the script without running main()."""
+    probe = ("import importlib.util, sys; sys.path.insert(0, sys.argv[2]); "
+             "spec = importlib.util.spec_from_file_location('_probe', sys.argv[1]); "
+             "spec.loader.exec_module(importlib.util.module_from_spec(spec))")
+    times = []
+    for _ in range(samples):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", probe, str(script), str(script.parent)],
+                       capture_output=True, stdin=subprocess.DEVNULL)
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+
+def _exit_code(e: SystemExit) -> int:
+    if e.code is None:
+        return 0
+    return e.code if isinstance(e.code, int) else 1
+
+
+def _fork_child(module, argv: list):
+    """Body of a forked worker: silence the inherited descriptors, run main() and exit with its status."""
+    code = 1
+    try:
+        devnull = os.open(os.devnull, os.O_RDWR)
+        for fd in (0, 1, 2):
+            os.dup2(devnull, fd)
+        sys.stdin, sys.stdout, sys.stderr = io.StringIO(), io.StringIO(), io.StringIO()
+        sys.argv = argv
+        try:
+            module.main()
+            code = 0
+        except SystemExit as e:
+            code = _exit_code(e)
+    finally:
+        os._exit(code)
+
+
+def _run_forked(module, script: Path, cmd_args: list, workers: int, iterations: int, timeout: int,
+                schedule: list = None) -> list:
+    """Fork one child per iteration from this already-warm process, keeping at most `workers` alive.
+
+    Runs single-threaded so forking never races another thread's locks. Each
+    iteration is timed until its child is reaped, from fork() or, with a
+    schedule, from its intended start so time spent waiting for a free worker counts.
+    """
+    argv = [str(script)] + cmd_args
+    running = {}
     results = []
-    wall_start = time.perf_counter()
+    launched = 0
+    t0 = time.perf_counter()
+    sys.stdout.flush()
+    sys.stderr.flush()
+    while launched < iterations or running:
+        while launched < iterations and len(running) < workers:
+            now = time.perf_counter()
+            if schedule is not None and now < t0 + schedule[launched]:
+                break
+            start = t0 + schedule[launched] if schedule is not None else now
+            pid = os.fork()
+            if pid == 0:
+                _fork_child(module, argv)
+            running[pid] = (start, time.perf_counter())
+            launched += 1
+        pid, status, ru = os.wait4(-1, os.WNOHANG) if running else (0, 0, None)
+        now = time.perf_counter()
+        if pid:
+            code = os.waitstatus_to_exitcode(status)
+            start, forked = running.pop(pid)
+            results.append({"success": code == 0, "exit_code": code, "duration": now - start,
+                            "service": now - forked, "t": start - t0, "timed_out": False, **_usage(ru)})
+            continue
+        for pid, (start, forked) in list(running.items()):
+            if now - forked > timeout:
+                os.kill(pid, 9)
+                _, _, ru = os.wait4(pid, 0)
+                running.pop(pid)
+                results.append({"success": False, "exit_code": -1, "duration": now - start,
+                                "service": now - forked, "t": start - t0, "timed_out": True, **_usage(ru)})
+        wait = 0.0002
+        if not running and launched < iterations and schedule is not None:
+            wait = max(t0 + schedule[launched] - now, 0)
+        time.sleep(wait)
+    return results
 
-    with ThreadPoolExecutor(max_workers=workers) as pool:
-        futures = [pool.submit(_execute_once, script, cmd_args, timeout) for _ in range(iterations)]
-        for future in as_completed(futures):
-            results.append(future.result())
+
+def _dispatch(pool, fn, iterations: int, schedule: list = None, timeout: float = None, workers: int = 1) -> list:
+    """Submit fn `iterations` times. Closed loop queues everything at once; with a schedule each
+    call is submitted at its intended offset and its latency runs from that instant. A timeout
+    is only passed for inproc calls, which cannot be killed; see _collect."""
+    if schedule is None:
+        futures = [pool.submit(fn) for _ in range(iterations)]
+        if timeout is None:
+            return [f.result() for f in as_completed(futures)]
+        return _collect(futures, timeout, workers)
+    t0 = time.perf_counter()
+    futures = []
+    for offset in schedule:
+        delay = t0 + offset - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        futures.append(pool.submit(_timed, fn, t0, offset))
+    if timeout is None:
+        return [f.result() for f in futures]
+    return _collect(futures, timeout, workers, t0, schedule)
+
+
+def _collect(futures: list, timeout: float, workers: int, t0: float = None, schedule: list = None) -> list:
+    """Gather results, recording a call still running `timeout` seconds after it started as timed out.
+
+    The stuck thread is abandoned and keeps its worker; once every worker is stuck, calls that
+    never started are cancelled and recorded as timeouts too. Start times are observed by polling,
+    so a timeout fires up to one poll interval late.
+    """
+    results = [None] * len(futures)
+    started = {}
+    pending = set(range(len(futures)))
+    stuck = 0
+    while pending:
+        wait([futures[i] for i in pending], timeout=0.05, return_when=FIRST_COMPLETED)
+        now = time.perf_counter()
+        for i in sorted(pending):
+            f = futures[i]
+            if f.done():
+                results[i] = f.result()
+            elif f.running():
+                started.setdefault(i, now)
+                if now - started[i] <= timeout:
+                    continue
+                stuck += 1
+                results[i] = {"success": False, "exit_code": -1, "duration": timeout, "service": timeout,
+                              "timed_out": True, "error": f"main() still running after {timeout}s (thread abandoned)"}
+            elif stuck >= workers and f.cancel():
+                results[i] = {"success": False, "exit_code": -1, "duration": 0.0, "service": 0.0,
+                              "timed_out": True, "error": "never started: every worker was stuck"}
+            else:
+                continue
+            if schedule is not None and "t" not in results[i]:
+                results[i].update({"duration": now - (t0 + schedule[i]), "t": schedule[i]})
+            pending.discard(i)
+    return results
+
+
+def _timed(fn, t0: float, offset: float) -> dict:
+    result = fn()
+    result["service"] = result["duration"]
+    result["duration"] = time.perf_counter() - (t0 + offset)
+    result["t"] = offset
+    return result
+
+
+class _ThreadOutput(io.TextIOBase):
+    """Stand-in for sys.stdout/stderr that buffers writes per thread."""
+
+    def __init__(self):
+        self._local = threading.local()
+
+    def write(self, text):
+        buf = getattr(self._local, "buf", None)
+        if buf is None:
+            buf = self._local.buf = io.StringIO()
+        return buf.write(text)
+
+    def take(self) -> str:
+        buf = getattr(self._local, "buf", None)
+        self._local.buf = None
+        return buf.getvalue() if buf else ""
+
+
+def _call_inproc(module, output: _ThreadOutput) -> dict:
+    """Call main() once on this thread. CPU comes from RUSAGE_THREAD where available; memory is
+    shared with the whole process, so no per-iteration RSS is recorded."""
+    per_thread = resource is not None and hasattr(resource, "RUSAGE_THREAD")
+    before = resource.getrusage(resource.RUSAGE_THREAD) if per_thread else None
+    start = time.perf_counter()
+    code = 1
+    error = None
+    try:
+        module.main()
+        code = 0
+    except SystemExit as e:
+        code = _exit_code(e)
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+    elapsed = time.perf_counter() - start
+    output.take()
+    result = {"success": code == 0, "exit_code": code, "duration": elapsed, "timed_out": False}
+    if per_thread:
+        after = resource.getrusage(resource.RUSAGE_THREAD)
+        result.update({"user_s": after.ru_utime - before.ru_utime, "sys_s": after.ru_stime - before.ru_stime})
+    if error:
+        result["error"] = error
+    return result
+
+
+def _run_inproc(module, script: Path, cmd_args: list, workers: int, iterations: int, timeout: int,
+                schedule: list = None) -> list:
+    """Call main() on worker threads of this process. sys.argv is shared, which is fine since every
+    iteration uses the same arguments, and output goes to per-thread buffers. Threads cannot be
+    killed, so a call that overruns `timeout` is recorded as timed out and left running."""
+    saved = sys.argv, sys.stdout, sys.stderr, sys.stdin
+    output = _ThreadOutput()
+    sys.argv = [str(script)] + cmd_args
+    sys.stdout = sys.stderr = output
+    sys.stdin = io.StringIO()
+    pool = ThreadPoolExecutor(max_workers=workers)
+    try:
+        return _dispatch(pool, lambda: _call_inproc(module, output), iterations, schedule, timeout, workers)
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+        sys.argv, sys.stdout, sys.stderr, sys.stdin = saved
+
+
+def _run_load(script: Path, cmd_args: list, workers: int, iterations: int, timeout: int = 30,
+              mode: str = "subprocess", module=None, schedule: list = None, window: float = 1.0) -> dict:
+    if schedule is not None:
+        iterations = len(schedule)
+    wall_start = time.perf_counter()
+    if mode == "forkserver":
+        results = _run_forked(module, script, cmd_args, workers, iterations, timeout, schedule)
+    elif mode == "inproc":
+        results = _run_inproc(module, script, cmd_args, workers, iterations, timeout, schedule)
+    else:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            results = _dispatch(pool, lambda: _execute_once(script, cmd_args, timeout), iterations, schedule)
 
     wall_time = time.perf_counter() - wall_start
 
-    durations = [r["duration"] for r in results]
+    histogram = _Histogram()
+    windows = {}
+    for r in results:
+        if schedule is None:
+            histogram.record(r["duration"])
+        else:
+            windows.setdefault(int(r["t"] // window), _Histogram()).record(r["duration"])
+    for h in windows.values():
+        histogram.merge(h)
     successes = sum(1 for r in results if r["success"])
     failures  = len(results) - successes
     timeouts  = sum(1 for r in results if r.get("timed_out"))
+    errors = sorted({r["error"] for r in results if r.get("error")})
 
-    return {
+    summary = {
+        "mode": mode,
         "workers": workers,
         "iterations": iterations,
         "wall_time_s": round(wall_time, 3),
@@ -97,25 +476,96 @@ def _run_load(script: Path, cmd_args: list, workers: int, iterations: int, timeo
         "success": successes,
         "failure": failures,
         "timeouts": timeouts,
-        "latency": {
-            "min_ms":  round(min(durations) * 1000, 1),
-            "max_ms":  round(max(durations) * 1000, 1),
-            "mean_ms": round(statistics.mean(durations) * 1000, 1),
-            "p50_ms":  round(statistics.median(durations) * 1000, 1),
-            "p95_ms":  round(_percentile(durations, 95) * 1000, 1),
-            "p99_ms":  round(_percentile(durations, 99) * 1000, 1),
-        },
+        "latency": histogram.summary(),
+        "histogram": histogram.to_dict(),
+    }
+    if errors:
+        summary["errors"] = errors[:5]
+    samples = {
+        "latency_ms": [round(r["duration"] * 1000, 3) for r in results],
+        "rss_mb": [round(r["rss_mb"], 2) if "rss_mb" in r else None for r in results],
+        "cpu_ms": [round((r["user_s"] + r["sys_s"]) * 1000, 3) if "user_s" in r else None for r in results],
     }
+    resources = {}
+    rss = [v for v in samples["rss_mb"] if v is not None]
+    if rss:
+        resources["rss_mb"] = {"p50": round(statistics.median(rss), 1), "max": round(max(rss), 1)}
+    for key in ("user_s", "sys_s"):
+        cpu = [r[key] * 1000 for r in results if key in r]
+        if cpu:
+            resources[key.replace("_s", "_ms")] = {"p50": round(statistics.median(cpu), 1),
+                                                   "mean": round(statistics.mean(cpu), 1)}
+    if resources:
+        summary["resources"] = resources
+    summary["samples"] = samples
+    if schedule is not None:
+        service = _Histogram()
+        for r in results:
+            service.record(r["service"])
+        summary["service_latency"] = service.summary()
+        summary["windows"] = []
+        for i in sorted(windows):
+            sent = sum(1 for offset in schedule if i * window <= offset < (i + 1) * window)
+            summary["windows"].append({"start_s": round(i * window, 3), "offered_rps": round(sent / window, 2),
+                                       "completed": windows[i].count, **windows[i].summary()})
+    return summary
+
+
+def _schedule(profile: str, rate: float, duration: float) -> list:
+    """Intended start offsets (seconds) for an open-loop run whose arrival rate follows the profile.
 
+    constant: `rate` throughout; step: four equal steps up to `rate`; linear: ramps from
+    10% to 100% of `rate`; spike: 20% of `rate` with a full-rate burst over the middle 10%.
+    The k-th request starts where the integral of the rate reaches k, so every part of the
+    profile gets its share of arrivals even when 1/rate is longer than the part itself.
+    """
+    def rate_at(t):
+        x = t / duration
+        if profile == "step":
+            return rate * (min(int(x * 4), 3) + 1) / 4
+        if profile == "linear":
+            return rate * (0.1 + 0.9 * x)
+        if profile == "spike":
+            return rate if 0.45 <= x < 0.55 else rate * 0.2
+        return rate
 
-def _percentile(data: list, pct: float) -> float:
-    if not data:
-        return 0.0
-    sorted_data = sorted(data)
-    index = (pct / 100) * (len(sorted_data) - 1)
-    lower = int(index)
-    upper = min(lower + 1, len(sorted_data) - 1)
-    return sorted_data[lower] + (index - lower) * (sorted_data[upper] - sorted_data[lower])
+    offsets = []
+    area = 0.0
+    steps = max(10000, int(duration * 100))
+    dt = duration / steps
+    for i in range(steps):
+        t = i * dt
+        step = rate_at(t + dt / 2) * dt
+        while len(offsets) < area + step - 1e-9:
+            offsets.append(round(t + (len(offsets) - area) / step * dt, 9))
+        area += step
+    return offsets
+
+
+def _startup(script: Path, mode: str, iterations: int):
+    """Measure startup cost once per test; returns (module or None, startup dict)."""
+    startup = {"cold_start_ms": round(_cold_start(script, min(5, max(iterations, 1))) * 1000, 1)}
+    module = None
+    if mode != "subprocess":
+        if mode == "forkserver" and not hasattr(os, "fork"):
+            print(f"{RED}--mode forkserver needs os.fork(), which this platform lacks.{RESET}")
+            sys.exit(1)
+        module, elapsed = _load_module(script)
+        startup["import_ms"] = round(elapsed * 1000, 1)
+    return module, startup
+
+
+def _print_startup(startup: dict, results: list):
+    print(f"  Startup:      cold interpreter + imports = {startup['cold_start_ms']} ms per process", end="")
+    if "import_ms" in startup:
+        print(f" (paid once here; in-process import {startup['import_ms']} ms)")
+    else:
+        print()
+    for r in results:
+        p50 = r.get("service_latency", r["latency"])["p50_ms"]
+        execution = p50 if r.get("mode", "subprocess") != "subprocess" else max(p50 - startup["cold_start_ms"], 0)
+        print(f"  Execution:    ~{round(execution, 1)} ms p50 at workers={r['workers']} "
+              f"({'measured directly' if r.get('mode', 'subprocess') != 'subprocess' else 'p50 minus startup'})")
 
 
 def _print_result(r: dict):
@@ -129,26 +579,64 @@ def _print_result(r: dict):
         print(f"  {RED}Failures:{RESET}     {r['failure']}  (timeouts: {r['timeouts']})")
     lat = r["latency"]
     print(f"  Latency (ms): min={lat['min_ms']}  p50={lat['p50_ms']}  p95={lat['p95_ms']}  p99={lat['p99_ms']}  max={lat['max_ms']}")
+    if "service_latency" in r:
+        svc = r["service_latency"]
+        print(f"  Service (ms): p50={svc['p50_ms']}  p99={svc['p99_ms']}  max={svc['max_ms']}  (excludes queueing)")
+    res = r.get("resources", {})
+    if res:
+        parts = []
+        if "rss_mb" in res:
+            parts.append(f"peak RSS p50={res['rss_mb']['p50']} MB max={res['rss_mb']['max']} MB")
+        if "user_ms" in res:
+            parts.append(f"CPU p50 user={res['user_ms']['p50']} ms sys={res['sys_ms']['p50']} ms")
+        print(f"  Resources:    {'  '.join(parts)}")
+    for err in r.get("errors", []):
+        print(f"  {RED}Error:{RESET}        {err}")
+
 
+def _print_windows(r: dict):
+    if not r.get("windows"):
+        return
+    print(f"\n  {BOLD}Latency over time ({r['profile']}, from intended start):{RESET}")
+    print(f"  {'Start s':>8}  {'Offered':>8}  {'Done':>6}  {'p50 ms':>8}  {'p90 ms':>8}  {'p99 ms':>8}  {'p99.9 ms':>9}  {'max ms':>8}")
+    for w in r["windows"]:
+        print(f"  {w['start_s']:>8}  {w['offered_rps']:>8}  {w['completed']:>6}  {w['p50_ms']:>8}  {w['p90_ms']:>8}  "
+              f"{w['p99_ms']:>8}  {w['p999_ms']:>9}  {w['max_ms']:>8}")
 
-def run(skill_name: str, cmd: str, workers: int, iterations: int, output: str = None):
+
+def run(skill_name: str, cmd: str, workers: int, iterations: int, output: str = None,
+        mode: str = "subprocess", timeout: int = 30, rate: float = None, duration: float = 10.0,
+        profile: str = "constant", window: float = 1.0):
     script = _find_script(skill_name)
     cmd_args = shlex.split(cmd) if cmd else []
+    schedule = _schedule(profile, rate, duration) if rate else None
     print(f"\n{BOLD}Load Test — {skill_name}{RESET}")
     print(f"  Script:  {script.name}")
     print(f"  Command: {cmd or '(none)'}")
-    print(f"  Workers: {workers}  Iterations: {iterations}\n")
+    print(f"  Mode:    {mode}")
+    if schedule is not None:
+        print(f"  Open loop: {profile} up to {rate} req/s for {duration}s ({len(schedule)} requests, "
+              f"at most {workers} in flight)\n")
+    else:
+        print(f"  Workers: {workers}  Iterations: {iterations}\n")
     print(f"{YELLOW}Running...{RESET}")
 
-    result = _run_load(script, cmd_args, workers, iterations)
+    module, startup = _startup(script, mode, iterations)
+    result = _run_load(script, cmd_args, workers, iterations, timeout, mode, module, schedule, window)
+    if schedule is not None:
+        result.update({"rate_rps": rate, "duration_s": duration, "profile": profile})
     print()
     _print_result(result)
+    _print_startup(startup, [result])
+    _print_windows(result)
     print()
 
     payload = {
         "skill": skill_name,
         "command": cmd,
+        "mode": mode,
         "timestamp": datetime.datetime.utcnow().isoformat() + "Z",
+        "startup": startup,
         "results": [result],
     }
     out_file = output or "perf_report.json"
@@ -156,20 +644,32 @@ def run(skill_name: str, cmd: str, workers: int, iterations: int, output: str =
     print(f"  Report saved to {out_file}")
 
 
-def benchmark(skill_name: str, cmd: str, levels: str, iterations_per_level: int = 20, output: str = None):
+def benchmark(skill_name: str, cmd: str, levels: str, iterations_per_level: int = 20, output: str = None,
+              mode: str = "subprocess", timeout: int = 30, rate: float = None, duration: float = 10.0,
+              profile: str = "constant", window: float = 1.0):
     script = _find_script(skill_name)
     cmd_args = shlex.split(cmd) if cmd else []
     worker_levels = [int(x.strip()) for x in levels.split(",")]
+    schedule = _schedule(profile, rate, duration) if rate else None
     results = []
 
     print(f"\n{BOLD}Benchmark — {skill_name}{RESET}")
     print(f"  Command:    {cmd or '(none)'}")
+    print(f"  Mode:       {mode}")
     print(f"  Levels:     {worker_levels}")
-    print(f"  Iterations: {iterations_per_level} per level\n")
+    if schedule is not None:
+        print(f"  Open loop:  {profile} up to {rate} req/s for {duration}s ({len(schedule)} requests per level, "
+              f"levels cap requests in flight)\n")
+    else:
+        print(f"  Iterations: {iterations_per_level} per level\n")
 
+    runs = len(schedule) if schedule is not None else iterations_per_level
+    module, startup = _startup(script, mode, runs)
     for w in worker_levels:
-        print(f"  {CYAN}[workers={w}]{RESET} Running {iterations_per_level} iterations...", end=" ", flush=True)
-        r = _run_load(script, cmd_args, w, iterations_per_level)
+        print(f"  {CYAN}[workers={w}]{RESET} Running {runs} iterations...", end=" ", flush=True)
+        r = _run_load(script, cmd_args, w, iterations_per_level, timeout, mode, module, schedule, window)
+        if schedule is not None:
+            r.update({"rate_rps": rate, "duration_s": duration, "profile": profile})
         results.append(r)
         ok = GREEN if r["failure"] == 0 else YELLOW
         print(f"{ok}{r['throughput_rps']} rps{RESET}  p95={r['latency']['p95_ms']}ms  "
@@ -185,11 +685,15 @@ def benchmark(skill_name: str, cmd: str, levels: str, iterations_per_level: int
               f"{lat['p95_ms']:>8}  {lat['p99_ms']:>8}  "
               f"{fail_color}{r['failure']:>8}{RESET}")
     print()
+    _print_startup(startup, results)
+    print()
 
     payload = {
         "skill": skill_name,
         "command": cmd,
+        "mode": mode,
         "timestamp": datetime.datetime.utcnow().isoformat() + "Z",
+        "startup": startup,
         "results": results,
     }
     out_file = output or "perf_report.json"
@@ -197,7 +701,17 @@ def benchmark(skill_name: str, cmd: str, levels: str, iterations_per_level: int
     print(f"  Report saved to {out_file}")
 
 
-def report(file: str = "perf_report.json"):
+def report(files: list):
+    merged = _Histogram()
+    for file in files:
+        _report_one(file, merged)
+    if len(files) > 1 and merged.count:
+        lat = merged.summary()
+        print(f"  {BOLD}Merged latency over {len(files)} reports ({merged.count} requests):{RESET}")
+        print(f"  p50={lat['p50_ms']}  p90={lat['p90_ms']}  p99={lat['p99_ms']}  p99.9={lat['p999_ms']}  max={lat['max_ms']} ms\n")
+
+
+def _report_one(file: str, merged: _Histogram):
     p = Path(file)
     if not p.exists():
         print(f"{RED}Report file not found: {file}{RESET}")
@@ -205,19 +719,324 @@ def report(file: str = "perf_report.json"):
     data = json.loads(p.read_text(encoding="utf-8"))
     print(f"\n{BOLD}Performance Report — {data['skill']}{RESET}")
     print(f"  Timestamp: {data['timestamp']}")
-    print(f"  Command:   {data.get('command', 'N/A')}\n")
+    print(f"  Command:   {data.get('command', 'N/A')}")
+    print(f"  Mode:      {data.get('mode', 'subprocess')}\n")
     for r in data["results"]:
         print(f"  {CYAN}[workers={r['workers']}]{RESET}")
         _print_result(r)
+        _print_windows(r)
+        print()
+        if "histogram" in r:
+            merged.merge(_Histogram.from_dict(r["histogram"]))
+    if "startup" in data:
+        _print_startup(data["startup"], data["results"])
         print()
 
 
+def _mann_whitney(a: list, b: list) -> float:
+    """One-sided Mann-Whitney U test that values in b tend to exceed those in a.
+
+    Normal approximation with tie and continuity correction; returns the p-value.
+    """
+    n1, n2 = len(a), len(b)
+    combined = sorted([(v, 0) for v in a] + [(v, 1) for v in b])
+    rank_b = 0.0
+    ties = 0.0
+    i = 0
+    while i < len(combined):
+        j = i
+        while j < len(combined) and combined[j][0] == combined[i][0]:
+            j += 1
+        avg_rank = (i + j + 1) / 2
+        rank_b += avg_rank * sum(1 for k in range(i, j) if combined[k][1])
+        ties += (j - i) ** 3 - (j - i)
+        i = j
+    n = n1 + n2
+    u = rank_b - n2 * (n2 + 1) / 2
+    sigma = math.sqrt(n1 * n2 / 12 * ((n + 1) - ties / (n * (n - 1))))
+    if sigma == 0:
+        return 1.0
+    z = (u - n1 * n2 / 2 - 0.5) / sigma
+    return 0.5 * math.erfc(z / math.sqrt(2))
+
+
+def _bootstrap_ci(a: list, b: list, resamples: int = 2000, seed: int = 0) -> tuple:
+    """95% bootstrap interval for the relative change in median from a to b."""
+    rng = random.Random(seed)
+    changes = []
+    for _ in range(resamples):
+        ma = statistics.median(rng.choices(a, k=len(a)))
+        mb = statistics.median(rng.choices(b, k=len(b)))
+        changes.append((mb - ma) / ma if ma else 0.0)
+    changes.sort()
+    return changes[int(resamples * 0.025)], changes[int(resamples * 0.975) - 1]
+
+
+def _load_key(r: dict) -> tuple:
+    """The load a result block ran under: worker count plus closed loop or the open-loop timetable."""
+    return r.get("workers"), r.get("profile", "closed"), r.get("rate_rps"), r.get("duration_s")
+
+
+def _describe_load(r: dict) -> str:
+    workers, profile, rate, duration = _load_key(r)
+    if profile == "closed":
+        return f"workers={workers}, closed loop"
+    return f"workers={workers}, {profile} up to {rate} req/s for {duration}s"
+
+
+def _pair_results(base: list, cur: list) -> list:
+    """Line up result blocks that ran under the same load; blocks without a match are reported and skipped."""
+    by_key = {}
+    for r in base:
+        by_key.setdefault(_load_key(r), r)
+    pairs = []
+    for r in cur:
+        match = by_key.get(_load_key(r))
+        if match is None:
+            print(f"  {YELLOW}No baseline block with {_describe_load(r)}; skipped{RESET}")
+        else:
+            pairs.append((match, r))
+    return pairs
+
+
+def compare(baseline: str, current: str, metrics: str = "latency,rss", threshold: float = 10.0,
+            alpha: float = 0.05, resamples: int = 2000):
+    reports = []
+    for file in (baseline, current):
+        p = Path(file)
+        if not p.exists():
+            print(f"{RED}Report file not found: {file}{RESET}")
+            sys.exit(1)
+        reports.append(json.loads(p.read_text(encoding="utf-8")))
+    names = [m.strip() for m in metrics.split(",") if m.strip()]
+    unknown = [m for m in names if m not in METRICS]
+    if unknown:
+        print(f"{RED}Unknown metric(s): {', '.join(unknown)} (choose from {', '.join(METRICS)}){RESET}")
+        sys.exit(1)
+
+    modes = [r.get("mode", "subprocess") for r in reports]
+    if modes[0] != modes[1]:
+        print(f"{RED}Reports were run with different --mode ({modes[0]} vs {modes[1]}); their latencies are not comparable.{RESET}")
+        sys.exit(1)
+
+    print(f"\n{BOLD}Regression check — {reports[1].get('skill', '?')}{RESET}")
+    print(f"  Baseline:  {baseline} ({reports[0].get('timestamp', '?')})")
+    print(f"  Current:   {current} ({reports[1].get('timestamp', '?')})")
+    print(f"  Threshold: +{threshold}% on the median, significant at p < {alpha} (Mann-Whitney U)\n")
+    pairs = _pair_results(reports[0]["results"], reports[1]["results"])
+    if not pairs:
+        print(f"{RED}No result blocks ran under the same load (workers, closed/open loop, profile, rate and duration).{RESET}")
+        sys.exit(1)
+    print(f"  {'Metric':<11} {'Workers':>7}  {'Base p50':>9}  {'Cur p50':>9}  {'Change':>8}  {'95% CI':>17}  {'p':>7}  Verdict")
+
+    regressions = 0
+    compared = 0
+    for base, cur in pairs:
+        for name in names:
+            key = METRICS[name]
+            a = [v for v in base.get("samples", {}).get(key, []) if v is not None]
+            b = [v for v in cur.get("samples", {}).get(key, []) if v is not None]
+            if len(a) < 2 or len(b) < 2:
+                print(f"  {name:<11} {cur.get('workers', '-'):>7}  {YELLOW}not enough samples in one of the reports{RESET}")
+                continue
+            compared += 1
+            ma, mb = statistics.median(a), statistics.median(b)
+            change = (mb - ma) / ma * 100 if ma else 0.0
+            lo, hi = _bootstrap_ci(a, b, resamples)
+            p_worse = _mann_whitney(a, b)
+            p_better = _mann_whitney(b, a)
+            if change > threshold and p_worse < alpha:
+                verdict = f"{RED}REGRESSION{RESET}"
+                regressions += 1
+            elif change < -threshold and p_better < alpha:
+                verdict = f"{GREEN}improved{RESET}"
+            else:
+                verdict = "ok"
+            p_shown = p_worse if change >= 0 else p_better
+            print(f"  {name:<11} {cur.get('workers', '-'):>7}  {ma:>9.1f}  {mb:>9.1f}  {change:>+7.1f}%  "
+                  f"{f'[{lo * 100:+.1f}%, {hi * 100:+.1f}%]':>17}  {p_shown:>7.4f}  {verdict}")
+
+    print()
+    if regressions:
+        print(f"{RED}{regressions} regression(s) past +{threshold}%.{RESET}")
+        sys.exit(1)
+    if not compared:
+        print(f"{YELLOW}Nothing to compare; re-run both reports with this version to record samples.{RESET}")
+        sys.exit(1)
+    print(f"{GREEN}No regressions past +{threshold}%.{RESET}")
+
+
+def _discover_scripts(pattern: str = "*") -> dict:
+    """Map skill name -> script for every <skill>/scripts/*.py under the skills root."""
+    root = _skills_root()
+    found = {}
+    for script in sorted(root.rglob("scripts/*.py")):
+        rel = script.relative_to(root).parts
+        if any(part.startswith(".") or part in ("website", "node_modules") for part in rel):
+            continue
+        skill = script.parent.parent.name
+        if not fnmatch.fnmatch(skill, pattern):
+            continue
+        name = skill if skill not in found else f"{skill}/{script.stem}"
+        found[name] = script
+    return found
+
+
+def _importtime_run(argv: list, timeout: int) -> dict:
+    """Run python -X importtime once; returns wall time, exit code and the top-level import tree."""
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE="1")
+    start = time.perf_counter()
+    try:
+        proc = subprocess.run([sys.executable, "-X", "importtime"] + argv, stdin=subprocess.DEVNULL,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True,
+                              timeout=timeout, env=env)
+    except subprocess.TimeoutExpired:
+        return {"wall_ms": timeout * 1000.0, "exit_code": -1, "modules": {}}
+    wall = (time.perf_counter() - start) * 1000
+    modules = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|", 2)
+        if name.startswith("  "):
+            continue  # nested import, already counted in its parent's cumulative time
+        modules[name.strip()] = int(cumulative) / 1000
+    return {"wall_ms": wall, "exit_code": proc.returncode, "modules": modules}
+
+
+def _aggregate(runs: list, floor_modules: set) -> dict:
+    """Median wall time and per-module import cost over repeated runs, excluding modules the bare interpreter already loads."""
+    modules = {}
+    for r in runs:
+        for name, ms in r["modules"].items():
+            if name not in floor_modules:
+                modules.setdefault(name, []).append(ms)
+    modules = {name: round(statistics.median(v), 2) for name, v in modules.items()}
+    imports = [sum(ms for name, ms in r["modules"].items() if name not in floor_modules) for r in runs]
+    heaviest = max(modules, key=modules.get) if modules else None
+    return {
+        "wall_ms": round(statistics.median(r["wall_ms"] for r in runs), 1),
+        "import_ms": round(statistics.median(imports), 1),
+        "heaviest": heaviest,
+        "heaviest_ms": modules.get(heaviest, 0.0),
+        "exit_code": max((r["exit_code"] for r in runs), key=abs),
+        "modules": dict(sorted(modules.items(), key=lambda kv: -kv[1])),
+    }
+
+
+def _import_diff(baseline: dict, current: dict, threshold: float, min_ms: float) -> int:
+    """Print per-skill changes against a saved baseline; returns the number of flagged regressions."""
+    flagged = 0
+    print(f"\n{BOLD}Changes against baseline (flagged: import time +{threshold}% and +{min_ms} ms, "
+          f"or a new top-level import of {min_ms} ms or more):{RESET}")
+    for skill in sorted(set(baseline) | set(current)):
+        if skill not in baseline:
+            print(f"  {CYAN}{skill}{RESET}: new skill, imports {current[skill]['import_ms']} ms")
+            continue
+        if skill not in current:
+            print(f"  {CYAN}{skill}{RESET}: no longer present")
+            continue
+        old, new = baseline[skill], current[skill]
+        delta = new["import_ms"] - old["import_ms"]
+        pct = delta / old["import_ms"] * 100 if old["import_ms"] else (100.0 if delta > 0 else 0.0)
+        added = [(name, ms) for name, ms in new["modules"].items() if name not in old["modules"] and ms >= min_ms]
+        dropped = [name for name, ms in old["modules"].items() if name not in new["modules"] and ms >= min_ms]
+        slower = delta >= min_ms and pct > threshold
+        if not (slower or added or dropped or (delta <= -min_ms and pct < -threshold)):
+            continue
+        color = RED if slower or added else GREEN
+        print(f"  {color}{skill}{RESET}: imports {old['import_ms']:.1f} -> {new['import_ms']:.1f} ms ({pct:+.0f}%)")
+        for name, ms in added:
+            print(f"    {RED}+ {name}{RESET} ({ms} ms)")
+        for name in dropped:
+            print(f"    {GREEN}- {name}{RESET} ({old['modules'][name]} ms)")
+        flagged += 1 if slower or added else 0
+    return flagged
+
+
+def cold_start(pattern: str = "*", runs: int = 5, workers: int = None, timeout: int = 30, top: int = 20,
+               output: str = None, save_baseline: str = None, baseline: str = None,
+               threshold: float = 20.0, min_ms: float = 5.0):
+    scripts = _discover_scripts(pattern)
+    if not scripts:
+        print(f"{RED}No skill scripts match '{pattern}'.{RESET}")
+        sys.exit(1)
+    workers = workers or os.cpu_count() or 1
+    print(f"\n{BOLD}Cold-start import benchmark{RESET}")
+    print(f"  Scripts: {len(scripts)}  Runs: {runs} each  Workers: {workers}")
+    print("  Command: python -X importtime <script> --help\n")
+    print(f"{YELLOW}Running...{RESET}")
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        floor_futures = [pool.submit(_importtime_run, ["-c", "pass"], timeout) for _ in range(runs)]
+        futures = {pool.submit(_importtime_run, [str(script), "--help"], timeout): name
+                   for name, script in scripts.items() for _ in range(runs)}
+        floor_runs = [f.result() for f in floor_futures]
+        per_skill = {}
+        for future in as_completed(futures):
+            per_skill.setdefault(futures[future], []).append(future.result())
+
+    floor_modules = set().union(*(r["modules"] for r in floor_runs))
+    floor_ms = round(statistics.median(r["wall_ms"] for r in floor_runs), 1)
+    results = {name: _aggregate(per_skill[name], floor_modules) for name in scripts}
+    ranked = sorted(results.items(), key=lambda kv: -kv[1]["wall_ms"])
+
+    print(f"\n  Bare interpreter start: {floor_ms} ms\n")
+    print(f"  {'Skill':<34} {'Wall ms':>8} {'Import ms':>10}  {'Heaviest import':<28} {'ms':>8}")
+    print(f"  {'-'*34} {'-'*8} {'-'*10}  {'-'*28} {'-'*8}")
+    for name, r in ranked[:top]:
+        status = f"  {YELLOW}exit {r['exit_code']}{RESET}" if r["exit_code"] else ""
+        print(f"  {name[:34]:<34} {r['wall_ms']:>8} {r['import_ms']:>10}  {(r['heaviest'] or '-')[:28]:<28} "
+              f"{r['heaviest_ms']:>8}{status}")
+
+    heavy = {}
+    for r in results.values():
+        for module, ms in r["modules"].items():
+            heavy.setdefault(module, []).append(ms)
+    print(f"\n  {BOLD}Most expensive top-level imports across skills:{RESET}")
+    for module, costs in sorted(heavy.items(), key=lambda kv: -statistics.median(kv[1]))[:10]:
+        print(f"  {module:<34} {round(statistics.median(costs), 1):>8} ms  in {len(costs)} skill(s)")
+    failing = sum(1 for r in results.values() if r["exit_code"])
+    if failing:
+        print(f"\n  {YELLOW}{failing} script(s) exited non-zero on --help (often a missing optional dependency); "
+              f"their import cost is counted up to the exit.{RESET}")
+
+    payload = {
+        "timestamp": datetime.datetime.utcnow().isoformat() + "Z",
+        "python": sys.version.split()[0],
+        "runs": runs,
+        "interpreter_ms": floor_ms,
+        "skills": results,
+    }
+    if output:
+        Path(output).write_text(json.dumps(payload, indent=2), encoding="utf-8")
+        print(f"\n  Results saved to {output}")
+    if save_baseline:
+        Path(save_baseline).write_text(json.dumps(payload, indent=2), encoding="utf-8")
+        print(f"\n  Baseline saved to {save_baseline}")
+    if baseline:
+        p = Path(baseline)
+        if not p.exists():
+            print(f"{RED}Baseline file not found: {baseline}{RESET}")
+            sys.exit(1)
+        base = json.loads(p.read_text(encoding="utf-8"))["skills"]
+        if pattern != "*":
+            base = {k: v for k, v in base.items() if fnmatch.fnmatch(k.split("/")[0], pattern)}
+        flagged = _import_diff(base, results, threshold, min_ms)
+        print()
+        if flagged:
+            print(f"{RED}{flagged} skill(s) got slower to start.{RESET}")
+            sys.exit(1)
+        print(f"{GREEN}No cold-start regressions.{RESET}")
+    print()
+
+
 def main():
     parser = argparse.ArgumentParser(
         prog="performance_load_tester.py",
         description="Performance Load Tester — OC-0184"
     )
-    sub = parser.add_subparsers(dest="cmd", required=True)
+    sub = parser.add_subparsers(dest="command", required=True)
 
     p = sub.add_parser("run", help="Run a load test")
     p.add_argument("--skill", required=True, help="Skill name")
@@ -225,6 +1044,12 @@ def main():
     p.add_argument("--workers", type=int, default=5, help="Parallel worker count (default: 5)")
     p.add_argument("--iterations", type=int, default=20, help="Total iterations (default: 20)")
     p.add_argument("--output", default=None, help="Save report to this file")
+    p.add_argument("--mode", choices=MODES, default="subprocess", help="How each iteration is executed (default: subprocess)")
+    p.add_argument("--timeout", type=int, default=30, help="Per-iteration timeout in seconds (default: 30)")
+    p.add_argument("--rate", type=float, default=None, help="Open loop: start requests at this rate (req/s) instead of --iterations")
+    p.add_argument("--duration", type=float, default=10.0, help="Open loop run length in seconds (default: 10)")
+    p.add_argument("--profile", choices=PROFILES, default="constant", help="Open loop arrival profile (default: constant)")
+    p.add_argument("--window", type=float, default=1.0, help="Open loop reporting window in seconds (default: 1)")
 
     p = sub.add_parser("benchmark", help="Run multiple concurrency levels")
     p.add_argument("--skill", required=True)
@@ -232,17 +1057,58 @@ def main():
     p.add_argument("--levels", default="1,5,10,20", help="Comma-separated worker counts (default: 1,5,10,20)")
     p.add_argument("--iterations", type=int, default=20)
     p.add_argument("--output", default=None)
+    p.add_argument("--mode", choices=MODES, default="subprocess")
+    p.add_argument("--timeout", type=int, default=30)
+    p.add_argument("--rate", type=float, default=None, help="Open loop: the same timetable at every level instead of --iterations")
+    p.add_argument("--duration", type=float, default=10.0)
+    p.add_argument("--profile", choices=PROFILES, default="constant")
+    p.add_argument("--window", type=float, default=1.0)
 
     p = sub.add_parser("report", help="Display a saved report")
-    p.add_argument("--file", default="perf_report.json")
+    p.add_argument("--file", nargs="+", default=["perf_report.json"], help="One or more reports; histograms are merged")
+
+    p = sub.add_parser("compare", help="Gate a run against a baseline report")
+    p.add_argument("--baseline", required=True, help="Report from the reference version")
+    p.add_argument("--current", required=True, help="Report from the version under test")
+    p.add_argument("--metrics", default="latency,rss", help="Comma-separated: latency, rss, cpu (default: latency,rss)")
+    p.add_argument("--threshold", type=float, default=10.0, help="Allowed median increase in percent (default: 10)")
+    p.add_argument("--alpha", type=float, default=0.05, help="Significance level (default: 0.05)")
+    p.add_argument("--resamples", type=int, default=2000, help="Bootstrap resamples for the interval (default: 2000)")
+
+    p = sub.add_parser("cold-start", help="Rank every skill script by interpreter start + import cost")
+    p.add_argument("--filter", default="*", help="Only skills whose name matches this glob (default: all)")
+    p.add_argument("--runs", type=int, default=5, help="Runs per script; medians are reported (default: 5)")
+    p.add_argument("--workers", type=int, default=None, help="Parallel runs (default: CPU count)")
+    p.add_argument("--timeout", type=int, default=30)
+    p.add_argument("--top", type=int, default=20, help="Rows in the ranking (default: 20)")
+    p.add_argument("--output", default=None, help="Save full per-skill results to this file")
+    p.add_argument("--save-baseline", default=None, help="Save this run as a baseline file")
+    p.add_argument("--baseline", default=None, help="Diff against a saved baseline; exits 1 on regressions")
+    p.add_argument("--threshold", type=float, default=20.0, help="Flag import time increases above this percent (default: 20)")
+    p.add_argument("--min-ms", type=float, default=5.0, help="Ignore changes and new imports below this many ms (default: 5)")
 
     args = parser.parse_args()
-    if args.cmd == "run":
-        run(args.skill, args.cmd, args.workers, args.iterations, args.output)
-    elif args.cmd == "benchmark":
-        benchmark(args.skill, args.cmd, args.levels, args.iterations, args.output)
-    elif args.cmd == "report":
+    if getattr(args, "rate", None) is not None and args.rate <= 0:
+        print(f"{RED}--rate must be positive.{RESET}")
+        sys.exit(1)
+    if args.command == "run":
+        run(args.skill, args.cmd, args.workers, args.iterations, args.output, args.mode, args.timeout,
+            args.rate, args.duration, args.profile, args.window)
+    elif args.command == "benchmark":
+        benchmark(args.skill, args.cmd, args.levels, args.iterations, args.output, args.mode, args.timeout,
+                  args.rate, args.duration, args.profile, args.window)
+    elif args.command == "cold-start":
+        cold_start(args.filter, args.runs, args.workers, args.timeout, args.top, args.output,
+                   args.save_baseline, args.baseline, args.threshold, args.min_ms)
+    elif args.command == "compare":
+        compare(args.baseline, args.current, args.metrics, args.threshold, args.alpha, args.resamples)
+    elif args.command == "report":
         report(args.file)
+    if getattr(args, "mode", None) == "inproc" and threading.active_count() > 1:
+        # Timed-out inproc calls may still be running on abandoned threads; don't wait for them at exit.
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os._exit(0)
 
 
 if __name__ == "__main__":